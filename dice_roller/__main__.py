@@ -0,0 +1,5 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/dice_roller/__main__.py
+from .launcher import main
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/dice_roller/aggregates.py
+import json
+import math
+import os
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from .storage import exclusive_lock
+
+# Bumped when the layout of the index file changes; older indexes are rebuilt
+INDEX_VERSION = 1
+
+# Journal size at which update() folds the journal into the snapshot
+JOURNAL_BYTES = 4 * 2 ** 20
+
+# Dice with more sides than this keep no face histogram, so big dice do not grow the index
+MAX_FACE_SIDES = 100
+
+
+class HistoryStats:
+    """Sidecar index of running totals over the roll history
+
+    The index lives next to the history in `<history file>.stats.json` and
+    is updated with every batch of rolls written, so questions like "how
+    many natural 20s this campaign" are answered without reading the log.
+    For every command it keeps the count, sum, sum of squares, min and max
+    of the roll totals; for every die type (d6, d20, ...) the same over the
+    individual dice. Both also keep a histogram of the dice faces rolled,
+    for dice of at most MAX_FACE_SIDES sides.
+
+    A batch of rolls is not merged into the snapshot file: its totals are
+    appended as one line to `<history file>.stats.journal`, so the cost of
+    an update depends on the batch, not on how large the index has grown.
+    Reading folds the journal into the snapshot; once the journal passes
+    JOURNAL_BYTES it is folded in for good and started afresh. The
+    snapshot records which journal file (inode) and how much of it it
+    already includes, so a crash between the two steps never counts a
+    batch twice.
+
+    Updates are serialized across processes with an advisory lock and
+    files are replaced atomically. The index can be rebuilt from the
+    history at any time with rebuild().
+    """
+
+    def __init__(self, history_file: Path):
+        history_file = Path(history_file)
+        self.path = history_file.with_name(history_file.name + '.stats.json')
+        self.journal_path = history_file.with_name(history_file.name + '.stats.journal')
+        self.lock_path = history_file.with_name(history_file.name + '.stats.lock')
+        self._data = None
+        # (inode, size, mtime) of the snapshot and journal as last read or written by this object
+        self._signature = None
+
+    def exists(self) -> bool:
+        """Whether an index has been written"""
+        return self.path.exists() or self.journal_path.exists()
+
+    def load(self) -> Dict[str, Any]:
+        """The current index, or an empty one"""
+        signature = self._file_signature()
+        if self._data is None or signature != self._signature:
+            with exclusive_lock(self.lock_path):
+                self._data = self._read()
+                self._signature = self._file_signature()
+        return self._data
+
+    def update(self, entries: List[Dict[str, Any]],
+               history: Optional[Callable[[], Iterable[Dict[str, Any]]]] = None) -> None:
+        """Add a batch of history entries to the index by appending their totals to the journal
+
+        `history` returns every stored entry, this batch included. If no
+        index exists yet it is built from that instead, so a history
+        written before the index (by an older version) is counted in full
+        rather than from this batch on. This happens once per history.
+        """
+        if not entries:
+            return
+        delta = _empty_index()
+        for entry in entries:
+            _add_entry(delta, entry)
+        del delta['version']
+        line = json.dumps(delta, separators=(',', ':')) + '\n'
+
+        with exclusive_lock(self.lock_path):
+            if history is not None and not self.exists():
+                data = _empty_index()
+                for entry in history():
+                    _add_entry(data, entry)
+                self._write(data)
+                return
+            with open(self.journal_path, 'a') as f:
+                f.write(line)
+                journal_size = f.tell()
+            if journal_size > JOURNAL_BYTES:
+                self._write(self._read())
+
+    def rebuild(self, entries: Iterable[Dict[str, Any]]) -> int:
+        """Replace the index with one computed from the given entries; returns the number of rolls"""
+        data = _empty_index()
+        for entry in entries:
+            _add_entry(data, entry)
+        with exclusive_lock(self.lock_path):
+            self._write(data)
+        return data['rolls']
+
+    def clear(self) -> None:
+        """Reset the index to no rolls"""
+        with exclusive_lock(self.lock_path):
+            self._write(_empty_index())
+
+    def command(self, command: str) -> Optional[Dict[str, Any]]:
+        """Summary of one command's roll totals, or None if it was never rolled"""
+        aggregate = self.load()['commands'].get(command)
+        return summarize(aggregate) if aggregate else None
+
+    def die(self, sides: int) -> Optional[Dict[str, Any]]:
+        """Summary of every die of one type rolled, or None if it was never rolled"""
+        aggregate = self.load()['dice'].get(f'd{sides}')
+        return summarize(aggregate) if aggregate else None
+
+    def _file_signature(self):
+        """Identify the current versions of the snapshot and journal without reading them"""
+        signature = []
+        for path in (self.path, self.journal_path):
+            try:
+                stat = path.stat()
+            except OSError:
+                signature.append(None)
+            else:
+                signature.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        return tuple(signature)
+
+    def _read(self) -> Dict[str, Any]:
+        """Read the snapshot and fold in the journal; a missing, damaged or outdated snapshot reads as empty"""
+        data = self._read_snapshot()
+        journal_inode = data.pop('journal_inode', None)
+        journal_offset = data.pop('journal_offset', 0)
+        try:
+            with open(self.journal_path, 'rb') as f:
+                if os.fstat(f.fileno()).st_ino == journal_inode:
+                    f.seek(journal_offset)
+                for line in f:
+                    try:
+                        delta = json.loads(line)
+                    except ValueError:
+                        continue  # A batch cut short by a crash
+                    _merge(data, delta)
+        except OSError:
+            pass
+        return data
+
+    def _read_snapshot(self) -> Dict[str, Any]:
+        """Read the snapshot file alone"""
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            return _empty_index()
+        if not isinstance(data, dict) or data.get('version') != INDEX_VERSION:
+            return _empty_index()
+        return data
+
+    def _write(self, data: Dict[str, Any]) -> None:
+        """Atomically replace the snapshot, then start an empty journal
+
+        Must be called with the lock held. The snapshot marks the journal
+        it replaces as fully included until the new journal is in place.
+        """
+        snapshot = dict(data)
+        try:
+            stat = self.journal_path.stat()
+        except OSError:
+            pass
+        else:
+            snapshot.update(journal_inode=stat.st_ino, journal_offset=stat.st_size)
+
+        temp_path = self.path.with_name(self.path.name + '.tmp')
+        # dumps uses the C encoder; dump would encode in Python chunk by chunk
+        encoded = json.dumps(snapshot, separators=(',', ':'))
+        with open(temp_path, 'w') as f:
+            f.write(encoded)
+        os.replace(temp_path, self.path)
+
+        journal_temp = self.journal_path.with_name(self.journal_path.name + '.tmp')
+        open(journal_temp, 'w').close()
+        os.replace(journal_temp, self.journal_path)
+
+        self._data = data
+        self._signature = self._file_signature()
+
+
+def summarize(aggregate: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the mean and standard deviation to an aggregate and return faces as ints"""
+    count = aggregate['count']
+    mean = aggregate['sum'] / count
+    variance = max(aggregate['sum_squares'] / count - mean * mean, 0.0)
+    return dict(
+        aggregate,
+        mean=mean,
+        stdev=math.sqrt(variance),
+        faces={int(face): hits for face, hits in sorted(aggregate['faces'].items(), key=lambda item: int(item[0]))}
+    )
+
+
+def _empty_index() -> Dict[str, Any]:
+    """Index of an empty history"""
+    return {'version': INDEX_VERSION, 'rolls': 0, 'commands': {}, 'dice': {}}
+
+
+def _new_aggregate() -> Dict[str, Any]:
+    """Running totals with no values yet"""
+    return {'count': 0, 'sum': 0, 'sum_squares': 0, 'min': None, 'max': None, 'faces': {}}
+
+
+def _add_entry(data: Dict[str, Any], entry: Dict[str, Any]) -> None:
+    """Fold one history entry into the index"""
+    face_counts = entry.get('face_counts')
+    if face_counts is not None:
+        faces = Counter({face: hits for face, hits in enumerate(face_counts, 1) if hits})
+    else:
+        faces = Counter(entry.get('individual_rolls') or [])
+    data['rolls'] += 1
+    sides = entry.get('sides')
+    keep_faces = (sides or 0) <= MAX_FACE_SIDES
+
+    command = data['commands'].setdefault(entry.get('command', ''), _new_aggregate())
+    total = entry.get('total', 0)
+    _add_values(command, 1, total, total * total, total, total)
+    if keep_faces:
+        _add_faces(command, faces)
+
+    if faces and sides:
+        die = data['dice'].setdefault(f"d{sides}", _new_aggregate())
+        _add_values(die, sum(faces.values()), sum(face * hits for face, hits in faces.items()),
+                    sum(face * face * hits for face, hits in faces.items()), min(faces), max(faces))
+        if keep_faces:
+            _add_faces(die, faces)
+
+
+def _merge(data: Dict[str, Any], delta: Dict[str, Any]) -> None:
+    """Fold the index of a batch of rolls (a journal line) into another index"""
+    data['rolls'] += delta['rolls']
+    for group in ('commands', 'dice'):
+        aggregates = data[group]
+        for name, aggregate in delta[group].items():
+            target = aggregates.setdefault(name, _new_aggregate())
+            _add_values(target, aggregate['count'], aggregate['sum'], aggregate['sum_squares'],
+                        aggregate['min'], aggregate['max'])
+            histogram = target['faces']
+            for key, hits in aggregate['faces'].items():
+                histogram[key] = histogram.get(key, 0) + hits
+
+
+def _add_values(aggregate: Dict[str, Any], count: int, total: int, squares: int, low: int, high: int) -> None:
+    """Add `count` values with the given sum, sum of squares, min and max"""
+    aggregate['count'] += count
+    aggregate['sum'] += total
+    aggregate['sum_squares'] += squares
+    aggregate['min'] = low if aggregate['min'] is None else min(aggregate['min'], low)
+    aggregate['max'] = high if aggregate['max'] is None else max(aggregate['max'], high)
+
+
+def _add_faces(aggregate: Dict[str, Any], faces: Counter) -> None:
+    """Add face counts to an aggregate's histogram (JSON keys are strings)"""
+    histogram = aggregate['faces']
+    for face, hits in faces.items():
+        key = str(face)
+        histogram[key] = histogram.get(key, 0) + hits
@@ -0,0 +1,132 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/dice_roller/alias.py
+import random
+import threading
+from array import array
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+# Memory all cached total tables may use together, in bytes
+CACHE_BYTES = 64 * 2 ** 20
+
+# Largest exact distribution a table is built from, in packed decimal digits
+# (probability.packed_digits); building one this size takes about 15 ms
+MAX_BUILD_DIGITS = 10 ** 5
+
+# Bytes per table column: a double acceptance probability and a 32-bit alias
+COLUMN_BYTES = array('d').itemsize + array('I').itemsize
+
+
+class AliasTable:
+    """Walker's alias method: draws index i with probability weights[i] / sum(weights) in O(1)
+
+    The table is built with Vose's algorithm in exact integer arithmetic,
+    so each column's acceptance probability is rounded to a float once
+    and never accumulates error. A draw picks a column uniformly, then
+    keeps it or takes its alias; that is two random() calls whatever the
+    number of columns.
+    """
+
+    __slots__ = ('probability', 'alias', 'size')
+
+    def __init__(self, weights: Sequence[int]):
+        size = len(weights)
+        total = sum(weights)
+        if size == 0 or total <= 0 or min(weights) < 0:
+            raise ValueError("An alias table needs non-negative weights with a positive sum")
+
+        # Column i holds scaled[i] / total of one column's worth of probability
+        scaled = [weight * size for weight in weights]
+        small = [index for index, weight in enumerate(scaled) if weight < total]
+        large = [index for index, weight in enumerate(scaled) if weight >= total]
+        probability = array('d', [1.0]) * size
+        alias = array('I', range(size))
+
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            probability[less] = scaled[less] / total
+            alias[less] = more
+            scaled[more] += scaled[less] - total
+            (small if scaled[more] < total else large).append(more)
+        # Whatever is left is exactly full, so it keeps probability 1.0
+
+        self.probability = probability
+        self.alias = alias
+        self.size = size
+
+    @property
+    def nbytes(self) -> int:
+        """Memory taken by the table's columns"""
+        return self.size * COLUMN_BYTES
+
+    def sample(self, rng: random.Random) -> int:
+        """Draw one index"""
+        column = int(rng.random() * self.size)
+        return column if rng.random() < self.probability[column] else self.alias[column]
+
+    def samples(self, rng: random.Random, count: int) -> List[int]:
+        """Draw `count` indexes"""
+        size, probability, alias, draw = self.size, self.probability, self.alias, rng.random
+        columns = [int(draw() * size) for _ in range(count)]
+        return [column if draw() < probability[column] else alias[column] for column in columns]
+
+
+# Tables of dice totals by (count, sides), least recently used first
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_bytes = 0
+
+
+def total_table(count: int, sides: int) -> Optional[AliasTable]:
+    """Alias table over the totals of `count` dice with `sides` sides, or None if it is too large
+
+    Index i of the table is a total of count + i (before any modifier).
+    Tables come from the exact distribution in dice_roller.probability and
+    are cached per (count, sides); the least recently used are dropped to
+    keep the cache within CACHE_BYTES. The exact counts are computed
+    without probability's own cache and dropped once the table is built,
+    so the tables are all that is kept. Rolls whose distribution would
+    take more than MAX_BUILD_DIGITS to compute, or whose table alone
+    would not fit in the cache, get None.
+    """
+    global _cache_bytes
+
+    key = (count, sides)
+    with _cache_lock:
+        table = _cache.get(key)
+        if table is not None:
+            _cache.move_to_end(key)
+            return table
+
+    if count < 1 or sides < 1 or (count * (sides - 1) + 1) * COLUMN_BYTES > CACHE_BYTES:
+        return None
+    from .probability import dice_counts, packed_digits
+
+    if packed_digits(count, sides) > MAX_BUILD_DIGITS:
+        return None
+    # Bypass dice_counts' lru_cache, which would keep the big-int counts alive
+    table = AliasTable(dice_counts.__wrapped__(count, sides))
+
+    with _cache_lock:
+        if key not in _cache:
+            _cache[key] = table
+            _cache_bytes += table.nbytes
+        while _cache_bytes > CACHE_BYTES:
+            _, dropped = _cache.popitem(last=False)
+            _cache_bytes -= dropped.nbytes
+    return table
+
+
+def cache_info() -> Tuple[int, int]:
+    """Number of cached tables and the bytes they take"""
+    with _cache_lock:
+        return len(_cache), _cache_bytes
+
+
+def clear_cache() -> None:
+    """Drop every cached table"""
+    global _cache_bytes
+
+    with _cache_lock:
+        _cache.clear()
+        _cache_bytes = 0
@@ -0,0 +1,285 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/dice_roller/audit.py
+import math
+import operator
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Sequence
+from .parser import DiceRoll
+from .roller import DiceRoller
+
+# Values processed per pass; memory use depends on this, not on the number of values
+CHUNK_SIZE = 2 ** 20
+
+# Die sizes audited when none are given
+DEFAULT_SIDES = (4, 6, 8, 10, 12, 20, 100)
+
+# Fewest expected hits per face for the chi-squared approximation to hold
+MIN_EXPECTED = 5
+
+# C implementation of the dot product on Python 3.12+
+_sumprod = getattr(math, 'sumprod', None)
+
+
+@dataclass
+class AuditResult:
+    """Fairness tests over a stream of values from one die size
+
+    Each p-value is the chance of a result at least this extreme from a
+    fair, independent die; None means the test could not be run (too few
+    values). Small p-values (below 0.01, say) are suspicious.
+    """
+    sides: int
+    values: int
+    face_counts: Dict[int, int]
+    chi_squared: Optional[float]
+    chi_squared_p: Optional[float]
+    serial_correlation: Optional[float]
+    serial_p: Optional[float]
+    runs: Optional[int]
+    expected_runs: Optional[float]
+    runs_p: Optional[float]
+
+    @property
+    def p_values(self) -> Dict[str, Optional[float]]:
+        """p-value of each test by name"""
+        return {'chi-squared': self.chi_squared_p, 'serial correlation': self.serial_p, 'runs': self.runs_p}
+
+    def passed(self, alpha: float = 0.01) -> bool:
+        """True unless a test rejects fairness at significance level alpha"""
+        return all(p is None or p >= alpha for p in self.p_values.values())
+
+
+class DieAudit:
+    """Accumulate test statistics for one die size over chunks of values
+
+    Only running counts are kept between chunks (face counts, sums, the
+    lag-1 product sum and run counts), so any number of values can be
+    audited in constant memory. Chunks of dice up to d255 are handled as
+    bytes so that counting happens in C.
+
+    - Chi-squared: are all faces equally frequent?
+    - Serial correlation: does a value predict the next one (lag 1)?
+    - Runs: do values above and below the mean alternate like coin flips?
+    """
+
+    def __init__(self, sides: int):
+        if sides < 2:
+            raise ValueError("Auditing needs dice with at least two sides")
+        self.sides = sides
+        self.count = 0
+        self.faces = Counter()
+        self.lag_products = 0
+        self.first = None
+        self.last = None
+        # Runs above/below the mean; values equal to the mean are skipped
+        self.above = 0
+        self.below = 0
+        self.transitions = 0
+        self.last_side = None
+        if sides < 256:
+            doubled_mean = sides + 1
+            self._side_table = bytes(49 if 2 * value > doubled_mean else 48 for value in range(256))
+            self._middle = bytes([doubled_mean // 2]) if doubled_mean % 2 == 0 else b''
+
+    def add(self, values: Sequence[int]) -> None:
+        """Add the next chunk of values, in the order they were rolled"""
+        if not values:
+            return
+        if self.sides < 256 and not isinstance(values, (bytes, bytearray)):
+            values = bytes(values)
+
+        self._count_faces(values)
+        self.lag_products += _dot(values[:-1], values[1:])
+        if self.last is not None:
+            self.lag_products += self.last * values[0]
+        else:
+            self.first = values[0]
+        self.last = values[-1]
+        self.count += len(values)
+        self._count_runs(values)
+
+    def result(self) -> AuditResult:
+        """Run the tests on everything added so far"""
+        chi_squared, chi_squared_p = self._chi_squared()
+        serial_correlation, serial_p = self._serial_correlation()
+        runs, expected_runs, runs_p = self._runs()
+        return AuditResult(
+            sides=self.sides,
+            values=self.count,
+            face_counts={face: self.faces[face] for face in range(1, self.sides + 1)}
+            if self.sides <= 1000 else dict(sorted(self.faces.items())),
+            chi_squared=chi_squared,
+            chi_squared_p=chi_squared_p,
+            serial_correlation=serial_correlation,
+            serial_p=serial_p,
+            runs=runs,
+            expected_runs=expected_runs,
+            runs_p=runs_p
+        )
+
+    def _count_faces(self, values: Sequence[int]) -> None:
+        """Add the chunk's face frequencies"""
+        if isinstance(values, (bytes, bytearray)) and self.sides <= 32:
+            # One C-level scan per face beats building a Counter for small dice
+            for face in range(1, self.sides + 1):
+                self.faces[face] += values.count(face)
+        else:
+            self.faces.update(values)
+
+    def _count_runs(self, values: Sequence[int]) -> None:
+        """Add the chunk's runs above and below the mean as a string of b'0'/b'1'"""
+        if isinstance(values, (bytes, bytearray)):
+            sides = values.translate(self._side_table, self._middle)
+        else:
+            doubled_mean = self.sides + 1
+            sides = bytes(49 if 2 * value > doubled_mean else 48 for value in values if 2 * value != doubled_mean)
+        if not sides:
+            return
+        above = sides.count(b'1')
+        self.above += above
+        self.below += len(sides) - above
+        self.transitions += sides.count(b'01') + sides.count(b'10')
+        if self.last_side is not None and self.last_side != sides[0]:
+            self.transitions += 1
+        self.last_side = sides[-1]
+
+    def _chi_squared(self):
+        """Pearson's chi-squared statistic against equal face frequencies, and its p-value"""
+        expected = self.count / self.sides
+        if expected < MIN_EXPECTED:
+            return None, None
+        observed = sum((hits - expected) ** 2 for hits in self.faces.values())
+        # Faces never rolled each contribute expected ** 2
+        observed += (self.sides - len(self.faces)) * expected ** 2
+        statistic = observed / expected
+        return statistic, chi_squared_sf(statistic, self.sides - 1)
+
+    def _serial_correlation(self):
+        """Lag-1 autocorrelation and its two-sided p-value (normal approximation)"""
+        n = self.count
+        if n < 3:
+            return None, None
+        total = sum(face * hits for face, hits in self.faces.items())
+        squares = sum(face * face * hits for face, hits in self.faces.items())
+        mean = total / n
+        spread = squares - n * mean * mean
+        if spread <= 0:
+            return None, None
+        # sum over i < n of (x[i] - mean)(x[i+1] - mean), expanded into running sums
+        covariance = (self.lag_products - mean * ((total - self.last) + (total - self.first))
+                      + (n - 1) * mean * mean)
+        correlation = covariance / spread
+        z = (correlation + 1 / n) * math.sqrt(n)
+        return correlation, normal_two_sided_p(z)
+
+    def _runs(self):
+        """Wald-Wolfowitz runs test above/below the mean: runs, expected runs and p-value"""
+        n1, n2 = self.above, self.below
+        n = n1 + n2
+        if n1 == 0 or n2 == 0 or n < 3:
+            return None, None, None
+        runs = self.transitions + 1
+        expected = 2 * n1 * n2 / n + 1
+        variance = 2 * n1 * n2 * (2 * n1 * n2 - n) / (n * n * (n - 1))
+        if variance <= 0:
+            return runs, expected, None
+        return runs, expected, normal_two_sided_p((runs - expected) / math.sqrt(variance))
+
+
+def audit_rolls(sides: int, count: int, roller: Optional[DiceRoller] = None, seed: Optional[int] = None,
+                chunk_size: int = CHUNK_SIZE) -> AuditResult:
+    """Roll `count` fresh dice with a DiceRoller and audit them chunk by chunk
+
+    Without a roller, one is created with `seed` so the audit is reproducible.
+    """
+    if count <= 0:
+        raise ValueError("The number of rolls must be positive")
+    roller = roller if roller is not None else DiceRoller(seed=seed)
+    audit = DieAudit(sides)
+    remaining = count
+    while remaining > 0:
+        batch = min(chunk_size, remaining)
+        audit.add(roller.roll(DiceRoll(count=batch, sides=sides), f"{batch}d{sides}").individual_rolls)
+        remaining -= batch
+    return audit.result()
+
+
+def audit_history(entries: Iterable[Dict], chunk_size: int = CHUNK_SIZE) -> Dict[int, AuditResult]:
+    """Audit the individual rolls stored in history entries, grouped by die size
+
+    Values are buffered per die size and handed over in chunks, so an
+    iterator such as RollHistory.iter_history() is audited in constant
+    memory. Histogram entries (face counts only) are skipped, since the
+    serial and runs tests need the dice in the order they were rolled.
+    Returns one result per die size, smallest first.
+    """
+    audits = {}
+    buffers = {}
+    for entry in entries:
+        sides = entry.get('sides')
+        rolls = entry.get('individual_rolls')
+        if not rolls or not sides or sides < 2:
+            continue
+        buffer = buffers.setdefault(sides, [])
+        buffer.extend(rolls)
+        if len(buffer) >= chunk_size:
+            audits.setdefault(sides, DieAudit(sides)).add(buffer)
+            buffers[sides] = []
+
+    for sides, buffer in buffers.items():
+        audits.setdefault(sides, DieAudit(sides)).add(buffer)
+    return {sides: audits[sides].result() for sides in sorted(audits)}
+
+
+def chi_squared_sf(statistic: float, degrees_of_freedom: int) -> float:
+    """P(X >= statistic) for a chi-squared distribution"""
+    return _upper_regularized_gamma(degrees_of_freedom / 2, statistic / 2)
+
+
+def normal_two_sided_p(z: float) -> float:
+    """P(|Z| >= |z|) for a standard normal Z"""
+    return math.erfc(abs(z) / math.sqrt(2))
+
+
+def _upper_regularized_gamma(a: float, x: float) -> float:
+    """Q(a, x) = Gamma(a, x) / Gamma(a), by series below a + 1 and continued fraction above"""
+    if x <= 0:
+        return 1.0
+    log_prefix = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1:
+        term = total = 1 / a
+        denominator = a
+        while abs(term) > abs(total) * 1e-15:
+            denominator += 1
+            term *= x / denominator
+            total += term
+        return max(0.0, 1 - total * math.exp(log_prefix))
+
+    # Modified Lentz evaluation of the continued fraction
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    fraction = d
+    step = 1
+    while True:
+        an = -step * (step - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        fraction *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+        step += 1
+    return math.exp(log_prefix) * fraction
+
+
+def _dot(left: Sequence[int], right: Sequence[int]) -> int:
+    """Sum of products of two equally long sequences of ints"""
+    if _sumprod is not None:
+        return _sumprod(left, right)
+    return sum(map(operator.mul, left, right))
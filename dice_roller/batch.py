@@ -0,0 +1,30 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/dice_roller/batch.py
+import re
+from typing import Optional, Tuple
+
+# A notation followed by a repeat count: "4d6 x6" rolls 4d6 six times
+REPEAT_PATTERN = re.compile(r'^(.+?)\s+[x×](\d+)$', re.IGNORECASE)
+
+# Starts a comment that runs to the end of the line
+COMMENT = '#'
+
+
+def parse_batch_line(line: str) -> Optional[Tuple[str, int]]:
+    """Split a batch file line into its notation and how many times to roll it
+
+    Lines are a notation with an optional repeat count after it ("3d6+2",
+    "4d6 x6"). Blank lines and comments give None. The notation itself is
+    not checked here; that is left to DiceParser. Raises ValueError for a
+    repeat count of zero.
+    """
+    text = line.split(COMMENT, 1)[0].strip()
+    if not text:
+        return None
+
+    match = REPEAT_PATTERN.match(text)
+    if match is None:
+        return text, 1
+    notation, repeat = match.group(1), int(match.group(2))
+    if repeat < 1:
+        raise ValueError(f"repeat count must be at least 1: {text}")
+    return notation, repeat
@@ -0,0 +1,242 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/dice_roller/benchmark.py
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+from .history import RollHistory
+from .parser import DiceParser, DiceRoll
+from .roller import DiceRoller
+
+# Bumped when the layout of baseline files changes
+BASELINE_VERSION = 1
+
+# Dice per roll timed by the roll benchmarks
+ROLL_COUNTS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+
+# Entries already in the history when add_roll and get_history are timed
+HISTORY_SIZES = (100, 1000, 10000, 100000, 1000000)
+
+# Smaller sizes for a quick run, e.g. before every commit
+QUICK_ROLL_COUNTS = (1, 100, 10000)
+QUICK_HISTORY_SIZES = (100, 10000)
+
+# Slowdown accepted by compare() before a benchmark counts as a regression (0.25 = 25%)
+TOLERANCE = 0.25
+
+# Minimum duration of one timed batch; shorter operations are repeated within it
+MIN_BATCH_TIME = 0.02
+
+# Timed batches per benchmark; the fastest is reported
+REPEAT = 5
+
+
+@dataclass
+class Comparison:
+    """One benchmark measured against its baseline"""
+    name: str
+    baseline: float
+    current: float
+    tolerance: float
+
+    @property
+    def ratio(self) -> float:
+        """Current time over baseline time; above 1 is slower"""
+        return self.current / self.baseline if self.baseline > 0 else float('inf')
+
+    @property
+    def regressed(self) -> bool:
+        """Whether the benchmark got slower by more than the tolerance"""
+        return self.ratio > 1 + self.tolerance
+
+
+def run_benchmarks(quick: bool = False, only: Optional[Sequence[str]] = None,
+                   progress: Optional[Callable[[str, float], None]] = None) -> Dict[str, float]:
+    """Run the benchmark suite and return seconds per operation by benchmark name
+
+    Names are grouped by prefix: parse.*, roll.<dice>, history.add_roll.<size>,
+    history.get_history.<size> and cli.*. `only` keeps the benchmarks named
+    by it or grouped under it ('roll' and 'roll.100' both select roll.100).
+    `progress`, if given, is called with each name and result as soon as it
+    is measured.
+    """
+    roll_counts = QUICK_ROLL_COUNTS if quick else ROLL_COUNTS
+    history_sizes = QUICK_HISTORY_SIZES if quick else HISTORY_SIZES
+
+    def wanted(name: str) -> bool:
+        return not only or any(name == prefix or name.startswith(prefix + '.') for prefix in only)
+
+    results = {}
+
+    def record(name: str, seconds: float) -> None:
+        results[name] = seconds
+        if progress is not None:
+            progress(name, seconds)
+
+    for name, benchmark in (('parse.cached', bench_parse_cached), ('parse.uncached', bench_parse_uncached)):
+        if wanted(name):
+            record(name, benchmark())
+
+    for count in roll_counts:
+        name = f'roll.{count}'
+        if wanted(name):
+            record(name, bench_roll(count))
+
+    for size in history_sizes:
+        names = (f'history.add_roll.{size}', f'history.get_history.{size}')
+        if any(wanted(name) for name in names):
+            add_roll, get_history = bench_history(size)
+            for name, seconds in zip(names, (add_roll, get_history)):
+                if wanted(name):
+                    record(name, seconds)
+
+    for name, args in (('cli.roll', ['1d20']), ('cli.history', ['history', '--limit', '5'])):
+        if wanted(name):
+            record(name, bench_cli(args))
+
+    return results
+
+
+def bench_parse_cached() -> float:
+    """Seconds per DiceParser.parse call on a notation already in the cache"""
+    DiceParser.parse('4d8+3')
+    return measure(lambda: DiceParser.parse('4d8+3'))
+
+
+def bench_parse_uncached() -> float:
+    """Seconds per DiceParser.parse call that has to run the regular expression"""
+    notations = [f'{count}d{sides}+{modifier}' for count in range(1, 11) for sides in (4, 6, 8, 10, 12, 20)
+                 for modifier in range(10)]
+
+    def parse_all():
+        DiceParser.clear_cache()
+        for notation in notations:
+            DiceParser.parse(notation)
+
+    try:
+        return measure(parse_all) / len(notations)
+    finally:
+        DiceParser.clear_cache()
+
+
+def bench_roll(count: int, sides: int = 20) -> float:
+    """Seconds per DiceRoller.roll of `count` dice with the default engine"""
+    roller = DiceRoller()
+    dice_roll = DiceRoll(count=count, sides=sides)
+    return measure(lambda: roller.roll(dice_roll, 'benchmark'))
+
+
+def bench_history(size: int, samples: int = 50) -> Sequence[float]:
+    """Seconds per add_roll and per get_history() on a history of `size` entries
+
+    The history is created in a temporary directory with the configured
+    backend (DICE_ROLLER_BACKEND), filled in large batches, then timed.
+    """
+    result = DiceRoller().roll(DiceRoll(count=3, sides=6), '3d6')
+
+    with tempfile.TemporaryDirectory(prefix='dice-roller-bench-') as directory:
+        history = RollHistory(Path(directory) / 'history.json')
+        entry = history.create_entry(result)
+        filled = 0
+        while filled < size:
+            batch = min(10000, size - filled)
+            history.add_entries([entry] * batch)
+            filled += batch
+
+        add_roll = min(_time_calls(lambda: history.add_roll(result), samples) for _ in range(REPEAT))
+        get_history = min(_time_calls(history.get_history, samples) for _ in range(REPEAT))
+    return add_roll, get_history
+
+
+def bench_cli(args: List[str], runs: int = REPEAT) -> float:
+    """Seconds for one `dice-roller ...` process, from start to exit
+
+    Runs the entry point's code (python -m dice_roller) from this copy of
+    the package against a temporary history file, so interpreter startup
+    and imports are included.
+    """
+    package_root = str(Path(__file__).resolve().parent.parent)
+    python_path = os.pathsep.join(filter(None, (package_root, os.getenv('PYTHONPATH'))))
+    with tempfile.TemporaryDirectory(prefix='dice-roller-bench-') as directory:
+        env = dict(os.environ, PYTHONPATH=python_path, DICE_ROLLER_HISTORY=str(Path(directory) / 'history.json'))
+        command = [sys.executable, '-m', 'dice_roller'] + list(args)
+        best = float('inf')
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def measure(func: Callable[[], object], min_time: float = MIN_BATCH_TIME, repeat: int = REPEAT) -> float:
+    """Seconds per call of func: the fastest of `repeat` batches lasting at least `min_time`"""
+    number = 1
+    while True:
+        elapsed = _time_calls(func, number) * number
+        if elapsed >= min_time:
+            break
+        number *= 10
+    return min(_time_calls(func, number) for _ in range(repeat))
+
+
+def _time_calls(func: Callable[[], object], number: int) -> float:
+    """Average seconds per call over `number` consecutive calls"""
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return (time.perf_counter() - start) / number
+
+
+def save_baseline(results: Dict[str, float], path: Path) -> None:
+    """Write benchmark results to a JSON baseline file"""
+    baseline = {
+        'version': BASELINE_VERSION,
+        'created': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results
+    }
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def load_baseline(path: Path) -> Dict[str, float]:
+    """Read the results from a JSON baseline file
+
+    Raises ValueError if the file is not a baseline this version can read.
+    """
+    with open(path, 'r') as f:
+        try:
+            baseline = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{path} is not a benchmark baseline: {e}")
+    if not isinstance(baseline, dict) or baseline.get('version') != BASELINE_VERSION:
+        raise ValueError(f"{path} is not a version {BASELINE_VERSION} benchmark baseline")
+    return {name: float(seconds) for name, seconds in baseline['results'].items()}
+
+
+def compare(baseline: Dict[str, float], current: Dict[str, float],
+            tolerance: float = TOLERANCE) -> List[Comparison]:
+    """Compare the benchmarks present in both result sets, in the current run's order"""
+    return [Comparison(name, baseline[name], seconds, tolerance)
+            for name, seconds in current.items() if name in baseline]
+
+
+def regressions(comparisons: Iterable[Comparison]) -> List[Comparison]:
+    """The comparisons that got slower than their tolerance allows"""
+    return [comparison for comparison in comparisons if comparison.regressed]
+
+
+def format_seconds(seconds: float) -> str:
+    """A duration with a readable unit (ns, µs, ms or s)"""
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('µs', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
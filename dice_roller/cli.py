@@ -1,54 +1,92 @@
 # /Users/marcozingoni/Playgound/Python/diceRoller/dice_roller/cli.py
+import itertools
+import sys
 import click
 from datetime import datetime
-from .parser import DiceParser
-from .roller import DiceRoller
+from .parser import DiceParser, DiceRoll
+from .roller import DiceRoller, HistogramResult
+from .aggregates import summarize
+from .export import EXPORT_FORMATS
 from .history import RollHistory
+from .metrics import metrics
+from .render import history_error_line, rolls_text, summary_lines, write_roll_result
 
 
 class DiceRollerCLI:
     """Main CLI application for dice rolling"""
 
-    def __init__(self):
+    SHELL_PROMPT = "🎲 > "
+
+    # Recent rolls the shell keeps in memory for its history command
+    SHELL_HISTORY_SIZE = 1000
+
+    # Output flags accepted after a notation, and the output mode each selects
+    OUTPUT_FLAGS = {'--json': 'json', '--quiet': 'quiet', '-q': 'quiet', '--summary': 'summary', '--all-rolls': 'all'}
+
+    def __init__(self, engine: str = None, seed: int = None, output: str = 'full', totals_only: bool = False):
         self.parser = DiceParser()
-        self.roller = DiceRoller()
-        self.history = RollHistory()
+        try:
+            self.roller = DiceRoller(engine=engine, seed=seed, totals_only=totals_only)
+            self.history = RollHistory()
+        except ValueError as e:
+            # A bad engine, seed or history backend, often from DICE_ROLLER_ENGINE,
+            # DICE_ROLLER_SEED or DICE_ROLLER_BACKEND
+            raise click.ClickException(str(e))
+        # How rolls are printed; one of render.OUTPUT_MODES
+        self.output = output
 
     def roll_dice(self, dice_string: str) -> None:
         """Roll dice from string notation and display results"""
-        dice_roll = self.parser.parse(dice_string)
+        with metrics.span('parse'):
+            dice_roll = self.parser.parse(dice_string)
 
         if dice_roll is None:
             click.echo(f"❌ Invalid dice notation: {dice_string}")
             click.echo("Valid formats: 1d20, 3d6, 4d8+3, 2d10-1")
             return
 
-        result = self.roller.roll(dice_roll, dice_string)
-        self.history.add_roll(result)
+        with metrics.span('roll'):
+            # Huge rolls are kept as face counts unless every die is to be printed
+            result = self.roller.roll(dice_roll, dice_string, histogram=False if self.output == 'all' else None)
+        try:
+            self.history.add_roll(result)
+        except OSError as error:
+            click.echo(history_error_line(error), err=True)
 
         # Display results
         self._display_roll_result(result)
 
     def show_history(self, limit: int = 20) -> None:
-        """Display roll history (default: last 20 rolls)"""
-        history = self.history.get_history(limit)
+        """Display roll history (default: last 20 rolls)
 
-        if not history:
+        Entries are rendered as they are read, so --all streams even a
+        very large history in constant memory.
+        """
+        history = self.history.iter_history(limit)
+        first = next(history, None)
+
+        if first is None:
             click.echo("📜 No roll history found.")
             return
 
         click.echo("📜 Roll History:")
         click.echo("=" * 50)
 
-        for entry in history:
+        for entry in itertools.chain([first], history):
             timestamp = datetime.fromisoformat(entry['timestamp'])
             time_str = timestamp.strftime("%Y-%m-%d %H:%M:%S")
 
             click.echo(f"🕐 {time_str}")
             click.echo(f"🎲 {entry['command']} → {entry['total']}")
 
-            if len(entry['individual_rolls']) > 1:
-                rolls_str = " + ".join(map(str, entry['individual_rolls']))
+            if entry.get('face_counts') is not None:
+                # As --summary shows it, so big dice print no line of every face
+                dice_roll = DiceRoll(entry['count'], entry['sides'], entry['modifier'])
+                result = HistogramResult(dice_roll, entry['face_counts'], entry['total'], entry['command'])
+                for line in summary_lines(result)[1:]:
+                    click.echo(line)
+            elif len(entry['individual_rolls']) > 1:
+                rolls_str = rolls_text(entry['individual_rolls'])
                 if entry['modifier'] != 0:
                     modifier_str = f" {entry['modifier']:+d}" if entry['modifier'] != 0 else ""
                     click.echo(f"   Rolls: [{rolls_str}]{modifier_str}")
@@ -57,46 +95,438 @@ class DiceRollerCLI:
 
             click.echo()
 
+    def show_history_stats(self, command: str = None, show_faces: bool = False, rebuild: bool = False) -> None:
+        """Display aggregate statistics from the history index without reading the history"""
+        stats = self.history.stats
+        if rebuild:
+            rolls = self.history.rebuild_stats()
+            click.echo(f"🔄 Rebuilt the statistics index from {rolls} rolls.")
+        elif not stats.exists() and self.history.get_history(limit=1):
+            click.echo("❌ No statistics index for this history yet.")
+            click.echo("Build it once with: dice-roller history stats --rebuild")
+            return
+
+        index = stats.load()
+        if not index['rolls']:
+            click.echo("📜 No roll history found.")
+            return
+
+        if command is not None:
+            summary = stats.command(command)
+            if summary is None:
+                click.echo(f"❌ No {command} rolls in history.")
+                return
+            click.echo(f"📈 {command} statistics")
+            click.echo("=" * 50)
+            click.echo(self._stats_line('Totals', summary, 'rolls'))
+            self._echo_faces(summary)
+            return
+
+        click.echo(f"📈 Roll Statistics ({index['rolls']} rolls)")
+        click.echo("=" * 50)
+        click.echo("By command:")
+        for name, aggregate in sorted(index['commands'].items(), key=lambda item: -item[1]['count']):
+            click.echo(self._stats_line(name, summarize(aggregate), 'rolls'))
+        click.echo("By die:")
+        for name, aggregate in sorted(index['dice'].items(), key=lambda item: int(item[0][1:])):
+            summary = summarize(aggregate)
+            click.echo(self._stats_line(name, summary, 'dice'))
+            if show_faces:
+                self._echo_faces(summary)
+
+    @staticmethod
+    def _stats_line(label: str, summary, unit: str) -> str:
+        """One line of count, mean, standard deviation and range"""
+        return (f"   {label}: {summary['count']} {unit}, mean {summary['mean']:.2f}, "
+                f"std dev {summary['stdev']:.2f}, range {summary['min']} to {summary['max']}")
+
+    @staticmethod
+    def _echo_faces(summary) -> None:
+        """Show how often each face came up"""
+        rolled = sum(summary['faces'].values())
+        for face, hits in summary['faces'].items():
+            click.echo(f"      {face:>4}: {hits} ({hits / rolled:.1%})")
+
+    def export_history(self, export_format: str, output: str = '-') -> None:
+        """Stream all roll history to a file (or stdout for '-') as JSON Lines or CSV"""
+        from .export import export_entries
+
+        if output == '-':
+            export_entries(self.history.iter_history(), export_format, sys.stdout)
+            return
+
+        try:
+            with open(output, 'w', newline='', encoding='utf-8') as stream:
+                exported = export_entries(self.history.iter_history(), export_format, stream)
+        except OSError as e:
+            click.echo(f"❌ Could not export history: {e}", err=True)
+            return
+        click.echo(f"✅ Exported {exported} rolls to {output}")
+
+    def show_stats(self, dice_string: str, dc: int = None, show_pmf: bool = False) -> None:
+        """Display the exact probability distribution of a dice roll"""
+        dice_roll = self.parser.parse(dice_string)
+
+        if dice_roll is None:
+            click.echo(f"❌ Invalid dice notation: {dice_string}")
+            click.echo("Valid formats: 1d20, 3d6, 4d8+3, 2d10-1")
+            return
+
+        from .probability import DiceDistribution
+
+        try:
+            distribution = DiceDistribution.from_roll(dice_roll)
+        except ValueError as e:
+            click.echo(f"❌ {e}")
+            return
+
+        click.echo(f"📊 {dice_string} statistics")
+        click.echo("=" * 50)
+        click.echo(f"   Range: {distribution.minimum} to {distribution.maximum}")
+        click.echo(f"   Mean: {float(distribution.mean):.2f}")
+        click.echo(f"   Variance: {float(distribution.variance):.2f} (std dev {distribution.stdev:.2f})")
+
+        percentiles = ", ".join(f"{p}%: {distribution.percentile(p / 100)}" for p in (5, 25, 50, 75, 95))
+        click.echo(f"   Percentiles: {percentiles}")
+
+        if dc is not None:
+            click.echo(f"   P(total ≥ {dc}): {float(distribution.prob_at_least(dc)):.2%}")
+
+        if show_pmf:
+            pmf = distribution.pmf()
+            peak = float(max(pmf.values()))
+            width = len(str(distribution.maximum))
+            click.echo()
+            for total, probability in pmf.items():
+                bar = "█" * round(30 * float(probability) / peak)
+                click.echo(f"   {total:>{width}}  {float(probability):7.2%}  {bar}")
+
+    def simulate_roll(self, dice_string: str, trials: int, workers: int = None,
+                      seed: int = None, dc: int = None) -> None:
+        """Simulate many rolls across worker processes and display the results"""
+        dice_roll = self.parser.parse(dice_string)
+
+        if dice_roll is None:
+            click.echo(f"❌ Invalid dice notation: {dice_string}")
+            click.echo("Valid formats: 1d20, 3d6, 4d8+3, 2d10-1")
+            return
+
+        from .simulate import simulate as run_simulation
+
+        result = run_simulation(dice_roll, trials, workers=workers, seed=seed)
+
+        click.echo(f"🎰 {dice_string} simulated {result.trials:,} times (seed {result.seed})")
+        click.echo("=" * 50)
+        click.echo(f"   Range seen: {min(result.histogram)} to {max(result.histogram)}")
+        click.echo(f"   Mean: {result.mean:.3f}")
+        click.echo(f"   Std dev: {result.stdev:.3f}")
+
+        if dc is not None:
+            click.echo(f"   P(total ≥ {dc}): {result.prob_at_least(dc):.2%}")
+
+    def run_audit(self, sides=None, rolls: int = 1000000, from_history: bool = False, alpha: float = 0.01) -> bool:
+        """Test the dice for fairness and independence; returns False if any test fails
+
+        Either rolls `rolls` fresh dice of every size in `sides`, or audits the
+        individual rolls stored in the history (streamed, so any size works).
+        """
+        from .audit import DEFAULT_SIDES, audit_history, audit_rolls
+
+        if from_history:
+            try:
+                results = audit_history(self.history.iter_history())
+            except OSError as e:
+                click.echo(f"❌ Could not read roll history: {e}", err=True)
+                return False
+            if sides:
+                results = {size: result for size, result in results.items() if size in sides}
+            if not results:
+                click.echo("📜 No stored rolls to audit.")
+                return True
+            click.echo(f"🔍 Auditing stored rolls (significance level {alpha})")
+        else:
+            click.echo(f"🔍 Auditing {rolls:,} fresh rolls per die with the '{self.roller.engine}' engine "
+                       f"(significance level {alpha})")
+            results = {size: audit_rolls(size, rolls, roller=self.roller) for size in (sides or DEFAULT_SIDES)}
+
+        click.echo("=" * 50)
+        for size, result in results.items():
+            verdict = "✅" if result.passed(alpha) else "⚠️ "
+            click.echo(f"{verdict} d{size}: {result.values:,} values")
+            for name, p_value in result.p_values.items():
+                shown = "not enough values" if p_value is None else f"p = {p_value:.4f}"
+                flag = "  ← suspicious" if p_value is not None and p_value < alpha else ""
+                click.echo(f"   {name:<20} {shown}{flag}")
+
+        passed = all(result.passed(alpha) for result in results.values())
+        click.echo("All dice look fair." if passed else "Some dice failed a test; rerun with more rolls to confirm.")
+        return passed
+
+    def run_benchmarks(self, quick: bool = False, only=None, save_path: str = None, compare_path: str = None,
+                       tolerance: float = 0.25) -> bool:
+        """Run the benchmark suite; returns False if it is slower than the baseline allows"""
+        from .benchmark import compare, format_seconds, load_baseline, regressions, run_benchmarks, save_baseline
+
+        baseline = None
+        if compare_path is not None:
+            try:
+                baseline = load_baseline(compare_path)
+            except (ValueError, OSError) as e:
+                click.echo(f"❌ Could not read baseline: {e}")
+                return False
+
+        def report(name, seconds):
+            line = f"   {name:<28} {format_seconds(seconds):>12}"
+            if baseline is not None and name in baseline:
+                comparison = compare(baseline, {name: seconds}, tolerance)[0]
+                flag = "  ← regression" if comparison.regressed else ""
+                line += f"  {comparison.ratio:6.2f}x baseline{flag}"
+            click.echo(line)
+
+        click.echo(f"⏱️  Benchmarks{' (quick)' if quick else ''}, seconds per operation")
+        click.echo("=" * 50)
+        results = run_benchmarks(quick=quick, only=only, progress=report)
+
+        if save_path is not None:
+            try:
+                save_baseline(results, save_path)
+            except OSError as e:
+                click.echo(f"❌ Could not save baseline: {e}")
+                return False
+            click.echo(f"✅ Saved {len(results)} results to {save_path}")
+
+        if baseline is None:
+            return True
+        failed = regressions(compare(baseline, results, tolerance))
+        if failed:
+            click.echo(f"❌ {len(failed)} benchmark(s) regressed by more than {tolerance:.0%}: "
+                       f"{', '.join(comparison.name for comparison in failed)}")
+            return False
+        click.echo(f"✅ No regressions beyond {tolerance:.0%}")
+        return True
+
     def clear_history(self) -> None:
         """Clear all roll history"""
-        self.history.clear_history()
+        try:
+            self.history.clear_history()
+        except OSError as error:
+            click.echo(f"❌ Could not clear roll history: {error}", err=True)
+            return
         click.echo("🗑️  Roll history cleared.")
 
-    def _display_roll_result(self, result) -> None:
-        """Display a single roll result with formatting"""
-        dice_roll = result.dice_roll
+    def convert_history(self, source: str, target: str, source_backend: str = None,
+                        target_backend: str = None) -> None:
+        """Copy a history file into another storage format, e.g. JSON Lines to binary"""
+        from .storage import convert_history, create_backend
 
-        # Main result
-        click.echo(f"🎲 {result.command} → {result.total}")
-
-        # Show individual rolls if multiple dice
-        if len(result.individual_rolls) > 1:
-            rolls_str = " + ".join(map(str, result.individual_rolls))
-            dice_sum = sum(result.individual_rolls)
+        try:
+            copied = convert_history(create_backend(source, source_backend), create_backend(target, target_backend))
+        except (ValueError, OSError) as e:
+            click.echo(f"❌ Could not convert history: {e}")
+            return
+        click.echo(f"✅ Converted {copied} rolls from {source} to {target}")
+
+    def run_server(self, host: str, port: int, socket_path: str = None, flush_interval: float = 0.5,
+                   metrics_path: str = None) -> None:
+        """Serve rolls over a local socket until interrupted"""
+        import asyncio
+        from .server import RollServer
+
+        server = RollServer(history=self.history, roller=self.roller, flush_interval=flush_interval,
+                            metrics_path=metrics_path)
+
+        def announce(running):
+            address = running.address
+            where = address if isinstance(address, str) else f"{address[0]}:{address[1]}"
+            click.echo(f"🎲 Roll server listening on {where} (Ctrl+C to stop)")
+
+        asyncio.run(server.serve(host=host, port=port, path=socket_path, ready=announce))
+        click.echo(f"👋 Roll server stopped after {server.rolls_served} rolls.")
+
+    def run_shell(self, metrics_path: str = None) -> None:
+        """Read rolls and commands line by line until quit or end of input
+
+        The parser, roller and an in-memory view of recent history stay
+        alive for the whole session, so each roll skips interpreter startup
+        and history is not re-read from disk. Rolls are written to disk in
+        the background (write-behind) and flushed when the shell exits.
+        With `metrics_path`, metrics are written to that file after every
+        line (see Metrics.write).
+        """
+        self.history.keep_in_memory(self.SHELL_HISTORY_SIZE)
+        self.history.write_behind()
+        interactive = sys.stdin.isatty()
+
+        if interactive:
+            click.echo("🎲 Dice roller shell. Enter a roll (e.g. 3d6+2), 'history', 'clear', 'help' or 'quit'.")
+
+        try:
+            while True:
+                try:
+                    line = input(self.SHELL_PROMPT) if interactive else sys.stdin.readline()
+                except (EOFError, KeyboardInterrupt):
+                    if interactive:
+                        click.echo()
+                    break
+                if not interactive and not line:
+                    break
+                keep_going = self.run_shell_command(line)
+                if metrics_path is not None:
+                    self._write_metrics(metrics_path)
+                if not keep_going:
+                    break
+        finally:
+            try:
+                self.history.close()
+            except OSError as error:
+                click.echo(history_error_line(error), err=True)
+
+    def run_shell_command(self, line: str) -> bool:
+        """Run one shell line; returns False when the shell should exit"""
+        words = line.split()
+        if not words:
+            return True
+
+        command = words[0].lower()
+        if command in ('quit', 'exit'):
+            return False
+
+        if command == 'help':
+            click.echo("Enter a roll like 1d20 or 4d8+3, or one of:")
+            click.echo("  history [N | --limit N | --all]   show recent rolls (default: 20)")
+            click.echo("  clear                             clear roll history")
+            click.echo("  quit                              leave the shell")
+        elif command == 'history':
+            limit = 20
+            options = words[1:]
+            if options and options[0] in ('--all', '-a'):
+                limit = None
+            elif options and options[0] in ('--limit', '-l') and len(options) > 1:
+                options = options[1:]
+            if limit is not None and options:
+                try:
+                    limit = int(options[0])
+                except ValueError:
+                    click.echo(f"❌ Invalid history limit: {options[0]}")
+                    return True
+            self.show_history(limit=limit)
+        elif command == 'clear':
+            try:
+                confirmed = click.confirm('Are you sure you want to clear all history?')
+            except click.Abort:
+                confirmed = False
+            if confirmed:
+                self.clear_history()
+        else:
+            self.roll_dice(line.strip())
+        return True
+
+    def run_batch(self, lines) -> bool:
+        """Roll every notation in `lines`, then save all the rolls in one history write
+
+        Lines hold a notation and an optional repeat count ("4d6 x6"); blank
+        lines and # comments are skipped (see batch.parse_batch_line). Rolls
+        are printed as they are made, in the CLI's output mode, so --json
+        gives JSON Lines. Invalid lines are reported on stderr and skipped.
+        Returns False if any line was invalid or history could not be saved.
+        """
+        from .batch import parse_batch_line
+
+        histogram = False if self.output == 'all' else None
+        results = []
+        ok = True
+        for number, line in enumerate(lines, 1):
+            try:
+                item = parse_batch_line(line)
+            except ValueError as e:
+                click.echo(f"❌ Line {number}: {e}", err=True)
+                ok = False
+                continue
+            if item is None:
+                continue
+
+            notation, repeat = item
+            with metrics.span('parse'):
+                dice_roll = self.parser.parse(notation)
+            if dice_roll is None:
+                click.echo(f"❌ Line {number}: invalid dice notation: {notation}", err=True)
+                ok = False
+                continue
+
+            for _ in range(repeat):
+                with metrics.span('roll'):
+                    result = self.roller.roll(dice_roll, notation, histogram=histogram)
+                results.append(result)
+                self._display_roll_result(result)
+
+        if results:
+            try:
+                self.history.add_rolls(results)
+            except OSError as error:
+                click.echo(history_error_line(error), err=True)
+                ok = False
+        return ok
+
+    @staticmethod
+    def _write_metrics(path: str) -> None:
+        """Write the metrics file, warning instead of failing"""
+        try:
+            metrics.write(path)
+        except OSError as e:
+            click.echo(f"⚠️  Could not write metrics to {path}: {e}", err=True)
 
-            if dice_roll.modifier != 0:
-                modifier_str = f" {dice_roll.modifier:+d}"
-                click.echo(f"   Rolls: [{rolls_str}] = {dice_sum}{modifier_str} = {result.total}")
-            else:
-                click.echo(f"   Rolls: [{rolls_str}] = {result.total}")
+    def _display_roll_result(self, result) -> None:
+        """Display a single roll result with formatting"""
+        with metrics.span('render'):
+            write_roll_result(result, sys.stdout, self.output)
 
 
 # CLI Commands
 @click.group(invoke_without_command=True, no_args_is_help=True)
+@click.option('--profile', is_flag=True, help='Print time spent per stage and counters to stderr when done')
+@click.option('--summary', 'output', flag_value='summary', help='Print the total, face counts and min/max only')
+@click.option('--json', 'output', flag_value='json', help='Print the roll as one JSON object')
+@click.option('--quiet', '-q', 'output', flag_value='quiet', help='Print the total only')
+@click.option('--all-rolls', 'output', flag_value='all',
+              help='List every die, even above the 100 dice that are otherwise shown')
 @click.argument('args', nargs=-1)
 @click.pass_context
-def main(ctx, args):
+def main(ctx, profile, output, args):
     """D&D Dice Roller CLI
 
     Roll dice using standard D&D notation:
     - dice-roller 1d20 (roll one 20-sided die)
     - dice-roller 3d6 (roll three 6-sided dice and sum)
     - dice-roller 4d8+3 (roll four 8-sided dice, sum, and add 3)
+    - dice-roller 100000d6 --summary (total and face counts; also --json, --quiet, --all-rolls)
 
     Or use subcommands for history management:
     - dice-roller history (show roll history)
+    - dice-roller history --export csv -o rolls.csv (export all history)
+    - dice-roller history stats --faces (counts, means and faces rolled)
     - dice-roller clear (clear roll history)
+    - dice-roller shell (interactive session for many rolls)
+    - dice-roller batch rolls.txt (roll a file of notations in one go; - reads stdin)
+    - dice-roller serve (local roll server for bots)
+    - dice-roller convert history.json history.bin (change storage format)
+
+    And for probabilities:
+    - dice-roller stats 12d6+4 --dc 40 (exact odds for a roll)
+    - dice-roller simulate 3d6 --trials 1000000 (Monte Carlo simulation)
+    - dice-roller audit --sides 20 (test the dice for bias and correlation)
+    - dice-roller engines (compare the speed of the dice engines)
+    - dice-roller benchmark --save baseline.json (time the roller, then --compare later)
+
+    Add --profile (dice-roller --profile 3d6) to see where the time goes.
     """
+    if '--profile' in args:
+        # Also accepted after the notation or subcommand name
+        args = tuple(arg for arg in args if arg != '--profile')
+        profile = True
+    if profile:
+        metrics.enable()
+        ctx.call_on_close(_print_profile)
+
     if ctx.invoked_subcommand is not None:
         return
 
@@ -108,10 +538,15 @@ def main(ctx, args):
     first_arg = args[0].lower()
     if first_arg in ['history', 'clear']:
         # Manually invoke the subcommand
-        if first_arg == 'history':
+        if first_arg == 'history' and len(args) > 1 and args[1].lower() == 'stats':
+            with history_stats.make_context('history stats', list(args[2:]), parent=ctx) as sub_ctx:
+                history_stats.invoke(sub_ctx)
+        elif first_arg == 'history':
             # Parse options if provided
             limit = 20  # default
             show_all = False
+            export_format = None
+            output = '-'
 
             i = 1
             while i < len(args):
@@ -124,10 +559,19 @@ def main(ctx, args):
                 elif args[i] in ['--all', '-a']:
                     show_all = True
                     i += 1
+                elif args[i] in ['--export', '-e'] and i + 1 < len(args):
+                    export_format = args[i + 1].lower()
+                    if export_format not in EXPORT_FORMATS:
+                        raise click.BadParameter(f"choose from {', '.join(EXPORT_FORMATS)}",
+                                                 param_hint="'--export'")
+                    i += 2
+                elif args[i] in ['--output', '-o'] and i + 1 < len(args):
+                    output = args[i + 1]
+                    i += 2
                 else:
                     i += 1
 
-            ctx.invoke(history, limit=limit, all=show_all)
+            ctx.invoke(history, limit=limit, all=show_all, export_format=export_format, output=output)
         elif first_arg == 'clear':
             # For clear command, we need to handle confirmation manually
             if click.confirm('Are you sure you want to clear all history?'):
@@ -137,24 +581,49 @@ def main(ctx, args):
                 ctx.exit(1)
         return
 
-    # Treat as dice notation
+    # Other subcommands are swallowed by the notation argument, so dispatch them here
+    command = main.get_command(ctx, first_arg)
+    if command is not None:
+        with command.make_context(first_arg, list(args[1:]), parent=ctx) as sub_ctx:
+            command.invoke(sub_ctx)
+        return
+
+    # Treat as dice notation, with output flags allowed after it
     dice_string = args[0]
-    cli = DiceRollerCLI()
+    for flag in args[1:]:
+        output = DiceRollerCLI.OUTPUT_FLAGS.get(flag, output)
+    cli = DiceRollerCLI(output=output or 'full')
     cli.roll_dice(dice_string)
 
 
 @main.command()
 @click.option('--limit', '-l', type=int, default=20, help='Number of recent rolls to show (default: 20)')
 @click.option('--all', '-a', is_flag=True, help='Show all roll history')
-def history(limit, all):
+@click.option('--export', '-e', 'export_format', type=click.Choice(EXPORT_FORMATS, case_sensitive=False),
+              default=None, help='Write all history as jsonl or csv instead of showing it')
+@click.option('--output', '-o', default='-', help='File to export to (default: standard output)')
+def history(limit, all, export_format=None, output='-'):
     """Show roll history (default: last 20 rolls)"""
     cli = DiceRollerCLI()
-    if all:
+    if export_format:
+        cli.export_history(export_format.lower(), output)
+    elif all:
         cli.show_history(limit=None)
     else:
         cli.show_history(limit=limit)
 
 
+@click.command('stats')
+@click.option('--command', '-c', 'command_filter', default=None,
+              help='Only show this command (e.g. 1d20), with its face counts')
+@click.option('--faces', is_flag=True, help='Show how often each face of each die came up')
+@click.option('--rebuild', is_flag=True, help='Recompute the statistics index from the full history first')
+def history_stats(command_filter, faces, rebuild):
+    """Show roll statistics from the history index (dice-roller history stats)"""
+    cli = DiceRollerCLI()
+    cli.show_history_stats(command=command_filter, show_faces=faces, rebuild=rebuild)
+
+
 @main.command()
 @click.confirmation_option(prompt='Are you sure you want to clear all history?')
 def clear():
@@ -163,5 +632,153 @@ def clear():
     cli.clear_history()
 
 
+def _print_profile() -> None:
+    """Print the --profile breakdown"""
+    for line in metrics.profile_lines():
+        click.echo(line, err=True)
+
+
+@main.command()
+@click.option('--metrics', 'metrics_path', type=click.Path(dir_okay=False), default=None,
+              help='Keep a metrics file updated (Prometheus text, or JSON if it ends in .json)')
+def shell(metrics_path):
+    """Start an interactive session that rolls one notation per line"""
+    if metrics_path is not None:
+        metrics.enable()
+    cli = DiceRollerCLI()
+    cli.run_shell(metrics_path=metrics_path)
+
+
+@main.command()
+@click.argument('source', type=click.File('r'), default='-')
+@click.option('--summary', 'output', flag_value='summary', help='Print the total, face counts and min/max only')
+@click.option('--json', 'output', flag_value='json', help='Print one JSON object per roll (JSON Lines)')
+@click.option('--quiet', '-q', 'output', flag_value='quiet', help='Print the totals only')
+@click.option('--all-rolls', 'output', flag_value='all', help='List every die of every roll')
+@click.pass_context
+def batch(ctx, source, output):
+    """Roll every notation in a file (or - for stdin), one per line, e.g. "4d6 x6" """
+    # Output flags given before the command name (dice-roller --json batch) apply too
+    output = output or ctx.parent.params.get('output') or 'full'
+    cli = DiceRollerCLI(output=output)
+    if not cli.run_batch(source):
+        ctx.exit(1)
+
+
+@main.command()
+@click.option('--host', default='127.0.0.1', help='Interface to listen on (default: 127.0.0.1)')
+@click.option('--port', '-p', type=int, default=7777, help='TCP port to listen on (default: 7777)')
+@click.option('--socket', 'socket_path', type=click.Path(), default=None,
+              help='Listen on this Unix socket instead of TCP')
+@click.option('--flush-interval', type=float, default=0.5,
+              help='Seconds between batched history writes (default: 0.5)')
+@click.option('--metrics', 'metrics_path', type=click.Path(dir_okay=False), default=None,
+              help='Rewrite this metrics file every flush (Prometheus text, or JSON if it ends in .json)')
+@click.option('--totals-only', is_flag=True,
+              help='Draw totals straight from their exact distribution; replies list no individual dice')
+def serve(host, port, socket_path, flush_interval, metrics_path, totals_only):
+    """Run a local roll server speaking newline-delimited JSON"""
+    if metrics_path is not None:
+        metrics.enable()
+    cli = DiceRollerCLI(totals_only=totals_only)
+    cli.run_server(host, port, socket_path=socket_path, flush_interval=flush_interval, metrics_path=metrics_path)
+
+
+@main.command()
+@click.argument('source', type=click.Path(dir_okay=False))
+@click.argument('target', type=click.Path(dir_okay=False))
+@click.option('--from', 'source_backend', default=None,
+              help='Storage format of SOURCE (default: chosen by file suffix)')
+@click.option('--to', 'target_backend', default=None,
+              help='Storage format of TARGET (default: chosen by file suffix, e.g. .bin for binary)')
+def convert(source, target, source_backend, target_backend):
+    """Convert a history file between storage formats (jsonl, binary, sqlite, segmented)"""
+    cli = DiceRollerCLI()
+    cli.convert_history(source, target, source_backend=source_backend, target_backend=target_backend)
+
+
+@main.command()
+@click.argument('notation')
+@click.option('--dc', type=int, default=None, help='Show the chance to roll at least this total')
+@click.option('--pmf', is_flag=True, help='Show the probability of every possible total')
+def stats(notation, dc, pmf):
+    """Show exact probabilities for a dice roll"""
+    cli = DiceRollerCLI()
+    cli.show_stats(notation, dc=dc, show_pmf=pmf)
+
+
+@main.command()
+@click.argument('notation')
+@click.option('--trials', '-n', type=click.IntRange(min=1), default=1000000,
+              help='Number of rolls to simulate (default: 1000000)')
+@click.option('--workers', '-w', type=click.IntRange(min=1), default=None,
+              help='Worker processes (default: number of CPUs)')
+@click.option('--seed', type=int, default=None, help='Master seed, for reproducible results')
+@click.option('--dc', type=int, default=None, help='Estimate the chance to roll at least this total')
+def simulate(notation, trials, workers, seed, dc):
+    """Simulate many rolls using multiple CPU cores"""
+    cli = DiceRollerCLI()
+    cli.simulate_roll(notation, trials, workers=workers, seed=seed, dc=dc)
+
+
+@main.command()
+@click.option('--sides', '-s', type=click.IntRange(min=2), multiple=True,
+              help='Die size to audit; repeat for several (default: 4 6 8 10 12 20 100)')
+@click.option('--rolls', '-n', type=click.IntRange(min=1), default=1000000,
+              help='Fresh rolls per die size (default: 1000000)')
+@click.option('--engine', type=click.Choice(DiceRoller.ENGINES, case_sensitive=False), default=None,
+              help='Dice engine to audit (default: DICE_ROLLER_ENGINE or auto)')
+@click.option('--seed', type=int, default=None, help='Seed the roller, for reproducible audits')
+@click.option('--history', 'from_history', is_flag=True, help='Audit the rolls stored in history instead')
+@click.option('--alpha', type=click.FloatRange(0, 1, min_open=True, max_open=True), default=0.01,
+              help='Significance level below which a p-value is flagged (default: 0.01)')
+@click.pass_context
+def audit(ctx, sides, rolls, engine, seed, from_history, alpha):
+    """Test the dice roller for bias and correlation (chi-squared, serial and runs tests)"""
+    try:
+        cli = DiceRollerCLI(engine=engine, seed=seed)
+    except click.ClickException as e:
+        raise click.UsageError(e.message)
+    if not cli.run_audit(sides=sides, rolls=rolls, from_history=from_history, alpha=alpha):
+        ctx.exit(1)
+
+
+@main.command()
+@click.option('--dice', '-n', type=click.IntRange(min=1), default=100000,
+              help='Dice per timed roll (default: 100000)')
+@click.option('--sides', '-s', type=click.IntRange(min=1), default=20, help='Sides per die (default: 20)')
+@click.option('--repeat', '-r', type=click.IntRange(min=1), default=3,
+              help='Timed rolls per engine; the fastest counts (default: 3)')
+def engines(dice, sides, repeat):
+    """Compare how fast each dice engine generates dice"""
+    from .roller import available_engines, benchmark_engines
+
+    click.echo(f"⏱️  {dice:,}d{sides}, best of {repeat}")
+    click.echo("=" * 50)
+    for engine, per_second in benchmark_engines(dice, sides, repeat=repeat).items():
+        click.echo(f"   {engine:<8} {per_second / 1e6:8.2f} M dice/s")
+    missing = set(DiceRoller.ENGINES) - set(available_engines())
+    if missing:
+        click.echo(f"   (not available: {', '.join(sorted(missing))})")
+
+
+@main.command()
+@click.option('--quick', is_flag=True, help='Smaller roll counts and history sizes, for a run of a few seconds')
+@click.option('--only', multiple=True, help='Run only this benchmark or group; repeatable (e.g. roll, history.add_roll.1000)')
+@click.option('--save', 'save_path', type=click.Path(dir_okay=False), default=None,
+              help='Write the results to this JSON baseline file')
+@click.option('--compare', 'compare_path', type=click.Path(exists=True, dir_okay=False), default=None,
+              help='Compare against a saved baseline and fail on regressions')
+@click.option('--tolerance', type=click.FloatRange(min=0), default=0.25,
+              help='Slowdown allowed before a benchmark fails the comparison (default: 0.25 = 25%)')
+@click.pass_context
+def benchmark(ctx, quick, only, save_path, compare_path, tolerance):
+    """Time parsing, rolling, history and CLI startup; save or compare JSON baselines"""
+    cli = DiceRollerCLI()
+    if not cli.run_benchmarks(quick=quick, only=only, save_path=save_path, compare_path=compare_path,
+                              tolerance=tolerance):
+        ctx.exit(1)
+
+
 if __name__ == '__main__':
     main()
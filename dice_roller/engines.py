@@ -0,0 +1,151 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/dice_roller/engines.py
+import random
+from importlib.util import find_spec
+from math import floor, lgamma, log, sqrt
+from typing import List
+
+# NumPy is optional and only imported the first time it is needed
+HAS_NUMPY = find_spec('numpy') is not None
+
+# memoryview formats used to read random bytes as unsigned ints, by width
+_UNIT_FORMATS = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}
+
+
+def loop_randints(rng: random.Random, count: int, sides: int) -> List[int]:
+    """Roll one die at a time with Random.randint"""
+    return [rng.randint(1, sides) for _ in range(count)]
+
+
+def bulk_randints(rng: random.Random, count: int, sides: int) -> List[int]:
+    """Roll all dice from large blocks of random bits
+
+    Random bytes are drawn with a single getrandbits call per block and
+    read as fixed-width unsigned ints. Values from the incomplete top
+    range are rejected so that every face stays equally likely.
+    """
+    if sides == 1:
+        return [1] * count
+
+    # The one-byte path emits faces as bytes, so it only covers dice up to d255
+    if sides < 256:
+        width = 1
+    else:
+        width = next((w for w in (2, 4, 8) if sides <= 256 ** w), None)
+    if width is None:
+        return [rng.randrange(sides) + 1 for _ in range(count)]
+
+    span = 256 ** width
+    limit = span - span % sides
+
+    if width == 1:
+        # Map accepted bytes straight to faces and drop rejected ones in C
+        table = bytes(b % sides + 1 if b < limit else 0 for b in range(256))
+        rejected = bytes(range(limit, 256))
+
+        def convert(data: bytes) -> bytes:
+            return data.translate(table, rejected)
+    else:
+        fmt = _UNIT_FORMATS[width]
+
+        def convert(data: bytes) -> List[int]:
+            return [value % sides + 1 for value in memoryview(data).cast(fmt) if value < limit]
+
+    rolls = []
+    while len(rolls) < count:
+        needed = count - len(rolls)
+        # Draw enough units to cover the expected rejections in one pass
+        units = needed * span // limit + 16
+        data = rng.getrandbits(units * width * 8).to_bytes(units * width, 'little')
+        rolls.extend(convert(data))
+
+    del rolls[count:]
+    return rolls
+
+
+def secure_randints(rng: random.SystemRandom, count: int, sides: int) -> List[int]:
+    """Roll all dice from the operating system's CSPRNG (os.urandom)
+
+    Uses the same block-and-reject sampling as bulk_randints, so even a
+    single die costs one urandom call instead of one per randint.
+    """
+    return bulk_randints(rng, count, sides)
+
+
+def numpy_generator(seed: int):
+    """Create a NumPy Generator (PCG64) from an integer seed"""
+    import numpy
+    return numpy.random.default_rng(seed)
+
+
+def numpy_randints(generator, count: int, sides: int) -> List[int]:
+    """Roll all dice with a single NumPy Generator.integers call"""
+    return generator.integers(1, sides, endpoint=True, size=count).tolist()
+
+
+def multinomial_counts(rng: random.Random, count: int, sides: int) -> List[int]:
+    """How many of `count` fair dice show each face, without rolling them one by one
+
+    Face i gets a binomial share of the dice not yet given to faces below
+    it, which samples the multinomial distribution exactly with one
+    binomial draw per face: O(sides) time whatever the number of dice.
+    """
+    counts = []
+    remaining = count
+    for face in range(sides - 1):
+        hits = binomial_variate(rng, remaining, 1 / (sides - face)) if remaining else 0
+        counts.append(hits)
+        remaining -= hits
+    counts.append(remaining)
+    return counts
+
+
+def binomial_variate(rng: random.Random, n: int, p: float) -> int:
+    """Number of successes in n trials of probability p, in expected O(1) time
+
+    Uses the geometric method when n*p is small and Hörmann's BTRS
+    transformed rejection otherwise, the algorithms behind
+    random.binomialvariate in Python 3.12+.
+    """
+    if p <= 0.0 or n == 0:
+        return 0
+    if p >= 1.0:
+        return n
+    if p > 0.5:
+        return n - binomial_variate(rng, n, 1.0 - p)
+
+    if n * p < 10.0:
+        # Skip over the failures between successes, one geometric jump per success
+        successes = trials = 0
+        c = log(1.0 - p)
+        while True:
+            trials += floor(log(rng.random()) / c) + 1
+            if trials > n:
+                return successes
+            successes += 1
+
+    spq = sqrt(n * p * (1.0 - p))
+    b = 1.15 + 2.53 * spq
+    a = -0.0873 + 0.0248 * b + 0.01 * p
+    c = n * p + 0.5
+    vr = 0.92 - 4.2 / b
+    alpha = (2.83 + 5.1 / b) * spq
+    lpq = log(p / (1.0 - p))
+    m = floor((n + 1) * p)
+    h = lgamma(m + 1) + lgamma(n - m + 1)
+    while True:
+        u = rng.random() - 0.5
+        v = rng.random()
+        us = 0.5 - abs(u)
+        k = floor((2.0 * a / us + b) * u + c)
+        if k < 0 or k > n:
+            continue
+        if us >= 0.07 and v <= vr:
+            return k
+        v = log(v * alpha / (a / (us * us) + b))
+        if v <= h - lgamma(k + 1) - lgamma(n - k + 1) + (k - m) * lpq:
+            return k
+
+
+def numpy_multinomial_counts(generator, count: int, sides: int) -> List[int]:
+    """How many of `count` fair dice show each face, from one NumPy Generator.multinomial call"""
+    return generator.multinomial(count, [1 / sides] * sides).tolist()
@@ -0,0 +1,52 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/dice_roller/export.py
+import csv
+import json
+from typing import Any, Dict, Iterable, TextIO
+
+EXPORT_FORMATS = ('jsonl', 'csv')
+
+# CSV columns, in order; individual rolls and face counts are written space-separated in one column each
+CSV_FIELDS = ('timestamp', 'command', 'count', 'sides', 'modifier', 'individual_rolls', 'total', 'face_counts')
+
+
+def export_entries(entries: Iterable[Dict[str, Any]], export_format: str, stream: TextIO) -> int:
+    """Write history entries to a text stream as JSON Lines or CSV
+
+    Entries are written one at a time as they are consumed, so exporting
+    from RollHistory.iter_history() needs constant memory. Returns the
+    number of entries written.
+    """
+    if export_format == 'jsonl':
+        write_row = _jsonl_writer(stream)
+    elif export_format == 'csv':
+        write_row = _csv_writer(stream)
+    else:
+        raise ValueError(f"Unknown export format: {export_format} (choose from {', '.join(EXPORT_FORMATS)})")
+
+    written = 0
+    for entry in entries:
+        write_row(entry)
+        written += 1
+    return written
+
+
+def _jsonl_writer(stream: TextIO):
+    """Row writer producing one compact JSON object per line"""
+    def write_row(entry: Dict[str, Any]) -> None:
+        stream.write(json.dumps(entry, separators=(',', ':')) + '\n')
+    return write_row
+
+
+def _csv_writer(stream: TextIO):
+    """Row writer producing CSV with a header row"""
+    writer = csv.writer(stream)
+    writer.writerow(CSV_FIELDS)
+    rolls_column = CSV_FIELDS.index('individual_rolls')
+    faces_column = CSV_FIELDS.index('face_counts')
+
+    def write_row(entry: Dict[str, Any]) -> None:
+        row = [entry.get(field, '') for field in CSV_FIELDS]
+        row[rolls_column] = ' '.join(map(str, entry.get('individual_rolls', [])))
+        row[faces_column] = ' '.join(map(str, entry.get('face_counts', [])))
+        writer.writerow(row)
+    return write_row
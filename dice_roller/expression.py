@@ -0,0 +1,307 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/dice_roller/expression.py
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, List, Optional, Tuple, Union
+from .parser import DiceRoll
+
+
+# AST nodes
+
+@dataclass(frozen=True)
+class Number:
+    value: int
+
+
+@dataclass(frozen=True)
+class Dice:
+    count: int
+    sides: int
+
+
+@dataclass(frozen=True)
+class Negate:
+    operand: 'Node'
+
+
+@dataclass(frozen=True)
+class BinaryOp:
+    op: str
+    left: 'Node'
+    right: 'Node'
+
+
+Node = Union[Number, Dice, Negate, BinaryOp]
+
+# Binding strength used for parsing and for printing parentheses
+PRECEDENCE = {'+': 1, '-': 1, '*': 2}
+
+TOKEN_PATTERN = re.compile(r'\s*(?:(\d+)d(\d+)|(\d+)|([-+*()]))', re.IGNORECASE)
+
+
+class ExpressionError(ValueError):
+    """Raised when a dice expression cannot be parsed"""
+
+
+class CompiledExpression:
+    """A dice expression compiled once for repeated evaluation
+
+    `dice` lists the dice groups to roll, in order. Their sums are combined
+    by `combine`, a Python function generated from the optimized AST, so
+    evaluating the expression never touches the parser again.
+    """
+
+    def __init__(self, tree: Node):
+        self.tree = tree
+        dice = []
+        code = _generate_code(tree, dice)
+        self.dice = tuple(DiceRoll(count=node.count, sides=node.sides) for node in dice)
+        self.combine = eval(f"lambda s: {code}", {'__builtins__': {}})
+
+    def __str__(self) -> str:
+        return _render(self.tree)
+
+    def __repr__(self) -> str:
+        return f"CompiledExpression('{self}')"
+
+    def evaluate(self, roll_dice: Callable[[int, int], List[int]]) -> Tuple[int, List[List[int]]]:
+        """Roll every dice group with roll_dice(count, sides) and compute the total"""
+        rolls = [roll_dice(dice.count, dice.sides) for dice in self.dice]
+        return self.combine([sum(group) for group in rolls]), rolls
+
+    def as_dice_roll(self) -> Optional[DiceRoll]:
+        """The equivalent single-term DiceRoll (XdY±Z), or None if there is none"""
+        tree = self.tree
+        modifier = 0
+        if isinstance(tree, BinaryOp) and tree.op in '+-' and isinstance(tree.right, Number):
+            modifier = tree.right.value if tree.op == '+' else -tree.right.value
+            tree = tree.left
+        if isinstance(tree, Dice):
+            return DiceRoll(count=tree.count, sides=tree.sides, modifier=modifier)
+        return None
+
+
+@lru_cache(maxsize=256)
+def compile_expression(expression: str) -> CompiledExpression:
+    """Parse and optimize a dice expression like 2d6+1d4+3 or (1d8+2)*2
+
+    Supports dice terms, integers, +, -, * and parentheses. Constant
+    subexpressions are folded and dice of the same size added with the
+    same sign are merged (1d20+1d20 becomes 2d20). Raises ExpressionError
+    for invalid expressions, including ones too long or too deeply nested
+    to compile.
+    """
+    tokens = _tokenize(expression)
+    parser = _Parser(tokens)
+    try:
+        tree = parser.parse_expression()
+        if parser.position != len(tokens):
+            raise ExpressionError(f"Unexpected '{tokens[parser.position][1]}' in {expression}")
+        return CompiledExpression(_optimize(tree))
+    except ExpressionError:
+        raise
+    except (RecursionError, SyntaxError, MemoryError):
+        # Optimizing and code generation recurse once per term, and Python
+        # refuses to compile the generated lambda past ~200 nested parentheses
+        raise ExpressionError(f"Expression is too long or nested too deeply: {expression}") from None
+    except ValueError:
+        # A folded constant with more digits than str() writes into the generated code
+        raise ExpressionError(f"Number too large in {expression}") from None
+
+
+def _tokenize(expression: str) -> List[Tuple[str, Union[str, int, Dice]]]:
+    """Split an expression into (kind, value) tokens"""
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = TOKEN_PATTERN.match(expression, position)
+        if not match:
+            raise ExpressionError(f"Invalid dice expression: {expression}")
+        count, sides, number, symbol = match.groups()
+        if count is not None:
+            count, sides = _integer(count), _integer(sides)
+            if count <= 0 or sides <= 0:
+                raise ExpressionError(f"Dice need a positive count and number of sides: {match.group().strip()}")
+            tokens.append(('dice', Dice(count, sides)))
+        elif number is not None:
+            tokens.append(('number', _integer(number)))
+        else:
+            tokens.append(('symbol', symbol))
+        position = match.end()
+
+    if not tokens:
+        raise ExpressionError("Empty dice expression")
+    return tokens
+
+
+def _integer(digits: str) -> int:
+    """Convert a run of digits, which int() refuses past sys.get_int_max_str_digits()"""
+    try:
+        return int(digits)
+    except ValueError:
+        raise ExpressionError(f"Number too large: {len(digits)} digits") from None
+
+
+class _Parser:
+    """Recursive descent parser producing an AST from tokens"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def parse_expression(self, min_precedence: int = 1) -> Node:
+        """expression := unary (op unary)*, honouring operator precedence"""
+        left = self.parse_unary()
+        while True:
+            op = self._peek_symbol()
+            if op not in PRECEDENCE or PRECEDENCE[op] < min_precedence:
+                return left
+            self.position += 1
+            right = self.parse_expression(PRECEDENCE[op] + 1)
+            left = BinaryOp(op, left, right)
+
+    def parse_unary(self) -> Node:
+        """unary := ('+' | '-') unary | atom"""
+        op = self._peek_symbol()
+        if op in ('+', '-'):
+            self.position += 1
+            operand = self.parse_unary()
+            return Negate(operand) if op == '-' else operand
+        return self.parse_atom()
+
+    def parse_atom(self) -> Node:
+        """atom := dice | number | '(' expression ')'"""
+        if self.position >= len(self.tokens):
+            raise ExpressionError("Dice expression ends unexpectedly")
+
+        kind, value = self.tokens[self.position]
+        self.position += 1
+        if kind == 'dice':
+            return value
+        if kind == 'number':
+            return Number(value)
+        if value == '(':
+            inner = self.parse_expression()
+            if self._peek_symbol() != ')':
+                raise ExpressionError("Missing closing parenthesis")
+            self.position += 1
+            return inner
+        raise ExpressionError(f"Unexpected '{value}'")
+
+    def _peek_symbol(self) -> Optional[str]:
+        """The next token if it is an operator or parenthesis"""
+        if self.position < len(self.tokens) and self.tokens[self.position][0] == 'symbol':
+            return self.tokens[self.position][1]
+        return None
+
+
+def _optimize(node: Node) -> Node:
+    """Fold constants and merge like dice terms"""
+    if isinstance(node, (Number, Dice)):
+        return node
+
+    if isinstance(node, Negate):
+        operand = _optimize(node.operand)
+        if isinstance(operand, Number):
+            return Number(-operand.value)
+        if isinstance(operand, Negate):
+            return operand.operand
+        return _optimize_sum(Negate(operand))
+
+    if node.op == '*':
+        left, right = _optimize(node.left), _optimize(node.right)
+        if isinstance(left, Number) and isinstance(right, Number):
+            return Number(left.value * right.value)
+        if right == Number(1):
+            return left
+        if left == Number(1):
+            return right
+        return BinaryOp('*', left, right)
+
+    return _optimize_sum(node)
+
+
+def _optimize_sum(node: Node) -> Node:
+    """Rebuild an additive chain with one constant and merged dice groups"""
+    terms = []
+    constant = 0
+    merged = {}
+    for sign, term in _flatten_sum(node, 1):
+        term = _optimize(term)
+        if isinstance(term, Number):
+            constant += sign * term.value
+        elif isinstance(term, Dice):
+            key = (sign, term.sides)
+            if key in merged:
+                index = merged[key]
+                terms[index] = (sign, Dice(terms[index][1].count + term.count, term.sides))
+            else:
+                merged[key] = len(terms)
+                terms.append((sign, term))
+        else:
+            terms.append((sign, term))
+
+    if constant or not terms:
+        terms.append((1, Number(constant)) if constant >= 0 else (-1, Number(-constant)))
+
+    sign, first = terms[0]
+    tree = first if sign > 0 else Negate(first)
+    if isinstance(tree, Negate) and isinstance(first, Number):
+        tree = Number(-first.value)
+    for sign, term in terms[1:]:
+        tree = BinaryOp('+' if sign > 0 else '-', tree, term)
+    return tree
+
+
+def _flatten_sum(node: Node, sign: int):
+    """Yield (sign, term) for every term of an additive chain"""
+    if isinstance(node, BinaryOp) and node.op in ('+', '-'):
+        yield from _flatten_sum(node.left, sign)
+        yield from _flatten_sum(node.right, sign if node.op == '+' else -sign)
+    elif isinstance(node, Negate):
+        yield from _flatten_sum(node.operand, -sign)
+    else:
+        yield sign, node
+
+
+def _generate_code(node: Node, dice: List[Dice]) -> str:
+    """Python source computing the expression from a list `s` of dice group sums"""
+    if isinstance(node, Number):
+        return f"({node.value})"
+    if isinstance(node, Dice):
+        dice.append(node)
+        return f"s[{len(dice) - 1}]"
+    if isinstance(node, Negate):
+        return f"(-{_generate_code(node.operand, dice)})"
+    return f"({_generate_code(node.left, dice)} {node.op} {_generate_code(node.right, dice)})"
+
+
+def _precedence(node: Node) -> int:
+    """Binding strength of a node when printed"""
+    if isinstance(node, BinaryOp):
+        return PRECEDENCE[node.op]
+    if isinstance(node, Negate) or (isinstance(node, Number) and node.value < 0):
+        return 3
+    return 4
+
+
+def _render(node: Node) -> str:
+    """Canonical notation of an AST with only the parentheses it needs"""
+    if isinstance(node, Number):
+        return str(node.value)
+    if isinstance(node, Dice):
+        return f"{node.count}d{node.sides}"
+    if isinstance(node, Negate):
+        operand = _render(node.operand)
+        return f"-{operand}" if _precedence(node.operand) >= 3 else f"-({operand})"
+
+    precedence = PRECEDENCE[node.op]
+    left = _render(node.left)
+    if _precedence(node.left) < precedence:
+        left = f"({left})"
+    right = _render(node.right)
+    # Operators are left-associative, so a-(b+c) and a*(b*c) keep their parentheses
+    if _precedence(node.right) <= precedence:
+        right = f"({right})"
+    return f"{left}{node.op}{right}"
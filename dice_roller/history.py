@@ -1,16 +1,27 @@
 # /Users/marcozingoni/Playgound/Python/diceRoller/dice_roller/history.py
-import json
 import os
+from collections import deque
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any
-from .roller import RollResult
+from typing import List, Dict, Any, Iterator, Optional, Union
+from .aggregates import HistoryStats
+from .metrics import metrics
+from .roller import HistogramResult, RollResult
+from .storage import HistoryBackend, create_backend
+from .writebehind import BATCH_SIZE, FLUSH_INTERVAL, WriteBehindWriter
 
 
 class RollHistory:
-    """Manages roll history storage and retrieval"""
+    """Manages roll history storage and retrieval
 
-    def __init__(self, history_file: str = None):
+    Storage is delegated to a backend from dice_roller.storage: an
+    append-only JSON Lines file by default, or an SQLite database when the
+    history file ends in .db/.sqlite or a backend is selected explicitly
+    (the `backend` argument, a backend name or instance, or the
+    DICE_ROLLER_BACKEND environment variable).
+    """
+
+    def __init__(self, history_file: str = None, backend: Union[str, HistoryBackend] = None):
         if history_file is None:
             # Check environment variable first
             env_file = os.getenv('DICE_ROLLER_HISTORY')
@@ -21,51 +32,151 @@ class RollHistory:
                 self.history_file = home / '.dice_roller_history.json'
         else:
             self.history_file = Path(history_file)
+        self.backend = create_backend(self.history_file, backend)
+        self.stats = HistoryStats(self.history_file)
+        self._recent = None
+        self._writer = None
 
-    def add_roll(self, result: RollResult) -> None:
+    def add_roll(self, result: Union[RollResult, HistogramResult]) -> None:
         """Add a roll result to history"""
-        history = self._load_history()
+        self.add_entries([self.create_entry(result)])
+
+    def add_rolls(self, results: List[Union[RollResult, HistogramResult]]) -> None:
+        """Add several roll results to history in a single write"""
+        self.add_entries([self.create_entry(result) for result in results])
 
-        roll_entry = {
+    def create_entry(self, result: Union[RollResult, HistogramResult]) -> Dict[str, Any]:
+        """Build the history entry for a roll, timestamped now
+
+        A HistogramResult is stored with empty individual_rolls and its
+        per-face counts under 'face_counts'. Raises TypeError for an
+        ExpressionResult, which has no single dice roll to record.
+        """
+        if not isinstance(result, (RollResult, HistogramResult)):
+            raise TypeError(f"Cannot store a {type(result).__name__} in roll history")
+        entry = {
             'timestamp': datetime.now().isoformat(),
             'command': result.command,
             'count': result.dice_roll.count,
             'sides': result.dice_roll.sides,
             'modifier': result.dice_roll.modifier,
-            'individual_rolls': result.individual_rolls,
+            'individual_rolls': [] if isinstance(result, HistogramResult) else result.individual_rolls,
             'total': result.total
         }
+        if isinstance(result, HistogramResult):
+            entry['face_counts'] = result.face_counts
+        return entry
+
+    def add_entries(self, entries: List[Dict[str, Any]]) -> None:
+        """Persist prepared history entries in a single write"""
+        if not entries:
+            return
+        if self._writer is not None:
+            self._writer.add(entries)
+        else:
+            self._write_entries(entries)
+        if self._recent is not None:
+            self._recent.extend(entries)
+
+    def write_behind(self, batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL) -> None:
+        """Queue new rolls in memory and write them from a background thread
+
+        add_roll no longer waits for the disk: entries are written in
+        batches of `batch_size` or after `flush_interval` seconds, and
+        whatever is still queued is written by flush(), close(), at exit and
+        on SIGTERM. Reads through this object flush first, so they always
+        include every roll added here.
+        """
+        if self._writer is None:
+            self._writer = WriteBehindWriter(self._write_entries, batch_size=batch_size,
+                                             flush_interval=flush_interval)
+
+    def flush(self) -> None:
+        """Write any rolls queued by write-behind mode"""
+        if self._writer is not None:
+            self._writer.flush()
+
+    def close(self) -> None:
+        """Write queued rolls and return to synchronous writes"""
+        if self._writer is not None:
+            writer, self._writer = self._writer, None
+            writer.close()
 
-        history.append(roll_entry)
-        self._save_history(history)
+    def keep_in_memory(self, size: int) -> None:
+        """Keep the last `size` entries in memory for long-running sessions
+
+        The view is loaded from storage once and then updated by add_roll,
+        so limited reads no longer touch the disk. Rolls added by other
+        processes after this call are not reflected in limited reads.
+        """
+        self.flush()
+        self._recent = deque(self.backend.tail(size), maxlen=size)
+        self._recent_complete = len(self._recent) < size
 
     def get_history(self, limit: int = 20) -> List[Dict[str, Any]]:
         """Get roll history, limited to recent entries (default: last 20)"""
+        if limit is not None and limit > 0:
+            if self._recent is not None and (limit <= len(self._recent) or self._recent_complete):
+                return list(self._recent)[-limit:]
+            self.flush()
+            with metrics.span('history.read'):
+                return self.backend.tail(limit)
+
         history = self._load_history()
 
         if limit is None:
             return history
         return history[-limit:]
 
+    def iter_history(self, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Yield roll history in chronological order without building a list
+
+        With no limit every roll is streamed from storage, so memory use
+        stays constant however large the history is. A positive limit
+        yields the last `limit` rolls, like get_history.
+        """
+        if limit is not None and limit > 0:
+            return iter(self.get_history(limit))
+        self.flush()
+        return self.backend.iter_entries()
+
+    def find_rolls(self, command: Optional[str] = None, since: Optional[str] = None,
+                   until: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Find rolls by command and ISO timestamp range (since inclusive, until exclusive)"""
+        self.flush()
+        return self.backend.query(command=command, since=since, until=until, limit=limit)
+
     def clear_history(self) -> None:
         """Clear all roll history"""
+        self.flush()
         self._save_history([])
+        self.stats.clear()
+        if self._recent is not None:
+            self._recent.clear()
+            self._recent_complete = True
 
-    def _load_history(self) -> List[Dict[str, Any]]:
-        """Load history from file"""
-        if not self.history_file.exists():
-            return []
+    def rebuild_stats(self) -> int:
+        """Recompute the statistics index from the stored history; returns the number of rolls"""
+        return self.stats.rebuild(self.iter_history())
 
+    def _write_entries(self, entries: List[Dict[str, Any]]) -> None:
+        """Persist entries and add them to the statistics index"""
+        with metrics.span('history.write'):
+            self.backend.append(entries)
         try:
-            with open(self.history_file, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
-            return []
+            with metrics.span('history.stats'):
+                # The backend directly: flush() here would wait on the write-behind thread
+                self.stats.update(entries, history=self.backend.iter_entries)
+        except OSError:
+            pass  # The rolls are saved; a stale index is fixed by rebuild_stats()
+
+    def _load_history(self) -> List[Dict[str, Any]]:
+        """Load history from storage"""
+        self.flush()
+        with metrics.span('history.read'):
+            return self.backend.load_all()
 
     def _save_history(self, history: List[Dict[str, Any]]) -> None:
-        """Save history to file"""
-        try:
-            with open(self.history_file, 'w') as f:
-                json.dump(history, f, indent=2)
-        except IOError:
-            pass  # Silently fail if we can't write history
+        """Save history to storage, replacing its contents"""
+        with metrics.span('history.write'):
+            self.backend.replace(history)
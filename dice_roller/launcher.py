@@ -0,0 +1,53 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/dice_roller/launcher.py
+import sys
+from typing import List, Optional
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Console entry point with a fast path for plain dice notation
+
+    `dice-roller 3d6` is the most common invocation, so a single valid
+    notation is rolled and printed here without importing click or the
+    rest of the CLI. Everything else is handed to dice_roller.cli.main.
+    """
+    args = sys.argv[1:] if argv is None else argv
+
+    if len(args) == 1 and not args[0].startswith('-') and roll_notation(args[0]):
+        return
+
+    if '--profile' in args:
+        from .metrics import metrics
+        metrics.enable()
+        with metrics.span('import'):
+            from .cli import main as cli_main
+    else:
+        from .cli import main as cli_main
+    cli_main(args=args)
+
+
+def roll_notation(dice_string: str) -> bool:
+    """Roll, record and print a notation; returns False if it is not valid"""
+    from .parser import DiceParser
+
+    dice_roll = DiceParser.parse(dice_string)
+    if dice_roll is None:
+        return False
+
+    from .history import RollHistory
+    from .render import history_error_line, write_roll_result
+    from .roller import DiceRoller
+
+    try:
+        roller = DiceRoller()
+        history = RollHistory()
+    except ValueError as error:
+        # A bad DICE_ROLLER_ENGINE, DICE_ROLLER_SEED or DICE_ROLLER_BACKEND; reported as click would
+        sys.exit(f"Error: {error}")
+
+    result = roller.roll(dice_roll, dice_string, histogram=None)
+    try:
+        history.add_roll(result)
+    except OSError as error:
+        sys.stderr.write(history_error_line(error) + '\n')
+    write_roll_result(result, sys.stdout)
+    return True
@@ -0,0 +1,161 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/dice_roller/metrics.py
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Counters kept while metrics are enabled, with their descriptions
+COUNTERS = {
+    'rolls': 'Rolls made',
+    'dice': 'Dice generated',
+    'history_bytes_written': 'Bytes appended or rewritten in history files',
+}
+
+# Counters the parse cache keeps itself (DiceParser.cache_info), reported alongside
+CACHE_COUNTERS = {
+    'parse_cache_hits': 'Notations answered from the parse cache',
+    'parse_cache_misses': 'Notations that had to be parsed',
+}
+
+# Prefix of every exported metric name
+PREFIX = 'dice_roller'
+
+# Returned by span() while disabled: entering and leaving it does nothing
+_NO_SPAN = nullcontext()
+
+
+class Metrics:
+    """Timing spans and counters for one process
+
+    Everything is off until enable() is called. While disabled, span()
+    returns a shared do-nothing context manager and callers guard count()
+    with `if metrics.enabled:`, so instrumented hot paths pay for one
+    attribute check.
+
+    Spans add up the wall time and number of calls per stage name
+    ('parse', 'roll', 'history.write', ...). Counters are plain integers
+    named in COUNTERS; the parse cache's own hit and miss counts are added
+    when reporting. Everything can be printed as a --profile breakdown or
+    exported in the Prometheus text format or as JSON.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def enable(self) -> None:
+        """Start recording spans and counters"""
+        self.enabled = True
+
+    def disable(self) -> None:
+        """Stop recording; what was recorded is kept"""
+        self.enabled = False
+
+    def reset(self) -> None:
+        """Forget every span and counter"""
+        with self._lock:
+            # stage name -> [calls, seconds], in the order stages first ran
+            self.spans = {}
+            self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def span(self, name: str):
+        """Context manager timing one run of a stage"""
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, name)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        """Record one run of a stage that took `seconds`"""
+        with self._lock:
+            stage = self.spans.setdefault(name, [0, 0.0])
+            stage[0] += 1
+            stage[1] += seconds
+
+    def count(self, name: str, amount: int = 1) -> None:
+        """Add to a counter"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Copy of the current counters and spans"""
+        from .parser import DiceParser
+
+        cache = DiceParser.cache_info()
+        with self._lock:
+            return {
+                'counters': dict(self.counters, parse_cache_hits=cache.hits, parse_cache_misses=cache.misses),
+                'spans': {name: {'calls': calls, 'seconds': seconds} for name, (calls, seconds) in self.spans.items()}
+            }
+
+    def profile_lines(self) -> List[str]:
+        """Human-readable breakdown of time per stage, slowest first, and the counters"""
+        snapshot = self.snapshot()
+        spans = sorted(snapshot['spans'].items(), key=lambda item: item[1]['seconds'], reverse=True)
+        lines = ["⏱️  Profile"]
+        width = max((len(name) for name, _ in spans), default=0)
+        for name, stage in spans:
+            calls = stage['calls']
+            lines.append(f"   {name:<{width}}  {stage['seconds'] * 1000:9.3f} ms  "
+                         f"({calls} call{'s' if calls != 1 else ''})")
+        counters = ", ".join(f"{name.replace('_', ' ')} {value:,}" for name, value in snapshot['counters'].items())
+        lines.append(f"   {counters}")
+        return lines
+
+    def to_prometheus(self) -> str:
+        """The metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in snapshot['counters'].items():
+            metric = f"{PREFIX}_{name}_total"
+            lines.append(f"# HELP {metric} {COUNTERS.get(name) or CACHE_COUNTERS.get(name, name)}")
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        for metric, field, description in (('stage_seconds_total', 'seconds', 'Time spent per stage'),
+                                           ('stage_calls_total', 'calls', 'Runs of each stage')):
+            lines.append(f"# HELP {PREFIX}_{metric} {description}")
+            lines.append(f"# TYPE {PREFIX}_{metric} counter")
+            for name, stage in snapshot['spans'].items():
+                lines.append(f'{PREFIX}_{metric}{{stage="{name}"}} {stage[field]}')
+        return '\n'.join(lines) + '\n'
+
+    def to_json(self) -> str:
+        """The metrics as a JSON object with 'counters' and 'spans'"""
+        return json.dumps(self.snapshot(), indent=2, sort_keys=True) + '\n'
+
+    def write(self, path: Path) -> None:
+        """Atomically write the metrics to a file: JSON for *.json, otherwise Prometheus text
+
+        The file can be picked up by the node exporter's text file collector
+        or any other scraper; readers never see a half-written file.
+        """
+        path = Path(path)
+        text = self.to_json() if path.suffix.lower() == '.json' else self.to_prometheus()
+        temp_path = path.with_name(path.name + '.tmp')
+        with open(temp_path, 'w') as f:
+            f.write(text)
+        os.replace(temp_path, path)
+
+
+class _Span:
+    """Times the block it wraps and records it on exit"""
+
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics: Metrics, name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self) -> '_Span':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.metrics.add_time(self.name, time.perf_counter() - self.start)
+
+
+# Metrics of this process, shared by every module
+metrics = Metrics()
@@ -1,37 +1,143 @@
 # /Users/marcozingoni/Playgound/Python/diceRoller/dice_roller/parser.py
 import re
+import threading
+from collections import OrderedDict, namedtuple
 from dataclasses import dataclass
 from typing import Optional
 
 
-@dataclass
+@dataclass(frozen=True)
 class DiceRoll:
-    """Represents a parsed dice roll command"""
+    """Represents a parsed dice roll command
+
+    Instances are immutable and hashable, so the parse cache can hand the
+    same object to every caller.
+    """
     count: int
     sides: int
     modifier: int = 0
 
 
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+# Marks a notation that is not in the cache (None is a cached parse failure)
+_MISSING = object()
+
+
 class DiceParser:
-    """Parses D&D dice notation like 1d20, 3d6, 4d8+3"""
+    """Parses D&D dice notation like 1d20, 3d6, 4d8+3
+
+    Results are kept in a bounded LRU cache keyed on both the raw and the
+    normalized notation, so repeated notations skip parsing entirely.
+    """
 
     DICE_PATTERN = re.compile(r'^(\d+)d(\d+)([+-]\d+)?$', re.IGNORECASE)
 
+    # Maximum number of notations kept in the parse cache (0 disables it)
+    CACHE_SIZE = 256
+
+    _cache = OrderedDict()
+    _cache_lock = threading.Lock()
+    _cache_hits = 0
+    _cache_misses = 0
+
     @classmethod
     def parse(cls, dice_string: str) -> Optional[DiceRoll]:
         """Parse dice notation string into DiceRoll object"""
-        dice_string = dice_string.strip().replace(' ', '')
+        dice_roll = cls._cache_get(dice_string)
+        if dice_roll is not _MISSING:
+            return dice_roll
+
+        normalized = dice_string.strip().replace(' ', '')
+        if normalized != dice_string:
+            dice_roll = cls._cache_get(normalized)
+            if dice_roll is not _MISSING:
+                cls._cache_put(dice_string, dice_roll)
+                return dice_roll
+
+        with cls._cache_lock:
+            cls._cache_misses += 1
+        dice_roll = cls._parse_normalized(normalized)
+        cls._cache_put(normalized, dice_roll)
+        if normalized != dice_string:
+            cls._cache_put(dice_string, dice_roll)
+        return dice_roll
+
+    @classmethod
+    def compile(cls, expression: str):
+        """Compile a multi-term expression (2d6+1d4+3, (1d8+2)*2) for repeated rolling
+
+        Returns a CompiledExpression, or None if the expression is invalid.
+        """
+        from .expression import ExpressionError, compile_expression
+
+        try:
+            return compile_expression(expression)
+        except ExpressionError:
+            return None
+
+    @classmethod
+    def cache_info(cls) -> CacheInfo:
+        """Report parse cache statistics"""
+        with cls._cache_lock:
+            return CacheInfo(cls._cache_hits, cls._cache_misses, cls.CACHE_SIZE, len(cls._cache))
+
+    @classmethod
+    def clear_cache(cls) -> None:
+        """Empty the parse cache and reset its statistics"""
+        with cls._cache_lock:
+            cls._cache.clear()
+            cls._cache_hits = 0
+            cls._cache_misses = 0
+
+    @classmethod
+    def set_cache_size(cls, size: int) -> None:
+        """Change the maximum number of cached notations, evicting the oldest"""
+        if size < 0:
+            raise ValueError("Cache size cannot be negative")
+        with cls._cache_lock:
+            cls.CACHE_SIZE = size
+            while len(cls._cache) > size:
+                cls._cache.popitem(last=False)
 
+    @classmethod
+    def _parse_normalized(cls, dice_string: str) -> Optional[DiceRoll]:
+        """Parse notation that has already been stripped of whitespace"""
         match = cls.DICE_PATTERN.match(dice_string)
         if not match:
             return None
 
-        count = int(match.group(1))
-        sides = int(match.group(2))
-        modifier = int(match.group(3)) if match.group(3) else 0
+        try:
+            count = int(match.group(1))
+            sides = int(match.group(2))
+            modifier = int(match.group(3)) if match.group(3) else 0
+        except ValueError:
+            # More digits than int() converts (sys.get_int_max_str_digits)
+            return None
 
         # Validate dice parameters
         if count <= 0 or sides <= 0:
             return None
 
         return DiceRoll(count=count, sides=sides, modifier=modifier)
+
+    @classmethod
+    def _cache_get(cls, key: str):
+        """Look up a notation, marking it as recently used"""
+        with cls._cache_lock:
+            dice_roll = cls._cache.get(key, _MISSING)
+            if dice_roll is not _MISSING:
+                cls._cache.move_to_end(key)
+                cls._cache_hits += 1
+            return dice_roll
+
+    @classmethod
+    def _cache_put(cls, key: str, dice_roll: Optional[DiceRoll]) -> None:
+        """Store a parse result, evicting the least recently used notations"""
+        with cls._cache_lock:
+            if cls.CACHE_SIZE <= 0:
+                return
+            cls._cache[key] = dice_roll
+            cls._cache.move_to_end(key)
+            while len(cls._cache) > cls.CACHE_SIZE:
+                cls._cache.popitem(last=False)
@@ -0,0 +1,155 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/dice_roller/probability.py
+import decimal
+import math
+from fractions import Fraction
+from functools import lru_cache
+from typing import Dict, Tuple
+from .parser import DiceRoll
+
+
+# Largest packed polynomial, in decimal digits, built for an exact distribution
+MAX_EXACT_DIGITS = 5 * 10 ** 7
+
+
+class DiceDistribution:
+    """Exact probability distribution of a dice roll total
+
+    The distribution is stored as the number of ways to roll each total,
+    starting at `minimum`, out of `outcomes` equally likely outcomes. All
+    probabilities are returned as exact fractions.
+    """
+
+    def __init__(self, minimum: int, counts: Tuple[int, ...], outcomes: int):
+        self.minimum = minimum
+        self.counts = counts
+        self.outcomes = outcomes
+
+    @classmethod
+    def from_roll(cls, dice_roll: DiceRoll) -> 'DiceDistribution':
+        """Build the distribution of a parsed roll, including its modifier"""
+        counts = dice_counts(dice_roll.count, dice_roll.sides)
+        return cls(
+            minimum=dice_roll.count + dice_roll.modifier,
+            counts=counts,
+            outcomes=dice_roll.sides ** dice_roll.count
+        )
+
+    @property
+    def maximum(self) -> int:
+        """Highest possible total"""
+        return self.minimum + len(self.counts) - 1
+
+    def probability(self, total: int) -> Fraction:
+        """P(total == value)"""
+        if not self.minimum <= total <= self.maximum:
+            return Fraction(0)
+        return Fraction(self.counts[total - self.minimum], self.outcomes)
+
+    def pmf(self) -> Dict[int, Fraction]:
+        """Probability mass function as {total: probability}"""
+        return {
+            self.minimum + offset: Fraction(ways, self.outcomes)
+            for offset, ways in enumerate(self.counts)
+        }
+
+    def cdf(self, total: int) -> Fraction:
+        """P(total <= value)"""
+        if total < self.minimum:
+            return Fraction(0)
+        if total >= self.maximum:
+            return Fraction(1)
+        return Fraction(sum(self.counts[:total - self.minimum + 1]), self.outcomes)
+
+    def prob_at_least(self, dc: int) -> Fraction:
+        """P(total >= dc), e.g. the chance to meet a difficulty class"""
+        if dc <= self.minimum:
+            return Fraction(1)
+        if dc > self.maximum:
+            return Fraction(0)
+        return Fraction(sum(self.counts[dc - self.minimum:]), self.outcomes)
+
+    @property
+    def mean(self) -> Fraction:
+        """Expected total"""
+        weighted = sum(offset * ways for offset, ways in enumerate(self.counts))
+        return self.minimum + Fraction(weighted, self.outcomes)
+
+    @property
+    def variance(self) -> Fraction:
+        """Variance of the total"""
+        weighted = sum(offset * ways for offset, ways in enumerate(self.counts))
+        squared = sum(offset * offset * ways for offset, ways in enumerate(self.counts))
+        offset_mean = Fraction(weighted, self.outcomes)
+        return Fraction(squared, self.outcomes) - offset_mean * offset_mean
+
+    @property
+    def stdev(self) -> float:
+        """Standard deviation of the total"""
+        return math.sqrt(self.variance)
+
+    def percentile(self, p: float) -> int:
+        """Smallest total whose cumulative probability reaches p (0 < p <= 1)"""
+        if not 0 < p <= 1:
+            raise ValueError("Percentile must be in the range (0, 1]")
+
+        target = Fraction(str(p)) * self.outcomes
+        cumulative = 0
+        for offset, ways in enumerate(self.counts):
+            cumulative += ways
+            if cumulative >= target:
+                return self.minimum + offset
+        return self.maximum
+
+
+@lru_cache(maxsize=64)
+def die_counts(sides: int) -> Tuple[int, ...]:
+    """Ways to roll each face of a single die (faces 1..sides)"""
+    if sides <= 0:
+        raise ValueError("A die needs at least one side")
+    return (1,) * sides
+
+
+@lru_cache(maxsize=32)
+def dice_counts(count: int, sides: int) -> Tuple[int, ...]:
+    """Ways to roll each total of `count` dice, starting from a total of `count`
+
+    The die's generating polynomial is raised to the `count` power using
+    Kronecker substitution: the coefficients are packed as fixed-width
+    digit groups of one big decimal with room for the largest result
+    coefficient, so decimal exponentiation (which multiplies huge numbers
+    with a number-theoretic transform) does the convolutions exactly.
+    """
+    if count <= 0:
+        raise ValueError("A roll needs at least one die")
+    # Checked before building anything: even a single die's counts hold `sides` terms
+    if sides > 0 and packed_digits(count, sides) > MAX_EXACT_DIGITS:
+        raise ValueError(f"{count}d{sides} is too large for an exact distribution")
+
+    single = die_counts(sides)
+    if count == 1 or sides == 1:
+        return single if count == 1 else (1,)
+
+    # Every coefficient of the result is below sides ** count
+    width = int(count * math.log10(sides)) + 2
+    terms = count * (sides - 1) + 1
+
+    context = decimal.Context(prec=terms * width + 1, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN)
+    context.traps[decimal.Inexact] = True
+    packed = decimal.Decimal(''.join(str(ways).zfill(width) for ways in reversed(single)))
+    digits = format(context.power(packed, count), 'f').zfill(terms * width)
+
+    # Decimal to int conversion avoids the int/str digit limit for huge counts
+    return tuple(
+        int(decimal.Decimal(digits[index - width:index]))
+        for index in range(terms * width, 0, -width)
+    )
+
+
+def packed_digits(count: int, sides: int) -> int:
+    """Decimal digits of the packed polynomial dice_counts works with; its cost grows with this"""
+    return (count * (sides - 1) + 1) * (int(count * math.log10(sides)) + 2)
+
+
+def distribution(dice_roll: DiceRoll) -> DiceDistribution:
+    """Exact distribution of a parsed roll's total"""
+    return DiceDistribution.from_roll(dice_roll)
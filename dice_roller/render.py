@@ -0,0 +1,164 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/dice_roller/render.py
+import json
+from collections import Counter
+from itertools import islice
+from typing import List, Optional, Sequence, TextIO, Union
+from .roller import HistogramResult, RollResult
+
+# How a roll is printed:
+# - 'full': every die, or the first and last few above MAX_ROLLS_SHOWN
+# - 'all': every die, however many, streamed in chunks
+# - 'summary': total, dice count, min/max and face counts
+# - 'json': one JSON object per roll, streamed in chunks
+# - 'quiet': the total alone
+# A HistogramResult has no individual dice to list, so 'full' and 'all' print its summary
+OUTPUT_MODES = ('full', 'all', 'summary', 'json', 'quiet')
+
+# Rolls with more dice than this are elided in 'full' mode
+MAX_ROLLS_SHOWN = 100
+
+# Dice shown at each end of an elided list
+ELIDED_KEEP = 10
+
+# Dice formatted per write when streaming every die
+CHUNK_DICE = 10000
+
+# Summaries list every face's count for dice with at most this many sides
+SUMMARY_MAX_FACES = 20
+
+
+def roll_result_lines(result: Union[RollResult, HistogramResult],
+                      max_rolls: Optional[int] = MAX_ROLLS_SHOWN) -> List[str]:
+    """Format a single roll result as output lines
+
+    Rolls of more than `max_rolls` dice show only the first and last few
+    (None shows every die). Kept free of click so the fast start path can
+    print rolls without importing it. Raises TypeError for an
+    ExpressionResult, which has no single dice roll to show.
+    """
+    if not isinstance(result, (RollResult, HistogramResult)):
+        raise TypeError(f"Cannot format a {type(result).__name__} as a roll")
+    if isinstance(result, HistogramResult):
+        return summary_lines(result)
+    dice_roll = result.dice_roll
+
+    # Main result
+    lines = [f"🎲 {result.command} → {result.total}"]
+
+    # Show individual rolls if multiple dice
+    if len(result.individual_rolls) > 1:
+        rolls_str = rolls_text(result.individual_rolls, max_rolls)
+        dice_sum = sum(result.individual_rolls)
+
+        if dice_roll.modifier != 0:
+            modifier_str = f" {dice_roll.modifier:+d}"
+            lines.append(f"   Rolls: [{rolls_str}] = {dice_sum}{modifier_str} = {result.total}")
+        else:
+            lines.append(f"   Rolls: [{rolls_str}] = {result.total}")
+
+    return lines
+
+
+def rolls_text(rolls: Sequence[int], max_rolls: Optional[int] = MAX_ROLLS_SHOWN) -> str:
+    """Dice joined with ' + ', eliding the middle of lists longer than max_rolls"""
+    if max_rolls is None or len(rolls) <= max_rolls:
+        return " + ".join(map(str, rolls))
+    keep = min(ELIDED_KEEP, max_rolls // 2)
+    head = " + ".join(map(str, islice(rolls, keep)))
+    tail = " + ".join(map(str, islice(rolls, len(rolls) - keep, None)))
+    return f"{head} + … ({len(rolls) - 2 * keep:,} more) … + {tail}"
+
+
+def summary_lines(result: Union[RollResult, HistogramResult]) -> List[str]:
+    """Total, number of dice, lowest and highest die and, for small dice, how often each face came up"""
+    lines = [f"🎲 {result.command} → {result.total}"]
+    if isinstance(result, HistogramResult):
+        faces = Counter({face: hits for face, hits in enumerate(result.face_counts, 1) if hits})
+    else:
+        faces = Counter(result.individual_rolls)
+    if not faces:
+        return lines
+
+    dice = sum(faces.values())
+    lines.append(f"   Dice: {dice:,} (min {min(faces)}, max {max(faces)}, "
+                 f"mean {sum(face * hits for face, hits in faces.items()) / dice:.2f})")
+    sides = result.dice_roll.sides
+    if sides <= SUMMARY_MAX_FACES:
+        lines.append("   Faces: " + faces_text([faces[face] for face in range(1, sides + 1)]))
+    return lines
+
+
+def faces_text(face_counts: Sequence[int]) -> str:
+    """How many dice showed each face, e.g. '1×3  2×0  3×5'"""
+    return "  ".join(f"{face}×{hits:,}" for face, hits in enumerate(face_counts, 1))
+
+
+def write_roll_result(result: Union[RollResult, HistogramResult], stream: TextIO, mode: str = 'full',
+                      max_rolls: Optional[int] = MAX_ROLLS_SHOWN) -> None:
+    """Write one roll to a text stream in the given output mode
+
+    Modes that print every die ('all', 'json') format and write the dice
+    CHUNK_DICE at a time, so even a million-die roll is never held as one
+    string. Only 'quiet' accepts an ExpressionResult; other modes raise
+    TypeError for it.
+    """
+    if mode == 'quiet':
+        stream.write(f"{result.total}\n")
+    elif not isinstance(result, (RollResult, HistogramResult)):
+        raise TypeError(f"Cannot write a {type(result).__name__} in {mode} mode")
+    elif mode == 'summary' or (mode in ('full', 'all') and isinstance(result, HistogramResult)):
+        stream.write('\n'.join(summary_lines(result)) + '\n')
+    elif mode == 'json':
+        _write_json(result, stream)
+    elif mode == 'all' or (mode == 'full' and max_rolls is None):
+        _write_all_rolls(result, stream)
+    elif mode == 'full':
+        stream.write('\n'.join(roll_result_lines(result, max_rolls)) + '\n')
+    else:
+        raise ValueError(f"Unknown output mode: {mode} (choose from {', '.join(OUTPUT_MODES)})")
+
+
+def _write_all_rolls(result: RollResult, stream: TextIO) -> None:
+    """Write a roll listing every die, a chunk of dice per write"""
+    rolls = result.individual_rolls
+    modifier = result.dice_roll.modifier
+    stream.write(f"🎲 {result.command} → {result.total}\n")
+    if len(rolls) <= 1:
+        return
+    stream.write("   Rolls: [")
+    _write_joined(rolls, " + ", stream)
+    if modifier != 0:
+        stream.write(f"] = {result.total - modifier} {modifier:+d} = {result.total}\n")
+    else:
+        stream.write(f"] = {result.total}\n")
+
+
+def _write_json(result: Union[RollResult, HistogramResult], stream: TextIO) -> None:
+    """Write a roll as one JSON line, the dice a chunk at a time (face counts for a HistogramResult)"""
+    dice_roll = result.dice_roll
+    header = json.dumps({
+        'command': result.command,
+        'count': dice_roll.count,
+        'sides': dice_roll.sides,
+        'modifier': dice_roll.modifier,
+        'total': result.total
+    }, ensure_ascii=False)
+    if isinstance(result, HistogramResult):
+        stream.write(header[:-1] + ', "face_counts": [')
+        _write_joined(result.face_counts, ", ", stream)
+    else:
+        stream.write(header[:-1] + ', "individual_rolls": [')
+        _write_joined(result.individual_rolls, ", ", stream)
+    stream.write("]}\n")
+
+
+def _write_joined(values: Sequence[int], separator: str, stream: TextIO) -> None:
+    """Write ints with a separator between them, CHUNK_DICE per write"""
+    for start in range(0, len(values), CHUNK_DICE):
+        chunk = separator.join(map(str, values[start:start + CHUNK_DICE]))
+        stream.write(chunk if start == 0 else separator + chunk)
+
+
+def history_error_line(error: OSError) -> str:
+    """Warning shown when a roll could not be saved to history"""
+    return f"⚠️  Could not save roll history: {error}"
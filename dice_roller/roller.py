@@ -1,32 +1,156 @@
 # /Users/marcozingoni/Playgound/Python/diceRoller/dice_roller/roller.py
+import os
 import random
+import time
 from dataclasses import dataclass
-from typing import List
+from typing import Dict, List, Optional, Sequence, TYPE_CHECKING, Union
 from .parser import DiceRoll
+from .alias import total_table
+from .engines import (
+    HAS_NUMPY, bulk_randints, loop_randints, multinomial_counts, numpy_generator, numpy_multinomial_counts,
+    numpy_randints, secure_randints
+)
+from .metrics import metrics
+
+if TYPE_CHECKING:
+    from .expression import CompiledExpression
 
 
 @dataclass
 class RollResult:
-    """Represents the result of a dice roll"""
+    """Represents the result of a dice roll
+
+    individual_rolls is empty for rolls made by a totals_only DiceRoller.
+    """
     dice_roll: DiceRoll
     individual_rolls: List[int]
     total: int
     command: str
 
 
+@dataclass
+class HistogramResult:
+    """Result of a roll kept as how many dice showed each face
+
+    face_counts[i] is the number of dice that came up i + 1. Huge rolls
+    are stored this way: a million d6 is six ints instead of a million.
+    """
+    dice_roll: DiceRoll
+    face_counts: List[int]
+    total: int
+    command: str
+
+    @property
+    def individual_rolls(self) -> List[int]:
+        """Every die, grouped by face; the order they were rolled in is not kept
+
+        Builds a list as long as the dice count, so code that can use
+        face_counts directly should.
+        """
+        return [face for face, hits in enumerate(self.face_counts, 1) for _ in range(hits)]
+
+
+@dataclass
+class ExpressionResult:
+    """Represents the result of rolling a compiled dice expression
+
+    An expression has no single count, sides and modifier, so these
+    results cannot be stored in RollHistory or written by dice_roller.render
+    (other than as a bare total); both raise TypeError for them.
+    """
+    expression: 'CompiledExpression'
+    dice_rolls: List[List[int]]
+    total: int
+    command: str
+
+    @property
+    def individual_rolls(self) -> List[int]:
+        """Every die rolled, across all dice groups"""
+        return [roll for group in self.dice_rolls for roll in group]
+
+
 class DiceRoller:
-    """Handles dice rolling mechanics"""
+    """Handles dice rolling mechanics
+
+    Rolls of at least HISTOGRAM_THRESHOLD dice (with no more sides than
+    dice) can be returned as a HistogramResult instead of a RollResult:
+    the face counts are drawn from the multinomial distribution directly,
+    in time proportional to the sides rather than the dice.
+
+    A totals_only roller does not generate dice at all: each total is
+    drawn in O(1) from an alias table of the roll's exact distribution
+    (see dice_roller.alias), and results have empty individual_rolls.
+
+    The engine decides how dice are generated:
+    - 'loop': one randint call per die
+    - 'bulk': all dice from large blocks of random bits (pure Python)
+    - 'numpy': all dice from one vectorized NumPy call (PCG64)
+    - 'secure': all dice from the operating system's CSPRNG, for games
+      where players must not be able to predict rolls
+    - 'auto' (default): 'loop' for small rolls, otherwise 'numpy' when
+      NumPy is installed and 'bulk' when it is not
+
+    The engine is chosen by name, then by the DICE_ROLLER_ENGINE
+    environment variable, then 'auto'. Giving a seed (or setting
+    DICE_ROLLER_SEED) makes rolls reproducible: the same seed, engine and
+    sequence of rolls always give the same dice, whether or not NumPy is
+    installed.
+    """
+
+    ENGINES = ('auto', 'loop', 'bulk', 'numpy', 'secure')
+
+    # Dice counts below this are rolled one by one in 'auto' mode
+    BULK_THRESHOLD = 32
+
+    # roll(histogram=None) returns face counts for rolls of this many dice or more
+    HISTOGRAM_THRESHOLD = 100000
+
+    # Largest die NumPy can roll with 64-bit integers
+    NUMPY_MAX_SIDES = 2 ** 63 - 1
 
-    def __init__(self):
-        self.random = random.Random()
+    def __init__(self, engine: Optional[str] = None, seed: Optional[int] = None, totals_only: bool = False):
+        engine = (engine or os.getenv('DICE_ROLLER_ENGINE') or 'auto').lower()
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine: {engine} (choose from {', '.join(self.ENGINES)})")
+        if engine == 'numpy' and not HAS_NUMPY:
+            raise ValueError("The 'numpy' engine requires NumPy to be installed")
 
-    def roll(self, dice_roll: DiceRoll, command: str) -> RollResult:
-        """Roll dice and return detailed results"""
-        individual_rolls = []
+        if seed is None:
+            seed = _env_seed()
+        if seed is not None and engine == 'secure':
+            raise ValueError("The 'secure' engine cannot be seeded")
 
-        for _ in range(dice_roll.count):
-            roll = self.random.randint(1, dice_roll.sides)
-            individual_rolls.append(roll)
+        self.random = random.SystemRandom() if engine == 'secure' else random.Random(seed)
+        self.engine = engine
+        self.seed = seed
+        self.totals_only = totals_only
+        self._numpy_generator = None
+
+    def roll(self, dice_roll: DiceRoll, command: str,
+             histogram: Optional[bool] = False) -> Union[RollResult, HistogramResult]:
+        """Roll dice and return detailed results
+
+        histogram=True returns a HistogramResult, None does so only for
+        rolls of HISTOGRAM_THRESHOLD dice or more that have no more sides
+        than dice, and False (the default) always lists every die. A
+        totals_only roller ignores `histogram` and returns the total alone.
+        """
+        if self.totals_only:
+            return RollResult(
+                dice_roll=dice_roll,
+                individual_rolls=[],
+                total=self.roll_total(dice_roll),
+                command=command
+            )
+        if histogram is None:
+            histogram = dice_roll.count >= self.HISTOGRAM_THRESHOLD and dice_roll.sides <= dice_roll.count
+        if histogram:
+            return self.roll_histogram(dice_roll, command)
+
+        individual_rolls = self._generate(dice_roll.count, dice_roll.sides)
+        if metrics.enabled:
+            metrics.count('rolls')
+            metrics.count('dice', dice_roll.count)
 
         dice_sum = sum(individual_rolls)
         total = dice_sum + dice_roll.modifier
@@ -37,3 +161,116 @@ class DiceRoller:
             total=total,
             command=command
         )
+
+    def roll_histogram(self, dice_roll: DiceRoll, command: str) -> HistogramResult:
+        """Roll dice keeping only how many came up on each face"""
+        face_counts = self._generate_counts(dice_roll.count, dice_roll.sides)
+        if metrics.enabled:
+            metrics.count('rolls')
+            metrics.count('dice', dice_roll.count)
+
+        total = sum(face * hits for face, hits in enumerate(face_counts, 1)) + dice_roll.modifier
+        return HistogramResult(
+            dice_roll=dice_roll,
+            face_counts=face_counts,
+            total=total,
+            command=command
+        )
+
+    def roll_total(self, dice_roll: DiceRoll) -> int:
+        """Roll only the total, in O(1) from the cached alias table of its exact distribution
+
+        Rolls too large for a table fall back to face counts (O(sides)),
+        or to rolling the dice when they have more sides than dice.
+        """
+        count, sides = dice_roll.count, dice_roll.sides
+        if metrics.enabled:
+            metrics.count('rolls')
+            metrics.count('dice', count)
+
+        table = total_table(count, sides)
+        if table is not None:
+            return table.sample(self.random) + count + dice_roll.modifier
+        if sides <= count:
+            face_counts = self._generate_counts(count, sides)
+            return sum(face * hits for face, hits in enumerate(face_counts, 1)) + dice_roll.modifier
+        return sum(self._generate(count, sides)) + dice_roll.modifier
+
+    def evaluate(self, expression: 'CompiledExpression', command: str = None) -> ExpressionResult:
+        """Roll a compiled expression; it is never re-parsed, however often it is rolled"""
+        total, dice_rolls = expression.evaluate(self._generate)
+        if metrics.enabled:
+            metrics.count('rolls')
+            metrics.count('dice', sum(dice.count for dice in expression.dice))
+        return ExpressionResult(
+            expression=expression,
+            dice_rolls=dice_rolls,
+            total=total,
+            command=command if command is not None else str(expression)
+        )
+
+    def _generate(self, count: int, sides: int) -> List[int]:
+        """Generate the individual rolls with the configured engine"""
+        engine = self.engine
+        if engine == 'auto':
+            if count < self.BULK_THRESHOLD:
+                engine = 'loop'
+            else:
+                # Seeded rolls must not depend on whether NumPy happens to be installed
+                engine = 'numpy' if HAS_NUMPY and self.seed is None else 'bulk'
+
+        if engine == 'numpy' and sides <= self.NUMPY_MAX_SIDES:
+            return numpy_randints(self._get_numpy_generator(), count, sides)
+        if engine == 'loop':
+            return loop_randints(self.random, count, sides)
+        if engine == 'secure':
+            return secure_randints(self.random, count, sides)
+        return bulk_randints(self.random, count, sides)
+
+    def _generate_counts(self, count: int, sides: int) -> List[int]:
+        """Generate the face counts: with NumPy for the 'numpy' engine (and unseeded 'auto')"""
+        engine = self.engine
+        if engine == 'auto':
+            engine = 'numpy' if HAS_NUMPY and self.seed is None else 'bulk'
+        # NumPy's multinomial takes the dice count as a C long too
+        if engine == 'numpy' and max(count, sides) <= self.NUMPY_MAX_SIDES:
+            return numpy_multinomial_counts(self._get_numpy_generator(), count, sides)
+        return multinomial_counts(self.random, count, sides)
+
+    def _get_numpy_generator(self):
+        """Create the NumPy generator on first use, seeded from self.random"""
+        if self._numpy_generator is None:
+            self._numpy_generator = numpy_generator(self.random.getrandbits(128))
+        return self._numpy_generator
+
+
+def available_engines() -> List[str]:
+    """Engines that can be used here, 'auto' first"""
+    return [engine for engine in DiceRoller.ENGINES if engine != 'numpy' or HAS_NUMPY]
+
+
+def benchmark_engines(count: int = 100000, sides: int = 20, engines: Optional[Sequence[str]] = None,
+                      repeat: int = 3) -> Dict[str, float]:
+    """Measure dice generated per second by each engine, best of `repeat` rolls of `count` dice"""
+    dice_roll = DiceRoll(count=count, sides=sides)
+    throughput = {}
+    for engine in engines or available_engines():
+        roller = DiceRoller(engine=engine, seed=None if engine == 'secure' else 0)
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            roller.roll(dice_roll, "benchmark")
+            best = min(best, time.perf_counter() - start)
+        throughput[engine] = count / best if best > 0 else float('inf')
+    return throughput
+
+
+def _env_seed() -> Optional[int]:
+    """The seed from the DICE_ROLLER_SEED environment variable, or None"""
+    value = os.getenv('DICE_ROLLER_SEED')
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"DICE_ROLLER_SEED must be an integer, not {value!r}")
@@ -0,0 +1,230 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/dice_roller/server.py
+import asyncio
+import json
+import signal
+import socket
+from typing import Any, Dict, List, Optional
+from .history import RollHistory
+from .metrics import metrics
+from .parser import DiceParser
+from .roller import DiceRoller
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 7777
+
+
+class RollServer:
+    """Local asyncio roll server speaking newline-delimited JSON
+
+    Each request line is either a JSON object such as
+    {"id": 1, "notation": "2d6+3"} or a bare notation such as 2d6+3. Each
+    reply is one JSON line: the roll's history entry (plus the request id)
+    or {"id": ..., "error": "..."}. Clients may pipeline many requests on
+    one connection.
+
+    History entries are queued in memory and written in batches, every
+    `flush_interval` seconds or as soon as `max_batch` rolls are waiting,
+    on a worker thread so disk writes never stall the event loop.
+
+    With `metrics_path`, the process metrics (dice_roller.metrics) are
+    written to that file after every periodic flush and on close.
+    """
+
+    def __init__(self, history: Optional[RollHistory] = None, roller: Optional[DiceRoller] = None,
+                 flush_interval: float = 0.5, max_batch: int = 1000, metrics_path: Optional[str] = None):
+        self.history = history if history is not None else RollHistory()
+        self.roller = roller if roller is not None else DiceRoller()
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.metrics_path = metrics_path
+        self.rolls_served = 0
+        self._pending = []
+        self._flush_lock = None
+        self._flush_task = None
+        self._server = None
+
+    @property
+    def address(self):
+        """Address the server is listening on: (host, port) or a socket path"""
+        sockname = self._server.sockets[0].getsockname()
+        return sockname[:2] if isinstance(sockname, tuple) else sockname
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, path: Optional[str] = None) -> None:
+        """Start listening on a TCP port (0 picks a free one) or on a Unix socket path"""
+        self._flush_lock = asyncio.Lock()
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle_client, path=path)
+        else:
+            self._server = await asyncio.start_server(self._handle_client, host=host, port=port)
+        self._flush_task = asyncio.ensure_future(self._flush_periodically())
+
+    async def close(self) -> None:
+        """Stop accepting connections and write any queued history"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        try:
+            await self.flush()
+        finally:
+            self._write_metrics()
+
+    async def serve(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, path: Optional[str] = None,
+                    ready=None) -> None:
+        """Run until SIGINT or SIGTERM, then flush history and exit
+
+        `ready`, if given, is called with the server once it is listening.
+        """
+        await self.start(host=host, port=port, path=path)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # Not supported on this platform or thread
+        if ready is not None:
+            ready(self)
+        try:
+            await stop.wait()
+        finally:
+            await self.close()
+
+    def handle_request(self, line: str) -> Dict[str, Any]:
+        """Roll the notation in one request line and build the reply"""
+        request_id = None
+        notation = line.strip()
+        if notation.startswith('{'):
+            try:
+                request = json.loads(notation)
+                request_id = request.get('id')
+                notation = request['notation']
+            except (ValueError, KeyError, AttributeError, TypeError):
+                return {'id': request_id, 'error': 'Requests must be JSON objects with a "notation" field'}
+
+        with metrics.span('parse'):
+            dice_roll = DiceParser.parse(notation) if isinstance(notation, str) else None
+        if dice_roll is None:
+            return {'id': request_id, 'error': f'Invalid dice notation: {notation}'}
+
+        with metrics.span('roll'):
+            # Huge rolls come back as face counts, so one request cannot stall every client
+            result = self.roller.roll(dice_roll, notation, histogram=None)
+        entry = self.history.create_entry(result)
+        self._pending.append(entry)
+        self.rolls_served += 1
+        return dict(entry, id=request_id)
+
+    async def flush(self) -> None:
+        """Write queued history entries in one batch"""
+        if not self._pending:
+            return
+        async with self._flush_lock:
+            entries, self._pending = self._pending, []
+            if entries:
+                loop = asyncio.get_running_loop()
+                try:
+                    await loop.run_in_executor(None, self.history.add_entries, entries)
+                except OSError:
+                    # Keep the batch for the next flush rather than dropping it
+                    self._pending[:0] = entries
+                    raise
+
+    async def _flush_periodically(self) -> None:
+        """Flush queued history every flush_interval seconds"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except OSError:
+                pass  # Retried on the next interval
+            self._write_metrics()
+
+    def _write_metrics(self) -> None:
+        """Rewrite the metrics file, if one was asked for"""
+        if self.metrics_path is None:
+            return
+        try:
+            metrics.write(self.metrics_path)
+        except OSError:
+            pass  # Retried after the next flush
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answer request lines from one connection until it closes"""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                reply = self.handle_request(line.decode('utf-8', errors='replace'))
+                writer.write(json.dumps(reply, separators=(',', ':')).encode('utf-8') + b'\n')
+                await writer.drain()
+                if len(self._pending) >= self.max_batch:
+                    try:
+                        await self.flush()
+                    except OSError:
+                        pass  # Retried by the periodic flush
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # Client went away or sent an oversized line
+        finally:
+            writer.close()
+
+
+class RollClient:
+    """Blocking client for a local RollServer
+
+    Usage:
+        with RollClient(port=7777) as client:
+            client.roll("1d20")["total"]
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, path: Optional[str] = None,
+                 timeout: float = 10.0):
+        if path is not None:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.settimeout(timeout)
+            self._socket.connect(path)
+        else:
+            self._socket = socket.create_connection((host, port), timeout=timeout)
+        self._file = self._socket.makefile('rwb')
+        self._next_id = 0
+
+    def roll(self, notation: str) -> Dict[str, Any]:
+        """Roll one notation on the server and return its reply"""
+        return self.roll_many([notation])[0]
+
+    def roll_many(self, notations: List[str]) -> List[Dict[str, Any]]:
+        """Send several notations at once and return the replies in order"""
+        for notation in notations:
+            self._next_id += 1
+            request = {'id': self._next_id, 'notation': notation}
+            self._file.write(json.dumps(request).encode('utf-8') + b'\n')
+        self._file.flush()
+        return [json.loads(self._file.readline()) for _ in notations]
+
+    def close(self) -> None:
+        """Close the connection"""
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self) -> 'RollClient':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def roll_remote(notation: str, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                path: Optional[str] = None) -> Dict[str, Any]:
+    """Roll a single notation on a running server"""
+    with RollClient(host=host, port=port, path=path) as client:
+        return client.roll(notation)
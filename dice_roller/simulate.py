@@ -0,0 +1,122 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/dice_roller/simulate.py
+import hashlib
+import math
+import os
+import random
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from .engines import bulk_randints
+from .parser import DiceRoll
+
+
+# Trials per shard; shards are the unit of work handed to a worker
+SHARD_TRIALS = 100000
+
+# Dice generated at once inside a shard, to keep worker memory constant
+BLOCK_DICE = 2 ** 16
+
+
+@dataclass
+class SimulationResult:
+    """Merged histogram of simulated roll totals"""
+    dice_roll: DiceRoll
+    histogram: Dict[int, int]
+    trials: int
+    seed: int
+
+    @property
+    def mean(self) -> float:
+        """Sample mean of the totals"""
+        return sum(total * hits for total, hits in self.histogram.items()) / self.trials
+
+    @property
+    def stdev(self) -> float:
+        """Sample standard deviation of the totals"""
+        if self.trials < 2:
+            return 0.0
+        mean = self.mean
+        squares = sum((total - mean) ** 2 * hits for total, hits in self.histogram.items())
+        return math.sqrt(squares / (self.trials - 1))
+
+    def prob_at_least(self, dc: int) -> float:
+        """Fraction of trials with a total of at least dc"""
+        return sum(hits for total, hits in self.histogram.items() if total >= dc) / self.trials
+
+
+def shard_seed(master_seed: int, shard: int) -> int:
+    """Derive the seed of one shard's random stream from the master seed
+
+    Seeds are 256-bit hashes of (master seed, shard index), so every shard
+    gets an unrelated Mersenne Twister state and the result depends only on
+    the master seed, never on how shards are spread over workers.
+    """
+    digest = hashlib.sha256(f"dice-roller:{master_seed}:{shard}".encode()).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def plan_shards(trials: int, shard_trials: int = SHARD_TRIALS) -> List[int]:
+    """Split trials into shard sizes"""
+    full, rest = divmod(trials, shard_trials)
+    return [shard_trials] * full + ([rest] if rest else [])
+
+
+def simulate_shard(task: Tuple[int, int, int, int, int]) -> Dict[int, int]:
+    """Roll one shard of trials and return its histogram of totals"""
+    count, sides, modifier, trials, seed = task
+    rng = random.Random(seed)
+    histogram = Counter()
+
+    # Whole trials per block, so a trial's dice never straddle two blocks
+    block_trials = max(1, BLOCK_DICE // count)
+    remaining = trials
+    while remaining > 0:
+        batch = min(block_trials, remaining)
+        rolls = bulk_randints(rng, batch * count, sides)
+        if count == 1:
+            histogram.update(rolls)
+        else:
+            # zip over one shared iterator groups consecutive dice into trials
+            histogram.update(map(sum, zip(*[iter(rolls)] * count)))
+        remaining -= batch
+
+    return {total + modifier: hits for total, hits in histogram.items()}
+
+
+def simulate(dice_roll: DiceRoll, trials: int, workers: Optional[int] = None,
+             seed: Optional[int] = None) -> SimulationResult:
+    """Run a Monte Carlo simulation of a roll across a pool of worker processes
+
+    Trials are split into shards, each with its own seeded random stream.
+    Workers send back a histogram per shard, which is merged as it arrives.
+    With workers=1 the shards run in this process.
+    """
+    if trials <= 0:
+        raise ValueError("Trials must be positive")
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(64)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    tasks = [
+        (dice_roll.count, dice_roll.sides, dice_roll.modifier, shard_trials, shard_seed(seed, shard))
+        for shard, shard_trials in enumerate(plan_shards(trials))
+    ]
+
+    histogram = Counter()
+    if workers == 1 or len(tasks) == 1:
+        for task in tasks:
+            histogram.update(simulate_shard(task))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            futures = [executor.submit(simulate_shard, task) for task in tasks]
+            for future in as_completed(futures):
+                histogram.update(future.result())
+
+    return SimulationResult(
+        dice_roll=dice_roll,
+        histogram=dict(sorted(histogram.items())),
+        trials=trials,
+        seed=seed
+    )
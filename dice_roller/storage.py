@@ -0,0 +1,1024 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/dice_roller/storage.py
+import json
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from contextlib import ExitStack, closing, contextmanager
+from datetime import datetime, timedelta
+from itertools import islice
+from pathlib import Path
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from .metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+
+class HistoryBackend:
+    """Storage interface used by RollHistory
+
+    Entries are plain dicts with the fields written by RollHistory.add_roll,
+    always returned in chronological order.
+    """
+
+    name = None
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def append(self, entries: List[Dict[str, Any]]) -> None:
+        """Persist new entries after the existing ones"""
+        raise NotImplementedError
+
+    def load_all(self) -> List[Dict[str, Any]]:
+        """Return every stored entry"""
+        raise NotImplementedError
+
+    def iter_entries(self) -> Iterator[Dict[str, Any]]:
+        """Yield every stored entry, reading storage as the caller consumes them"""
+        return iter(self.load_all())
+
+    def replace(self, entries: List[Dict[str, Any]]) -> None:
+        """Replace the stored history with the given entries"""
+        raise NotImplementedError
+
+    def tail(self, limit: int) -> List[Dict[str, Any]]:
+        """Return the last `limit` entries"""
+        return self.load_all()[-limit:]
+
+    def query(self, command: Optional[str] = None, since: Optional[str] = None,
+              until: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Return entries matching a command and an ISO timestamp range
+
+        With a limit, only the most recent matches are returned.
+        """
+        matches = [
+            entry for entry in self.load_all()
+            if (command is None or entry.get('command') == command)
+            and (since is None or entry.get('timestamp', '') >= since)
+            and (until is None or entry.get('timestamp', '') < until)
+        ]
+        if limit is None:
+            return matches
+        return matches[-limit:] if limit > 0 else []
+
+
+class JsonLinesBackend(HistoryBackend):
+    """Append-only JSON Lines file, one JSON object per roll
+
+    Files written by older versions (a single JSON array) are readable and
+    are migrated to JSON Lines the first time entries are appended.
+
+    Writers from any number of processes take an exclusive advisory lock
+    on a `.lock` file next to the history, so appends never interleave and
+    a migration or replace (written to a temporary file and renamed into
+    place) never drops another process's rolls. Readers take no lock: they
+    see either the old or the new file, and skip a half-written last line.
+    """
+
+    name = 'jsonl'
+
+    # Bytes read per step when scanning the history file backwards
+    TAIL_BLOCK_SIZE = 8192
+
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self.lock_path = self.path.with_name(self.path.name + '.lock')
+        self._format_checked = False
+
+    def append(self, entries: List[Dict[str, Any]]) -> None:
+        """Append entries to the end of the history file without rewriting it
+
+        Raises OSError if the history cannot be written.
+        """
+        data = ''.join(self._encode_entry(entry) for entry in entries).encode('utf-8')
+        with exclusive_lock(self.lock_path):
+            if not self._format_checked:
+                self._migrate_legacy_file()
+            self._append_data(data)
+
+    def load_all(self) -> List[Dict[str, Any]]:
+        """Load history from file"""
+        return list(self.iter_entries())
+
+    def iter_entries(self) -> Iterator[Dict[str, Any]]:
+        """Yield entries one line at a time (legacy array files are loaded whole)"""
+        try:
+            with open(self.path, 'r') as f:
+                if self._is_legacy_file(f):
+                    yield from json.load(f)
+                    return
+                for line in f:
+                    entry = self._decode_line(line)
+                    if entry is not None:
+                        yield entry
+        except (json.JSONDecodeError, IOError):
+            return
+
+    def replace(self, entries: List[Dict[str, Any]]) -> None:
+        """Save history to file, replacing its contents
+
+        Raises OSError if the history cannot be written.
+        """
+        with exclusive_lock(self.lock_path):
+            self._write_file(entries)
+            self._format_checked = True
+
+    def tail(self, limit: int) -> List[Dict[str, Any]]:
+        """Load the last `limit` entries by reading the file backwards from its end
+
+        Only the blocks holding those records are read and decoded, so the
+        cost depends on `limit` rather than on the size of the history.
+        """
+        if not self.path.exists():
+            return []
+
+        entries = []
+        try:
+            with open(self.path, 'rb') as f:
+                if self._is_legacy_file(f):
+                    return self.load_all()[-limit:]
+
+                f.seek(0, os.SEEK_END)
+                position = f.tell()
+                partial = b''
+                while position > 0 and len(entries) < limit:
+                    read_size = min(self.TAIL_BLOCK_SIZE, position)
+                    position -= read_size
+                    f.seek(position)
+                    lines = (f.read(read_size) + partial).split(b'\n')
+                    # The first piece may continue a line from the previous block
+                    partial = lines.pop(0) if position > 0 else b''
+                    for line in reversed(lines):
+                        entry = self._decode_line(line)
+                        if entry is not None:
+                            entries.append(entry)
+                            if len(entries) == limit:
+                                break
+        except IOError:
+            return []
+
+        entries.reverse()
+        return entries
+
+    def _append_data(self, data: bytes) -> None:
+        """Append encoded records to the file; the caller holds the lock"""
+        with open(self.path, 'ab+') as f:
+            # Never glue a new record onto a truncated last line
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    data = b'\n' + data
+            f.write(data)
+        if metrics.enabled:
+            metrics.count('history_bytes_written', len(data))
+
+    def _write_file(self, entries: List[Dict[str, Any]]) -> None:
+        """Write entries to a temporary file and atomically rename it over the history"""
+        descriptor, temp_path = tempfile.mkstemp(prefix=self.path.name + '.', suffix='.tmp',
+                                                 dir=str(self.path.parent))
+        try:
+            with os.fdopen(descriptor, 'w') as f:
+                f.writelines(self._encode_entry(entry) for entry in entries)
+                f.flush()
+                os.fsync(f.fileno())
+                written = f.tell()
+            os.replace(temp_path, self.path)
+            if metrics.enabled:
+                metrics.count('history_bytes_written', written)
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+
+    def _migrate_legacy_file(self) -> None:
+        """Rewrite a legacy JSON array history file as JSON Lines
+
+        Must be called with the history lock held.
+        """
+        self._format_checked = True
+        if not self.path.exists():
+            return
+
+        try:
+            with open(self.path, 'r') as f:
+                if not self._is_legacy_file(f):
+                    return
+                history = json.load(f)
+        except json.JSONDecodeError:
+            history = []
+        except IOError:
+            return
+
+        self._write_file(history)
+
+    @staticmethod
+    def _is_legacy_file(f) -> bool:
+        """Check whether an open history file holds a single JSON array
+
+        Works on text and binary files and leaves the file positioned at its start.
+        """
+        head = f.read(64)
+        while head and not head.strip():
+            head = f.read(64)
+        f.seek(0)
+        return head.lstrip()[:1] in ('[', b'[')
+
+    @staticmethod
+    def _encode_entry(entry: Dict[str, Any]) -> str:
+        """Encode a history entry as a single JSON Lines record"""
+        return json.dumps(entry, separators=(',', ':')) + '\n'
+
+    @staticmethod
+    def _decode_line(line: str):
+        """Decode a JSON Lines record, skipping blank or damaged lines"""
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            entry = json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return None
+        return entry if isinstance(entry, dict) else None
+
+
+@contextmanager
+def exclusive_lock(lock_path: Path):
+    """Hold an exclusive fcntl advisory lock on lock_path, across processes
+
+    The lock is released when the block exits, or by the operating system
+    if the process dies. Without fcntl (Windows) no lock is taken.
+    """
+    with open(lock_path, 'ab') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        yield
+
+
+class SQLiteBackend(HistoryBackend):
+    """SQLite database in WAL mode with indexes on timestamp and command
+
+    WAL mode lets any number of readers query the history while a writer
+    is adding rolls. sqlite3 is imported on first use so that JSON Lines
+    users do not pay for it at startup.
+    """
+
+    name = 'sqlite'
+
+    COLUMNS = ('timestamp', 'command', 'count', 'sides', 'modifier', 'individual_rolls', 'total')
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS rolls ('
+        ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+        ' timestamp TEXT NOT NULL,'
+        ' command TEXT NOT NULL,'
+        ' count INTEGER NOT NULL,'
+        ' sides INTEGER NOT NULL,'
+        ' modifier INTEGER NOT NULL,'
+        ' individual_rolls TEXT NOT NULL,'
+        ' total INTEGER NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS idx_rolls_timestamp ON rolls (timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_rolls_command ON rolls (command)',
+    )
+
+    # Seconds a writer waits for another writer's lock before giving up
+    BUSY_TIMEOUT = 30.0
+
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self._schema_ready = False
+
+    def append(self, entries: List[Dict[str, Any]]) -> None:
+        """Insert entries in a single transaction
+
+        Raises OSError if the history cannot be written.
+        """
+        import sqlite3
+
+        try:
+            with closing(self._connect()) as conn, conn:
+                self._insert(conn, entries)
+        except (sqlite3.Error, OverflowError) as error:
+            # OverflowError: a value beyond SQLite's 64-bit INTEGER columns
+            raise OSError(f"Could not write history database {self.path}: {error}") from error
+
+    def load_all(self) -> List[Dict[str, Any]]:
+        """Return every stored entry"""
+        return self._select('', (), 'ASC')
+
+    def iter_entries(self) -> Iterator[Dict[str, Any]]:
+        """Yield every entry from a cursor, which fetches rows as they are consumed"""
+        import sqlite3
+
+        if not self.path.exists():
+            return
+        try:
+            with closing(self._connect()) as conn:
+                for row in conn.execute(f'SELECT {", ".join(self.COLUMNS)} FROM rolls ORDER BY id'):
+                    yield self._from_row(row)
+        except sqlite3.Error:
+            return
+
+    def replace(self, entries: List[Dict[str, Any]]) -> None:
+        """Replace the stored rolls with the given entries
+
+        Raises OSError if the history cannot be written.
+        """
+        import sqlite3
+
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute('DELETE FROM rolls')
+                self._insert(conn, entries)
+        except (sqlite3.Error, OverflowError) as error:
+            # OverflowError: a value beyond SQLite's 64-bit INTEGER columns
+            raise OSError(f"Could not write history database {self.path}: {error}") from error
+
+    def tail(self, limit: int) -> List[Dict[str, Any]]:
+        """Return the last `limit` entries using the primary key index"""
+        return self._select('', (), 'DESC', limit)
+
+    def query(self, command: Optional[str] = None, since: Optional[str] = None,
+              until: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Return entries matching a command and an ISO timestamp range using the indexes"""
+        clauses = []
+        params = []
+        if command is not None:
+            clauses.append('command = ?')
+            params.append(command)
+        if since is not None:
+            clauses.append('timestamp >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('timestamp < ?')
+            params.append(until)
+
+        where = f'WHERE {" AND ".join(clauses)}' if clauses else ''
+        if limit is None:
+            return self._select(where, params, 'ASC')
+        return self._select(where, params, 'DESC', limit) if limit > 0 else []
+
+    def _select(self, where: str, params, order: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Run a SELECT over the rolls table and return entries in chronological order"""
+        import sqlite3
+
+        sql = f'SELECT {", ".join(self.COLUMNS)} FROM rolls {where} ORDER BY id {order}'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params = list(params) + [limit]
+
+        if not self.path.exists():
+            return []
+        try:
+            with closing(self._connect()) as conn:
+                rows = conn.execute(sql, params).fetchall()
+        except sqlite3.Error:
+            return []
+
+        entries = [self._from_row(row) for row in rows]
+        if order == 'DESC':
+            entries.reverse()
+        return entries
+
+    def _insert(self, conn: 'sqlite3.Connection', entries: List[Dict[str, Any]]) -> None:
+        """Insert entries using an open connection"""
+        placeholders = ', '.join('?' * len(self.COLUMNS))
+        conn.executemany(
+            f'INSERT INTO rolls ({", ".join(self.COLUMNS)}) VALUES ({placeholders})',
+            [self._to_row(entry) for entry in entries]
+        )
+
+    def _connect(self) -> 'sqlite3.Connection':
+        """Open a connection, creating the schema on first use"""
+        import sqlite3
+
+        conn = sqlite3.connect(str(self.path), timeout=self.BUSY_TIMEOUT)
+        if not self._schema_ready:
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')
+                with conn:
+                    for statement in self.SCHEMA:
+                        conn.execute(statement)
+            except sqlite3.Error:
+                conn.close()
+                raise
+            self._schema_ready = True
+        return conn
+
+    @classmethod
+    def _to_row(cls, entry: Dict[str, Any]) -> tuple:
+        """Convert a history entry to a table row"""
+        row = [entry.get(column) for column in cls.COLUMNS]
+        if 'face_counts' in entry:
+            # Histogram rolls keep their face counts in the rolls column, as a JSON object
+            rolls = {'face_counts': entry['face_counts']}
+        else:
+            rolls = entry.get('individual_rolls', [])
+        row[cls.COLUMNS.index('individual_rolls')] = json.dumps(rolls)
+        return tuple(row)
+
+    @classmethod
+    def _from_row(cls, row: tuple) -> Dict[str, Any]:
+        """Convert a table row back to a history entry"""
+        entry = dict(zip(cls.COLUMNS, row))
+        rolls = json.loads(entry['individual_rolls'])
+        if isinstance(rolls, dict):
+            entry['individual_rolls'] = []
+            entry['face_counts'] = rolls['face_counts']
+        else:
+            entry['individual_rolls'] = rolls
+        return entry
+
+
+class SegmentedBackend(HistoryBackend):
+    """JSON Lines history split into segments, with old segments gzipped
+
+    Segments live in a `<history file>.segments` directory. Rolls are
+    appended to the active segment (`segment-000042.jsonl`); once it reaches
+    `segment_bytes` or `segment_entries` it is sealed: gzipped to
+    `segment-000042.jsonl.gz` and recorded in `manifest.json` with its entry
+    count and first and last timestamps. Retention runs at each seal and
+    drops the oldest sealed segments beyond `max_entries` rolls or older
+    than `max_age` seconds, whole segments at a time.
+
+    Reads use the manifest to open only the segments they need: tail()
+    decompresses sealed segments newest first until it has enough rolls,
+    and query() skips segments outside the requested time range.
+
+    Settings default to the class attributes and can be set with the
+    DICE_ROLLER_SEGMENT_BYTES, DICE_ROLLER_SEGMENT_ENTRIES,
+    DICE_ROLLER_MAX_ENTRIES and DICE_ROLLER_MAX_AGE_DAYS environment
+    variables. gzip is imported on first use.
+    """
+
+    name = 'segmented'
+
+    # Default rollover thresholds of the active segment
+    SEGMENT_BYTES = 4 * 1024 * 1024
+    SEGMENT_ENTRIES = 20000
+
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, path: Path, segment_bytes: Optional[int] = None, segment_entries: Optional[int] = None,
+                 max_entries: Optional[int] = None, max_age: Optional[float] = None):
+        super().__init__(path)
+        self.directory = self.path.with_name(self.path.name + '.segments')
+        self.lock_path = self.directory / 'lock'
+        self.segment_bytes = segment_bytes or _env_number('DICE_ROLLER_SEGMENT_BYTES', int) or self.SEGMENT_BYTES
+        self.segment_entries = (segment_entries or _env_number('DICE_ROLLER_SEGMENT_ENTRIES', int)
+                                or self.SEGMENT_ENTRIES)
+        self.max_entries = max_entries or _env_number('DICE_ROLLER_MAX_ENTRIES', int)
+        if max_age is None:
+            max_age_days = _env_number('DICE_ROLLER_MAX_AGE_DAYS', float)
+            max_age = max_age_days * 86400 if max_age_days else None
+        self.max_age = max_age
+        # (segment number, size in bytes, entries) of the active segment when last counted
+        self._active_count = None
+
+    def append(self, entries: List[Dict[str, Any]]) -> None:
+        """Append entries to the active segment, sealing it first if it is full
+
+        Raises OSError if the history cannot be written.
+        """
+        data = ''.join(JsonLinesBackend._encode_entry(entry) for entry in entries).encode('utf-8')
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with exclusive_lock(self.lock_path):
+            manifest = self._read_manifest()
+            active = self._segment_path(manifest['active'])
+            if active.exists():
+                size, count = self._count_active(manifest['active'], active)
+                if size >= self.segment_bytes or count >= self.segment_entries:
+                    manifest = self._seal(manifest)
+                    active = self._segment_path(manifest['active'])
+            JsonLinesBackend(active)._append_data(data)
+
+    def load_all(self) -> List[Dict[str, Any]]:
+        """Return every stored entry, oldest segment first"""
+        return list(self.iter_entries())
+
+    def iter_entries(self) -> Iterator[Dict[str, Any]]:
+        """Yield every entry, decompressing one segment at a time as a stream"""
+        manifest = self._read_manifest()
+        for segment in manifest['segments']:
+            yield from self._iter_sealed(segment)
+        yield from self._active_backend(manifest).iter_entries()
+
+    def replace(self, entries: List[Dict[str, Any]]) -> None:
+        """Replace every segment with the given entries, split at the entry threshold
+
+        Raises OSError if the history cannot be written.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with exclusive_lock(self.lock_path):
+            old_files = [file for file in self.directory.iterdir() if file.name.startswith('segment-')]
+            number = self._read_manifest()['active'] + 1
+            segments = []
+            for start in range(0, len(entries), self.segment_entries):
+                chunk = entries[start:start + self.segment_entries]
+                if start + self.segment_entries < len(entries):
+                    segments.append(self._write_sealed(number, chunk))
+                    number += 1
+                else:
+                    JsonLinesBackend(self._segment_path(number))._write_file(chunk)
+            self._write_manifest({'active': number, 'segments': segments})
+            for file in old_files:
+                file.unlink(missing_ok=True)
+            self._active_count = None
+
+    def tail(self, limit: int) -> List[Dict[str, Any]]:
+        """Return the last `limit` entries, decompressing only the newest segments needed"""
+        manifest = self._read_manifest()
+        chunks = [self._active_backend(manifest).tail(limit)]
+        missing = limit - len(chunks[0])
+        for segment in reversed(manifest['segments']):
+            if missing <= 0:
+                break
+            chunk = self._read_sealed(segment)[-missing:]
+            chunks.append(chunk)
+            missing -= len(chunk)
+        return [entry for chunk in reversed(chunks) for entry in chunk]
+
+    def query(self, command: Optional[str] = None, since: Optional[str] = None,
+              until: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Return matching entries, skipping sealed segments outside the time range"""
+        manifest = self._read_manifest()
+        entries = []
+        for segment in manifest['segments']:
+            if (since is None or segment['last'] >= since) and (until is None or segment['first'] < until):
+                entries.extend(self._read_sealed(segment))
+        entries.extend(self._active_backend(manifest).load_all())
+
+        matches = [
+            entry for entry in entries
+            if (command is None or entry.get('command') == command)
+            and (since is None or entry.get('timestamp', '') >= since)
+            and (until is None or entry.get('timestamp', '') < until)
+        ]
+        if limit is None:
+            return matches
+        return matches[-limit:] if limit > 0 else []
+
+    def segment_files(self) -> List[Path]:
+        """Paths of the sealed segments and the active segment, oldest first"""
+        manifest = self._read_manifest()
+        files = [self.directory / segment['file'] for segment in manifest['segments']]
+        active = self._segment_path(manifest['active'])
+        return files + [active] if active.exists() else files
+
+    def _seal(self, manifest: Dict[str, Any]) -> Dict[str, Any]:
+        """Gzip the active segment, record it in the manifest and apply retention"""
+        number = manifest['active']
+        active = self._segment_path(number)
+        sealed = self._write_sealed(number, JsonLinesBackend(active).load_all())
+        manifest = {
+            'active': number + 1,
+            'segments': self._apply_retention(manifest['segments'] + [sealed]),
+        }
+        self._write_manifest(manifest)
+        active.unlink()
+        self._active_count = None
+        return manifest
+
+    def _write_sealed(self, number: int, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Write entries as a gzipped segment and return its manifest record"""
+        import gzip
+
+        name = self._segment_path(number).name + '.gz'
+        temp_path = self.directory / (name + '.tmp')
+        with gzip.open(temp_path, 'wb') as f:
+            f.writelines(JsonLinesBackend._encode_entry(entry).encode('utf-8') for entry in entries)
+        os.replace(temp_path, self.directory / name)
+        return {
+            'file': name,
+            'entries': len(entries),
+            'first': entries[0].get('timestamp', '') if entries else '',
+            'last': entries[-1].get('timestamp', '') if entries else '',
+        }
+
+    def _apply_retention(self, segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Delete the oldest sealed segments beyond max_entries or older than max_age"""
+        keep = list(segments)
+        if self.max_age is not None:
+            cutoff = (datetime.now() - timedelta(seconds=self.max_age)).isoformat()
+            keep = [segment for segment in keep if segment['last'] >= cutoff]
+        if self.max_entries is not None:
+            # Drop a segment only if the newer ones still hold max_entries rolls
+            while keep and sum(segment['entries'] for segment in keep[1:]) >= self.max_entries:
+                keep.pop(0)
+        for segment in segments:
+            if segment not in keep:
+                (self.directory / segment['file']).unlink(missing_ok=True)
+        return keep
+
+    def _count_active(self, number: int, active: Path) -> Tuple[int, int]:
+        """Size and entry count of the active segment, reading only bytes added since the last count"""
+        size = active.stat().st_size
+        start, count = 0, 0
+        if self._active_count is not None:
+            counted_number, counted_size, counted = self._active_count
+            if counted_number == number and counted_size <= size:
+                start, count = counted_size, counted
+        with open(active, 'rb') as f:
+            f.seek(start)
+            for block in iter(lambda: f.read(65536), b''):
+                count += block.count(b'\n')
+        self._active_count = (number, size, count)
+        return size, count
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        """The active segment number and the sealed segment records, oldest first"""
+        try:
+            with open(self.directory / self.MANIFEST, 'r') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError):
+            return {'active': 1, 'segments': []}
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        """Atomically replace the manifest"""
+        temp_path = self.directory / (self.MANIFEST + '.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, self.directory / self.MANIFEST)
+
+    def _active_backend(self, manifest: Dict[str, Any]) -> 'JsonLinesBackend':
+        """JSON Lines backend over the active segment"""
+        return JsonLinesBackend(self._segment_path(manifest['active']))
+
+    def _read_sealed(self, segment: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Decompress and decode one sealed segment"""
+        return list(self._iter_sealed(segment))
+
+    def _iter_sealed(self, segment: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Yield the entries of one sealed segment as it is decompressed"""
+        import gzip
+
+        try:
+            with gzip.open(self.directory / segment['file'], 'rb') as f:
+                for line in f:
+                    entry = JsonLinesBackend._decode_line(line)
+                    if entry is not None:
+                        yield entry
+        except (OSError, EOFError):
+            return
+
+    def _segment_path(self, number: int) -> Path:
+        """Path of the uncompressed segment with the given number"""
+        return self.directory / f'segment-{number:06d}.jsonl'
+
+
+def _env_number(name: str, kind):
+    """A positive number from an environment variable, or None"""
+    value = os.getenv(name)
+    try:
+        number = kind(value) if value else None
+    except ValueError:
+        raise ValueError(f"{name} must be a number, not {value!r}")
+    if number is not None and number <= 0:
+        raise ValueError(f"{name} must be positive")
+    return number
+
+
+class BinaryBackend(HistoryBackend):
+    """Compact binary records with an offset index, read through mmap
+
+    Three files make up a binary history:
+
+    - the data file: one record per roll, a fixed-width header (RECORD)
+      followed by the dice values, each stored as value - 1 in the fewest
+      bytes that fit the die (one byte up to a d256); histogram rolls
+      store their face counts instead, marked by HISTOGRAM_FLAG in the
+      width byte;
+    - `<data file>.idx`: the start offset of every record as a uint64, so
+      record N is found without reading any other record;
+    - `<data file>.cmd`: the command dictionary, one JSON string per line;
+      records store the line number instead of the command text.
+
+    tail() and query() map the files with mmap and decode only the records
+    they return; query() filters on the header fields before decoding any
+    dice values. Timestamps are stored as microseconds since 1970-01-01 of
+    the naive ISO timestamp, so they convert back exactly. Writers share
+    the advisory lock used by the JSON Lines backend, and the index is
+    written after the data so readers never see half a record.
+    """
+
+    name = 'binary'
+
+    # timestamp (us), command id, count, sides, modifier, total, number of values, value width
+    RECORD = struct.Struct('<qIIIiqIB')
+    OFFSET = struct.Struct('<Q')
+
+    # Set in a record's value width when its values are face counts rather than dice
+    HISTOGRAM_FLAG = 0x80
+
+    EPOCH = datetime(1970, 1, 1)
+
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self.index_path = self.path.with_name(self.path.name + '.idx')
+        self.commands_path = self.path.with_name(self.path.name + '.cmd')
+        self.lock_path = self.path.with_name(self.path.name + '.lock')
+        self._commands = []
+        self._command_ids = {}
+        self._commands_size = 0
+
+    def __len__(self) -> int:
+        """Number of stored records"""
+        try:
+            return self.index_path.stat().st_size // self.OFFSET.size
+        except OSError:
+            return 0
+
+    def append(self, entries: List[Dict[str, Any]]) -> None:
+        """Append entries as binary records and index them
+
+        Raises OSError if the history cannot be written, including when an
+        entry has a value the record header cannot hold (e.g. a modifier
+        beyond 32 bits); nothing is written then.
+        """
+        with exclusive_lock(self.lock_path):
+            self._load_commands()
+            new_commands = []
+            records = []
+            try:
+                for entry in entries:
+                    command = entry.get('command') or ''
+                    if command not in self._command_ids:
+                        self._command_ids[command] = len(self._commands)
+                        self._commands.append(command)
+                        new_commands.append(command)
+                    records.append(self._encode_record(entry, self._command_ids[command]))
+            except ValueError as error:
+                # Forget the unsaved commands; the dictionary is read again from disk next time
+                self._commands, self._command_ids, self._commands_size = [], {}, 0
+                raise OSError(f"Could not write history {self.path}: {error}") from error
+
+            if new_commands:
+                with open(self.commands_path, 'ab') as f:
+                    f.write(''.join(json.dumps(command) + '\n' for command in new_commands).encode('utf-8'))
+                    self._commands_size = f.tell()
+
+            # Records go after the last indexed one; bytes left by an interrupted write are overwritten
+            start = offset = self._data_end()
+            offsets = []
+            for record in records:
+                offsets.append(self.OFFSET.pack(offset))
+                offset += len(record)
+            with open(self.path, 'r+b' if self.path.exists() else 'wb') as f:
+                f.seek(start)
+                f.write(b''.join(records))
+                f.truncate()
+            with open(self.index_path, 'ab') as f:
+                f.write(b''.join(offsets))
+            if metrics.enabled:
+                metrics.count('history_bytes_written', offset - start + len(offsets) * self.OFFSET.size)
+
+    def load_all(self) -> List[Dict[str, Any]]:
+        """Return every stored entry"""
+        return self.records(0, len(self))
+
+    def iter_entries(self) -> Iterator[Dict[str, Any]]:
+        """Yield every entry, decoding records from the mapped file as they are consumed"""
+        with self._mapped() as (data, index):
+            # Commands are written before the records that use them, so load them after mapping
+            self._load_commands()
+            for position in range(0, len(index) - len(index) % self.OFFSET.size, self.OFFSET.size):
+                yield self._decode_record(data, self.OFFSET.unpack_from(index, position)[0])
+
+    def replace(self, entries: List[Dict[str, Any]]) -> None:
+        """Replace the stored history with the given entries
+
+        Raises OSError if the history cannot be written.
+        """
+        with exclusive_lock(self.lock_path):
+            for path in (self.index_path, self.path, self.commands_path):
+                path.unlink(missing_ok=True)
+            self._commands, self._command_ids, self._commands_size = [], {}, 0
+        if entries:
+            self.append(entries)
+
+    def tail(self, limit: int) -> List[Dict[str, Any]]:
+        """Return the last `limit` entries, decoding only those records"""
+        total = len(self)
+        return self.records(max(0, total - limit), total)
+
+    def query(self, command: Optional[str] = None, since: Optional[str] = None,
+              until: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Return matching entries, filtering on record headers before decoding them"""
+        if limit is not None and limit <= 0:
+            return []
+        since_us = self._encode_timestamp(since) if since is not None else None
+        until_us = self._encode_timestamp(until) if until is not None else None
+
+        with self._mapped() as (data, index):
+            self._load_commands()
+            command_id = self._command_ids.get(command, -1) if command is not None else None
+            matches = []
+            # Walk backwards so a limit stops the scan early
+            for number in range(len(index) // self.OFFSET.size - 1, -1, -1):
+                offset = self.OFFSET.unpack_from(index, number * self.OFFSET.size)[0]
+                timestamp, record_command = self.RECORD.unpack_from(data, offset)[:2]
+                if ((command_id is None or record_command == command_id)
+                        and (since_us is None or timestamp >= since_us)
+                        and (until_us is None or timestamp < until_us)):
+                    matches.append(self._decode_record(data, offset))
+                    if limit is not None and len(matches) == limit:
+                        break
+        matches.reverse()
+        return matches
+
+    def records(self, start: int, stop: int) -> List[Dict[str, Any]]:
+        """Decode records start..stop-1 by their index offsets"""
+        with self._mapped() as (data, index):
+            self._load_commands()
+            stop = min(stop, len(index) // self.OFFSET.size)
+            return [
+                self._decode_record(data, self.OFFSET.unpack_from(index, number * self.OFFSET.size)[0])
+                for number in range(start, stop)
+            ]
+
+    @contextmanager
+    def _mapped(self):
+        """Map the data and index files read-only; empty files give empty buffers"""
+        import mmap
+
+        with ExitStack() as stack:
+            maps = []
+            for path in (self.path, self.index_path):
+                try:
+                    f = stack.enter_context(open(path, 'rb'))
+                except FileNotFoundError:
+                    maps.append(b'')
+                    continue
+                if os.fstat(f.fileno()).st_size == 0:
+                    maps.append(b'')
+                else:
+                    maps.append(stack.enter_context(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)))
+            yield maps[0], maps[1]
+
+    def _data_end(self) -> int:
+        """Offset just past the last indexed record"""
+        count = len(self)
+        if count == 0:
+            return 0
+        with open(self.index_path, 'rb') as f:
+            f.seek((count - 1) * self.OFFSET.size)
+            offset = self.OFFSET.unpack(f.read(self.OFFSET.size))[0]
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            header = self.RECORD.unpack(f.read(self.RECORD.size))
+        return offset + self.RECORD.size + header[6] * (header[7] & ~self.HISTOGRAM_FLAG)
+
+    def _load_commands(self) -> None:
+        """Read command dictionary lines added since the last call"""
+        try:
+            with open(self.commands_path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size < self._commands_size:
+                    # The history was replaced; start over
+                    self._commands, self._command_ids, self._commands_size = [], {}, 0
+                f.seek(self._commands_size)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    command = json.loads(line)
+                    self._command_ids.setdefault(command, len(self._commands))
+                    self._commands.append(command)
+                    self._commands_size += len(line)
+        except FileNotFoundError:
+            self._commands, self._command_ids, self._commands_size = [], {}, 0
+
+    def _encode_record(self, entry: Dict[str, Any], command_id: int) -> bytes:
+        """Pack one history entry"""
+        sides = entry.get('sides') or 0
+        face_counts = entry.get('face_counts')
+        if face_counts is not None:
+            rolls = stored = face_counts
+            largest = max(face_counts, default=0)
+            flags = self.HISTOGRAM_FLAG
+        else:
+            rolls = entry.get('individual_rolls') or []
+            # Faces are stored as value - 1, so a d256 still fits in one byte
+            largest = max(max(rolls) - 1, sides - 1) if rolls else max(sides - 1, 0)
+            if rolls and min(rolls) < 1:
+                raise ValueError(f"Cannot store die value below 1: {min(rolls)}")
+            stored = [value - 1 for value in rolls]
+            flags = 0
+        width = next((w for w in (1, 2, 4, 8) if largest < 256 ** w), None)
+        if width is None:
+            raise ValueError(f"Roll is too large for the binary history format: {entry.get('command')}")
+        values = array(_ARRAY_TYPECODES[width], stored)
+        if sys.byteorder == 'big':
+            values.byteswap()
+        try:
+            header = self.RECORD.pack(
+                self._encode_timestamp(entry.get('timestamp')), command_id, entry.get('count') or 0, sides,
+                entry.get('modifier') or 0, entry.get('total') or 0, len(rolls), width | flags
+            )
+        except struct.error:
+            raise ValueError(f"Roll is too large for the binary history format: {entry.get('command')}")
+        return header + values.tobytes()
+
+    def _decode_record(self, data, offset: int) -> Dict[str, Any]:
+        """Unpack the record at offset into a history entry"""
+        timestamp, command_id, count, sides, modifier, total, length, width = self.RECORD.unpack_from(data, offset)
+        flags = width & self.HISTOGRAM_FLAG
+        width &= ~self.HISTOGRAM_FLAG
+        start = offset + self.RECORD.size
+        values = array(_ARRAY_TYPECODES[width])
+        values.frombytes(data[start:start + length * width])
+        if sys.byteorder == 'big':
+            values.byteswap()
+        entry = {
+            'timestamp': (self.EPOCH + timedelta(microseconds=timestamp)).isoformat(),
+            'command': self._commands[command_id],
+            'count': count,
+            'sides': sides,
+            'modifier': modifier,
+            'individual_rolls': [] if flags else [value + 1 for value in values],
+            'total': total
+        }
+        if flags:
+            entry['face_counts'] = values.tolist()
+        return entry
+
+    @classmethod
+    def _encode_timestamp(cls, timestamp: Optional[str]) -> int:
+        """Microseconds since 1970-01-01 of a naive ISO timestamp"""
+        if not timestamp:
+            return 0
+        moment = datetime.fromisoformat(timestamp)
+        if moment.tzinfo is not None:
+            moment = moment.astimezone().replace(tzinfo=None)
+        return (moment - cls.EPOCH) // timedelta(microseconds=1)
+
+
+# array typecodes for unsigned ints of each byte width on this platform
+_ARRAY_TYPECODES = {array(code).itemsize: code for code in 'QLIHB'}
+
+
+def convert_history(source: HistoryBackend, target: HistoryBackend, batch_size: int = 10000) -> int:
+    """Copy every entry from one backend to another, replacing the target
+
+    Used to convert between the JSON Lines and binary formats (or any other
+    pair of backends). Entries are streamed from source.iter_entries() and
+    written `batch_size` at a time, so memory use does not grow with the
+    history. Returns the number of entries copied. Raises ValueError if
+    both backends use the same file, which would be emptied before it is
+    read.
+    """
+    if source.path.resolve() == target.path.resolve():
+        raise ValueError(f"Cannot convert {source.path} into itself")
+
+    target.replace([])
+    entries = source.iter_entries()
+    copied = 0
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            return copied
+        target.append(batch)
+        copied += len(batch)
+
+
+BACKENDS = {
+    JsonLinesBackend.name: JsonLinesBackend,
+    SQLiteBackend.name: SQLiteBackend,
+    SegmentedBackend.name: SegmentedBackend,
+    BinaryBackend.name: BinaryBackend,
+}
+
+# File suffixes that select the SQLite backend when no backend is named
+SQLITE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+
+# File suffixes that select the binary backend when no backend is named
+BINARY_SUFFIXES = ('.bin',)
+
+
+def create_backend(path: Path, backend=None) -> HistoryBackend:
+    """Create the storage backend for a history file
+
+    The backend is chosen by name, then by the DICE_ROLLER_BACKEND
+    environment variable, then by the file suffix (.db/.sqlite/.sqlite3
+    select SQLite, .bin the binary format, anything else JSON Lines). An already configured
+    HistoryBackend instance is returned as is.
+    """
+    if isinstance(backend, HistoryBackend):
+        return backend
+    path = Path(path)
+    name = backend or os.getenv('DICE_ROLLER_BACKEND')
+    if not name:
+        suffix = path.suffix.lower()
+        if suffix in SQLITE_SUFFIXES:
+            name = SQLiteBackend.name
+        elif suffix in BINARY_SUFFIXES:
+            name = BinaryBackend.name
+        else:
+            name = JsonLinesBackend.name
+
+    try:
+        backend_class = BACKENDS[name.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown history backend: {name} (choose from {', '.join(sorted(BACKENDS))})")
+    return backend_class(path)
@@ -0,0 +1,132 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/dice_roller/writebehind.py
+import atexit
+import signal
+import threading
+from typing import Any, Callable, Dict, List
+
+# Entries queued before a write is due
+BATCH_SIZE = 100
+
+# Seconds a queued entry may wait before it is written
+FLUSH_INTERVAL = 1.0
+
+# Queued entries at which add calls write synchronously instead of queueing more
+MAX_PENDING = 100000
+
+# Termination signals turned into a normal exit so atexit flushes still run
+FLUSH_SIGNALS = tuple(getattr(signal, name) for name in ('SIGTERM', 'SIGHUP') if hasattr(signal, name))
+
+
+class WriteBehindWriter:
+    """Queue history entries in memory and persist them from a background thread
+
+    `write` is called with a list of entries, in the order they were added,
+    once `batch_size` entries are waiting, and at least every
+    `flush_interval` seconds otherwise. Callers only pay for a list append. Queued
+    entries are written by flush(), by close(), at interpreter exit, and on
+    SIGTERM/SIGHUP when no other handler is installed for them.
+    """
+
+    def __init__(self, write: Callable[[List[Dict[str, Any]]], None], batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL, max_pending: int = MAX_PENDING):
+        if batch_size <= 0 or flush_interval <= 0:
+            raise ValueError("Batch size and flush interval must be positive")
+        self._write = write
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max(max_pending, batch_size)
+        self._pending = []
+        self._condition = threading.Condition()
+        # Held while a batch is taken and written, so batches land in order
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='dice-roller-history-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        _install_signal_handlers()
+
+    @property
+    def pending(self) -> int:
+        """Number of entries not yet written"""
+        return len(self._pending)
+
+    def add(self, entries: List[Dict[str, Any]]) -> None:
+        """Queue entries for writing"""
+        with self._condition:
+            if self._closed:
+                raise ValueError("Write-behind writer is closed")
+            self._pending.extend(entries)
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify()
+            backlog = len(self._pending) >= self.max_pending
+        if backlog:
+            # The disk cannot keep up; write now rather than grow without bound
+            self.flush()
+
+    def flush(self) -> None:
+        """Write every queued entry before returning"""
+        with self._write_lock:
+            with self._condition:
+                batch, self._pending = self._pending, []
+            if batch:
+                try:
+                    self._write(batch)
+                except BaseException:
+                    self._requeue(batch)
+                    raise
+
+    def close(self) -> None:
+        """Stop the background thread and write what is left"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self.flush()
+        atexit.unregister(self.close)
+
+    def _requeue(self, batch: List[Dict[str, Any]]) -> None:
+        """Put a batch that failed to write back at the front of the queue"""
+        with self._condition:
+            self._pending[:0] = batch
+
+    def _run(self) -> None:
+        """Background loop: write whenever a batch is full or the interval elapses"""
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._closed or len(self._pending) >= self.batch_size,
+                    timeout=self.flush_interval
+                )
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception:
+                # Entries stay queued; retry on the next interval or at close
+                pass
+
+
+_signals_installed = False
+
+
+def _install_signal_handlers() -> None:
+    """Exit through SystemExit on termination signals so atexit hooks flush
+
+    Only signals still at their default action are taken over, and only
+    from the main thread, so applications with their own handlers keep them.
+    """
+    global _signals_installed
+    if _signals_installed or threading.current_thread() is not threading.main_thread():
+        return
+    _signals_installed = True
+    for sig in FLUSH_SIGNALS:
+        if signal.getsignal(sig) == signal.SIG_DFL:
+            signal.signal(sig, _exit_on_signal)
+
+
+def _exit_on_signal(signum, frame) -> None:
+    """Signal handler that unwinds the interpreter normally"""
+    raise SystemExit(128 + signum)
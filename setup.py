@@ -8,9 +8,12 @@ setup(
     install_requires=[
         "click>=8.1.0",
     ],
+    extras_require={
+        "numpy": ["numpy>=1.17"],
+    },
     entry_points={
         "console_scripts": [
-            "dice-roller=dice_roller.cli:main",
+            "dice-roller=dice_roller.launcher:main",
         ],
     },
     author="Marco Zingoni",
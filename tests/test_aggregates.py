@@ -0,0 +1,219 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/tests/test_aggregates.py
+import json
+import math
+import os
+import tempfile
+import time
+import pytest
+from pathlib import Path
+from dice_roller import aggregates
+from dice_roller.aggregates import HistoryStats, summarize
+from dice_roller.history import RollHistory
+from dice_roller.parser import DiceRoll
+from dice_roller.roller import HistogramResult, RollResult
+
+
+def make_result(command, sides, rolls, modifier=0):
+    """Helper to build a roll result"""
+    return RollResult(DiceRoll(len(rolls), sides, modifier), rolls, sum(rolls) + modifier, command)
+
+
+class TestHistoryStats:
+    """Test cases for the incrementally maintained statistics index"""
+
+    def setup_method(self):
+        """Set up a temporary history"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.history_file = Path(self.temp_dir.name) / 'history.json'
+        self.history = RollHistory(str(self.history_file))
+
+    def teardown_method(self):
+        """Remove the temporary history"""
+        self.temp_dir.cleanup()
+
+    def add_campaign(self):
+        """A few rolls across commands and die types"""
+        self.history.add_roll(make_result('1d20', 20, [20]))
+        self.history.add_roll(make_result('1d20', 20, [3]))
+        self.history.add_rolls([
+            make_result('1d20', 20, [20]),
+            make_result('2d20+1', 20, [7, 20], modifier=1),
+            make_result('3d6', 6, [1, 6, 6]),
+        ])
+
+    def test_index_is_updated_on_every_add(self):
+        """Test per-command and per-die aggregates after adding rolls"""
+        self.add_campaign()
+        stats = HistoryStats(self.history_file)
+
+        d20 = stats.command('1d20')
+        assert d20['count'] == 3
+        assert d20['sum'] == 43
+        assert d20['sum_squares'] == 20 * 20 * 2 + 9
+        assert (d20['min'], d20['max']) == (3, 20)
+        assert d20['faces'] == {3: 1, 20: 2}
+        assert d20['mean'] == pytest.approx(43 / 3)
+
+        dice = stats.die(20)
+        assert dice['count'] == 5
+        assert dice['faces'] == {3: 1, 7: 1, 20: 3}
+        assert stats.die(6)['sum'] == 13
+        assert stats.load()['rolls'] == 5
+        assert stats.command('1d4') is None and stats.die(4) is None
+
+    def test_histogram_rolls(self):
+        """Test that face counts add the same statistics as the dice they stand for"""
+        self.history.add_roll(HistogramResult(DiceRoll(6, 6), [2, 1, 0, 0, 0, 3], 22, '6d6'))
+        expanded_file = Path(self.temp_dir.name) / 'expanded.json'
+        RollHistory(str(expanded_file)).add_roll(make_result('6d6', 6, [1, 1, 2, 6, 6, 6]))
+
+        assert HistoryStats(self.history_file).load() == HistoryStats(expanded_file).load()
+        assert HistoryStats(self.history_file).die(6)['faces'] == {1: 2, 2: 1, 6: 3}
+
+    def test_index_matches_full_scan(self):
+        """Test that the index agrees with statistics computed from the history"""
+        self.add_campaign()
+        totals = [entry['total'] for entry in self.history.get_history(limit=None) if entry['command'] == '1d20']
+        summary = self.history.stats.command('1d20')
+
+        mean = sum(totals) / len(totals)
+        assert summary['mean'] == pytest.approx(mean)
+        assert summary['stdev'] == pytest.approx(math.sqrt(sum((t - mean) ** 2 for t in totals) / len(totals)))
+
+    def test_answers_without_reading_history(self):
+        """Test that queries never touch the history log"""
+        self.add_campaign()
+
+        def no_reads(*args, **kwargs):
+            raise AssertionError('history was read')
+
+        self.history.backend.load_all = self.history.backend.iter_entries = self.history.backend.tail = no_reads
+        assert self.history.stats.die(20)['faces'][20] == 3
+
+    def test_rebuild(self):
+        """Test rebuilding an index for a history written without one"""
+        self.history.backend.append([self.history.create_entry(make_result('1d20', 20, [20])) for _ in range(4)])
+        assert not self.history.stats.exists()
+
+        assert self.history.rebuild_stats() == 4
+        assert HistoryStats(self.history_file).die(20)['faces'] == {20: 4}
+
+    def test_first_roll_indexes_older_history(self):
+        """Test that the first roll on a history written without an index counts the earlier rolls too"""
+        self.history.backend.append([self.history.create_entry(make_result('1d20', 20, [20])) for _ in range(500)])
+        assert not self.history.stats.exists()
+
+        self.history.add_roll(make_result('1d20', 20, [1]))
+        self.history.add_roll(make_result('1d20', 20, [2]))
+        stats = HistoryStats(self.history_file)
+        assert stats.load()['rolls'] == 502
+        assert stats.die(20)['faces'] == {1: 1, 2: 1, 20: 500}
+
+    def test_clear_history_resets_index(self):
+        """Test that clearing the history empties the index"""
+        self.add_campaign()
+        self.history.clear_history()
+        assert HistoryStats(self.history_file).load()['rolls'] == 0
+
+    def test_updates_from_several_writers(self):
+        """Test that two RollHistory objects on one file both update the index"""
+        other = RollHistory(str(self.history_file))
+        self.history.add_roll(make_result('1d20', 20, [5]))
+        other.add_roll(make_result('1d20', 20, [6]))
+        self.history.add_roll(make_result('1d20', 20, [7]))
+
+        assert self.history.stats.command('1d20')['faces'] == {5: 1, 6: 1, 7: 1}
+
+    def test_write_behind_updates_index(self):
+        """Test that rolls written in the background reach the index"""
+        self.history.write_behind(batch_size=1000, flush_interval=3600)
+        self.history.add_roll(make_result('1d20', 20, [11]))
+        self.history.close()
+
+        assert self.history.stats.command('1d20')['count'] == 1
+
+    def test_damaged_or_outdated_index_reads_as_empty(self):
+        """Test that an unreadable index is treated as empty"""
+        stats = HistoryStats(self.history_file)
+        stats.path.write_text('{not json')
+        assert stats.load()['rolls'] == 0
+        stats.path.write_text(json.dumps({'version': 0, 'rolls': 3}))
+        assert HistoryStats(self.history_file).load()['rolls'] == 0
+
+    def test_add_roll_cost_does_not_grow_with_index(self, monkeypatch):
+        """Test that adding a roll appends a small journal line instead of rewriting a large index"""
+        def best_add_roll_time():
+            best = float('inf')
+            for _ in range(20):
+                start = time.perf_counter()
+                self.history.add_roll(make_result('1d20', 20, [12]))
+                best = min(best, time.perf_counter() - start)
+            return best
+
+        small = best_add_roll_time()
+        self.history.stats.rebuild(
+            self.history.create_entry(make_result(f'1d1000000+{i}', 1000000, [i + 1], modifier=i))
+            for i in range(20000)
+        )
+        assert self.history.stats.path.stat().st_size > 1000000
+
+        journal_size = self.history.stats.journal_path.stat().st_size
+        large = best_add_roll_time()
+        assert self.history.stats.journal_path.stat().st_size - journal_size < 20 * 300
+        assert large < small * 5 + 0.002
+
+        # Updates neither read nor rewrite the snapshot
+        monkeypatch.setattr(HistoryStats, '_read', lambda stats: pytest.fail("update read the index"))
+        monkeypatch.setattr(HistoryStats, '_write', lambda stats, data: pytest.fail("update rewrote the index"))
+        self.history.add_roll(make_result('1d20', 20, [12]))
+        monkeypatch.undo()
+        # rebuild() replaced the first 20 rolls; the 20 added after it and this one remain
+        assert HistoryStats(self.history_file).command('1d20')['count'] == 21
+
+    def test_journal_is_folded_into_snapshot(self, monkeypatch):
+        """Test that a journal past its size limit is folded in and started afresh"""
+        monkeypatch.setattr(aggregates, 'JOURNAL_BYTES', 500)
+        for face in range(1, 21):
+            self.history.add_roll(make_result('1d20', 20, [face]))
+
+        stats = HistoryStats(self.history_file)
+        assert stats.journal_path.stat().st_size < 500
+        assert stats.command('1d20')['faces'] == {face: 1 for face in range(1, 21)}
+        assert stats.load()['rolls'] == 20
+
+    def test_crash_while_folding_counts_nothing_twice(self, monkeypatch):
+        """Test a fold interrupted after the snapshot was written but before the journal was replaced"""
+        self.add_campaign()
+        stats = HistoryStats(self.history_file)
+        replace = os.replace
+
+        def fail_on_journal(source, target):
+            if Path(target) == stats.journal_path:
+                raise OSError("crashed")
+            replace(source, target)
+
+        monkeypatch.setattr(os, 'replace', fail_on_journal)
+        with pytest.raises(OSError):
+            stats._write(stats._read())
+        monkeypatch.undo()
+
+        assert HistoryStats(self.history_file).load()['rolls'] == 5
+        self.history.add_roll(make_result('1d20', 20, [1]))
+        assert HistoryStats(self.history_file).load()['rolls'] == 6
+
+    def test_big_dice_keep_no_face_histogram(self):
+        """Test that dice above MAX_FACE_SIDES keep running totals but no faces"""
+        self.history.add_roll(make_result('2d1000', 1000, [17, 999]))
+        stats = HistoryStats(self.history_file)
+        assert stats.die(1000)['count'] == 2
+        assert stats.die(1000)['max'] == 999
+        assert stats.die(1000)['faces'] == {}
+        assert stats.command('2d1000')['faces'] == {}
+
+    def test_summarize(self):
+        """Test mean and standard deviation from running sums"""
+        summary = summarize({'count': 4, 'sum': 10, 'sum_squares': 30, 'min': 1, 'max': 4,
+                             'faces': {'4': 1, '1': 1, '2': 1, '3': 1}})
+        assert summary['mean'] == 2.5
+        assert summary['stdev'] == pytest.approx(math.sqrt(1.25))
+        assert list(summary['faces']) == [1, 2, 3, 4]
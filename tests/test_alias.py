@@ -0,0 +1,115 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/tests/test_alias.py
+import random
+import time
+import pytest
+from collections import Counter
+from dice_roller import alias
+from dice_roller.alias import AliasTable, cache_info, clear_cache, total_table
+from dice_roller.parser import DiceRoll
+from dice_roller.probability import dice_counts
+from dice_roller.roller import DiceRoller
+
+
+def table_probabilities(table):
+    """Probability of each index implied by an alias table's columns"""
+    mass = [0.0] * table.size
+    for column in range(table.size):
+        mass[column] += table.probability[column]
+        mass[table.alias[column]] += 1.0 - table.probability[column]
+    return [value / table.size for value in mass]
+
+
+class TestAliasTable:
+    """Test cases for Walker/Vose alias tables"""
+
+    @pytest.mark.parametrize('weights', [[1], [1, 1], [1, 2, 3, 4], [0, 5, 0, 1], list(dice_counts(10, 6))])
+    def test_columns_reproduce_weights(self, weights):
+        """Test that the columns add back up to the weights"""
+        table = AliasTable(weights)
+        total = sum(weights)
+        assert table_probabilities(table) == pytest.approx([weight / total for weight in weights], abs=1e-12)
+
+    def test_huge_exact_weights(self):
+        """Test weights far beyond float range, such as the ways to roll 500d6"""
+        weights = dice_counts(500, 6)
+        table = AliasTable(weights)
+        assert table.size == len(weights)
+        assert all(0.0 <= p <= 1.0 for p in table.probability)
+        assert sum(table_probabilities(table)) == pytest.approx(1.0)
+
+    def test_invalid_weights(self):
+        """Test that empty, all-zero and negative weights are rejected"""
+        for weights in ([], [0, 0], [3, -1]):
+            with pytest.raises(ValueError):
+                AliasTable(weights)
+
+    def test_samples_follow_weights(self):
+        """Test drawn indexes against the weights with a chi-squared bound"""
+        weights = list(dice_counts(3, 6))
+        draws = 200000
+        hits = Counter(AliasTable(weights).samples(random.Random(3), draws))
+        total = sum(weights)
+        chi2 = sum((hits[i] - draws * w / total) ** 2 / (draws * w / total) for i, w in enumerate(weights))
+        # 15 degrees of freedom; the 99.9th percentile is 37.7
+        assert chi2 < 37.7
+        assert AliasTable([0, 1, 0]).sample(random.Random(0)) == 1
+
+
+class TestTotalTableCache:
+    """Test cases for the per-(count, sides) table cache"""
+
+    def setup_method(self):
+        """Start from an empty cache"""
+        clear_cache()
+
+    def teardown_method(self):
+        """Leave an empty cache behind"""
+        clear_cache()
+
+    def test_tables_are_cached(self):
+        """Test that a table is built once per dice count and size"""
+        table = total_table(4, 6)
+        assert table.size == 21
+        assert total_table(4, 6) is table
+        assert cache_info() == (1, table.nbytes)
+
+    def test_cache_is_bounded_by_memory(self, monkeypatch):
+        """Test that the least recently used tables are dropped to stay within the budget"""
+        monkeypatch.setattr(alias, 'CACHE_BYTES', 3 * 100 * alias.COLUMN_BYTES)
+        first = total_table(1, 100)
+        total_table(1, 99)
+        assert total_table(1, 100) is first
+        total_table(1, 98)
+        total_table(1, 97)
+
+        tables, used = cache_info()
+        assert used <= alias.CACHE_BYTES
+        assert tables == 3
+        assert total_table(1, 100) is first
+        # A table bigger than the whole budget is never built
+        assert total_table(1, 301) is None
+
+    def test_costly_distributions_get_no_table(self):
+        """Test that rolls whose exact distribution is slow to compute are not built"""
+        for count, sides in ((200, 200), (60, 1000)):
+            start = time.perf_counter()
+            assert total_table(count, sides) is None
+            assert time.perf_counter() - start < 0.01
+
+        roller = DiceRoller(seed=2, totals_only=True)
+        start = time.perf_counter()
+        assert 200 <= roller.roll_total(DiceRoll(count=200, sides=200)) <= 40000
+        assert time.perf_counter() - start < 0.1
+
+    def test_exact_counts_are_not_kept(self):
+        """Test that building a table leaves nothing in the probability module's cache"""
+        dice_counts.cache_clear()
+        table = total_table(40, 20)
+        assert table.size == 40 * 19 + 1
+        assert dice_counts.cache_info().currsize == 0
+        assert cache_info() == (1, table.nbytes)
+
+    def test_too_large_for_exact_distribution(self):
+        """Test that rolls whose distribution cannot be computed get no table"""
+        assert total_table(100000, 6) is None
+        assert cache_info() == (0, 0)
@@ -0,0 +1,112 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/tests/test_audit.py
+import random
+import pytest
+from dice_roller.audit import DieAudit, audit_history, audit_rolls, chi_squared_sf, normal_two_sided_p
+
+
+class TestAudit:
+    """Test cases for the dice fairness audit"""
+
+    def test_chi_squared_p_values(self):
+        """Test the chi-squared tail probability against table values"""
+        assert chi_squared_sf(3.841459, 1) == pytest.approx(0.05, abs=1e-6)
+        assert chi_squared_sf(18.307038, 10) == pytest.approx(0.05, abs=1e-6)
+        assert chi_squared_sf(6.634897, 1) == pytest.approx(0.01, abs=1e-6)
+        assert chi_squared_sf(9.341818, 10) == pytest.approx(0.5, abs=1e-6)
+        assert chi_squared_sf(0, 5) == 1.0
+
+    def test_normal_p_values(self):
+        """Test the two-sided normal tail probability"""
+        assert normal_two_sided_p(1.959964) == pytest.approx(0.05, abs=1e-6)
+        assert normal_two_sided_p(-1.959964) == pytest.approx(0.05, abs=1e-6)
+        assert normal_two_sided_p(0) == 1.0
+
+    def test_fair_dice_pass(self):
+        """Test that the roller's own dice pass every test"""
+        for sides in (2, 6, 20, 100, 1000):
+            result = audit_rolls(sides, 200000, seed=sides)
+            assert result.values == 200000
+            assert sum(result.face_counts.values()) == 200000
+            assert result.passed(alpha=0.001)
+
+    def test_detects_bias(self):
+        """Test that a loaded die fails the chi-squared test"""
+        rng = random.Random(1)
+        values = [rng.choice((1, 2, 3, 4, 5, 6, 6)) for _ in range(50000)]
+        audit = DieAudit(6)
+        audit.add(values)
+        result = audit.result()
+        assert result.chi_squared_p < 1e-6
+        assert not result.passed()
+
+    def test_detects_correlation(self):
+        """Test that a die repeating its last face fails the serial and runs tests"""
+        rng = random.Random(2)
+        values = [rng.randint(1, 20)]
+        for _ in range(50000):
+            values.append(values[-1] if rng.random() < 0.3 else rng.randint(1, 20))
+        audit = DieAudit(20)
+        audit.add(values)
+        result = audit.result()
+        assert result.serial_correlation > 0.2
+        assert result.serial_p < 1e-6
+        assert result.runs_p < 1e-6
+        assert result.chi_squared_p > 1e-6
+
+    def test_alternating_values_fail_runs(self):
+        """Test that strictly alternating highs and lows fail the runs test"""
+        audit = DieAudit(6)
+        audit.add([1, 6] * 5000)
+        result = audit.result()
+        assert result.runs == 10000
+        assert result.runs_p < 1e-6
+        assert result.serial_correlation == pytest.approx(-1.0, abs=1e-3)
+
+    def test_chunks_match_single_pass(self):
+        """Test that results do not depend on how values are split into chunks"""
+        rng = random.Random(3)
+        for sides in (6, 300):
+            values = [rng.randint(1, sides) for _ in range(10000)]
+            whole = DieAudit(sides)
+            whole.add(values)
+            chunked = DieAudit(sides)
+            for start in range(0, len(values), 777):
+                chunked.add(values[start:start + 777])
+            assert chunked.result() == whole.result()
+
+    def test_seed_is_reproducible(self):
+        """Test that a seeded audit gives the same statistics again"""
+        first = audit_rolls(20, 5000, seed=7, chunk_size=1000)
+        assert audit_rolls(20, 5000, seed=7, chunk_size=1000) == first
+        assert audit_rolls(20, 5000, seed=8, chunk_size=1000) != first
+
+    def test_too_few_values(self):
+        """Test that tests needing more values are skipped, not failed"""
+        audit = DieAudit(100)
+        audit.add([50, 51])
+        result = audit.result()
+        assert result.chi_squared_p is None
+        assert result.serial_p is None
+        assert result.passed()
+
+    def test_invalid_arguments(self):
+        """Test that one-sided dice and empty audits are rejected"""
+        with pytest.raises(ValueError):
+            DieAudit(1)
+        with pytest.raises(ValueError):
+            audit_rolls(6, 0)
+
+    def test_audit_history_groups_by_die(self):
+        """Test auditing stored entries per die size in chunks"""
+        rng = random.Random(4)
+        entries = [{'command': '3d6', 'sides': 6, 'individual_rolls': [rng.randint(1, 6) for _ in range(3)]}
+                   for _ in range(5000)]
+        entries += [{'command': '1d20', 'sides': 20, 'individual_rolls': [rng.randint(1, 20)]}
+                    for _ in range(2000)]
+        entries.append({'command': '5', 'sides': 0, 'individual_rolls': []})
+
+        results = audit_history(iter(entries), chunk_size=1000)
+        assert list(results) == [6, 20]
+        assert results[6].values == 15000
+        assert results[20].values == 2000
+        assert results[6].passed(alpha=0.001)
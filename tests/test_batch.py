@@ -0,0 +1,32 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/tests/test_batch.py
+import pytest
+from dice_roller.batch import parse_batch_line
+
+
+class TestParseBatchLine:
+    """Test cases for reading batch file lines"""
+
+    def test_plain_notation(self):
+        """Test a notation without a repeat count"""
+        assert parse_batch_line("3d6+2\n") == ("3d6+2", 1)
+        assert parse_batch_line("  1d20  ") == ("1d20", 1)
+
+    def test_repeat_count(self):
+        """Test notations followed by xN"""
+        assert parse_batch_line("4d6 x6") == ("4d6", 6)
+        assert parse_batch_line("4d6 X6") == ("4d6", 6)
+        assert parse_batch_line("2d8 + 1 ×3") == ("2d8 + 1", 3)
+        # A trailing number without x is part of the notation
+        assert parse_batch_line("3d6 + 2") == ("3d6 + 2", 1)
+
+    def test_blank_lines_and_comments(self):
+        """Test that blank lines and comments are skipped"""
+        assert parse_batch_line("") is None
+        assert parse_batch_line("   \n") is None
+        assert parse_batch_line("# goblin ambush") is None
+        assert parse_batch_line("1d20 x2  # initiative") == ("1d20", 2)
+
+    def test_zero_repeat(self):
+        """Test that a repeat count of zero is rejected"""
+        with pytest.raises(ValueError):
+            parse_batch_line("1d20 x0")
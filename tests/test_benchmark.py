@@ -0,0 +1,110 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/tests/test_benchmark.py
+import json
+import tempfile
+import pytest
+from pathlib import Path
+from click.testing import CliRunner
+from dice_roller.benchmark import (BASELINE_VERSION, Comparison, compare, format_seconds, load_baseline, measure,
+                                   regressions, run_benchmarks, save_baseline)
+from dice_roller.cli import main
+
+
+class TestBenchmark:
+    """Test cases for the benchmark suite and baselines"""
+
+    def setup_method(self):
+        """Set up a temporary baseline file"""
+        self.temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.json')
+        self.temp_file.close()
+        self.baseline_path = Path(self.temp_file.name)
+
+    def teardown_method(self):
+        """Clean up the baseline file"""
+        self.baseline_path.unlink(missing_ok=True)
+
+    def test_measure_returns_seconds_per_call(self):
+        """Test that fast calls are batched and reported per call"""
+        calls = []
+        seconds = measure(lambda: calls.append(1), min_time=0.001, repeat=2)
+        assert 0 < seconds < 0.001
+        assert len(calls) > 10
+
+    def test_only_filters_by_prefix(self):
+        """Test selecting benchmarks by name or group, in suite order"""
+        seen = []
+        results = run_benchmarks(quick=True, only=['parse', 'roll.1'],
+                                 progress=lambda name, seconds: seen.append(name))
+        assert list(results) == ['parse.cached', 'parse.uncached', 'roll.1']
+        assert seen == list(results)
+        assert all(seconds > 0 for seconds in results.values())
+
+    def test_history_benchmarks(self):
+        """Test timing add_roll and get_history on prefilled histories"""
+        results = run_benchmarks(quick=True, only=['history.add_roll', 'history.get_history.100'])
+        assert list(results) == ['history.add_roll.100', 'history.get_history.100', 'history.add_roll.10000']
+
+    def test_cli_benchmark(self):
+        """Test timing a full dice-roller process"""
+        results = run_benchmarks(only=['cli.roll'])
+        assert list(results) == ['cli.roll']
+        assert 0 < results['cli.roll'] < 10
+
+    def test_baseline_round_trip(self):
+        """Test saving and loading a JSON baseline"""
+        save_baseline({'roll.1': 1.5e-6, 'cli.roll': 0.05}, self.baseline_path)
+
+        data = json.loads(self.baseline_path.read_text())
+        assert data['version'] == BASELINE_VERSION
+        assert 'python' in data and 'created' in data
+        assert load_baseline(self.baseline_path) == {'roll.1': 1.5e-6, 'cli.roll': 0.05}
+
+    def test_load_rejects_other_files(self):
+        """Test that files that are not baselines are refused"""
+        self.baseline_path.write_text('not json')
+        with pytest.raises(ValueError):
+            load_baseline(self.baseline_path)
+        self.baseline_path.write_text('{"version": 99, "results": {}}')
+        with pytest.raises(ValueError):
+            load_baseline(self.baseline_path)
+
+    def test_compare_flags_regressions(self):
+        """Test that only slowdowns beyond the tolerance are regressions"""
+        baseline = {'a': 1.0, 'b': 1.0, 'c': 1.0, 'gone': 1.0}
+        current = {'a': 1.2, 'b': 1.3, 'c': 0.5, 'new': 9.0}
+
+        comparisons = compare(baseline, current, tolerance=0.25)
+        assert [comparison.name for comparison in comparisons] == ['a', 'b', 'c']
+        assert [comparison.name for comparison in regressions(comparisons)] == ['b']
+        assert comparisons[2].ratio == 0.5
+        assert regressions(compare(baseline, current, tolerance=0.5)) == []
+        assert Comparison('z', 0.0, 1.0, 0.25).regressed
+
+    def test_format_seconds(self):
+        """Test choosing a readable unit"""
+        assert format_seconds(2.5) == '2.50 s'
+        assert format_seconds(0.0125) == '12.50 ms'
+        assert format_seconds(3e-6) == '3.00 µs'
+        assert format_seconds(5e-8) == '50 ns'
+
+    def test_benchmark_command_save_and_compare(self):
+        """Test saving a baseline and comparing a later run against it"""
+        runner = CliRunner()
+        result = runner.invoke(main, ['benchmark', '--quick', '--only', 'roll.1', '--save', str(self.baseline_path)])
+        assert result.exit_code == 0
+        assert 'roll.1 ' in result.output
+        assert '✅ Saved 1 results' in result.output
+
+        result = runner.invoke(main, ['benchmark', '--quick', '--only', 'roll.1',
+                                      '--compare', str(self.baseline_path), '--tolerance', '100'])
+        assert result.exit_code == 0
+        assert 'x baseline' in result.output
+        assert '✅ No regressions' in result.output
+
+    def test_benchmark_command_fails_on_regression(self):
+        """Test that a run slower than the baseline allows exits with an error"""
+        save_baseline({'roll.1': 1e-12}, self.baseline_path)
+        result = CliRunner().invoke(main, ['benchmark', '--quick', '--only', 'roll.1',
+                                           '--compare', str(self.baseline_path)])
+        assert result.exit_code == 1
+        assert '← regression' in result.output
+        assert '❌ 1 benchmark(s) regressed' in result.output
@@ -1,10 +1,14 @@
 # /Users/marcozingoni/Playgound/Python/diceRoller/tests/test_cli.py
+import json
 import pytest
 import tempfile
 from pathlib import Path
 from click.testing import CliRunner
 from dice_roller.cli import main, DiceRollerCLI
 from dice_roller.history import RollHistory
+from dice_roller.metrics import metrics
+from dice_roller.parser import DiceRoll
+from dice_roller.roller import HistogramResult
 
 
 class TestDiceRollerCLI:
@@ -21,6 +25,11 @@ class TestDiceRollerCLI:
     def teardown_method(self):
         """Clean up temporary file"""
         Path(self.temp_file.name).unlink(missing_ok=True)
+        for suffix in (".lock", ".stats.json", ".stats.journal", ".stats.lock"):
+            Path(self.temp_file.name + suffix).unlink(missing_ok=True)
+        # --profile and --metrics switch on the process-wide metrics
+        metrics.disable()
+        metrics.reset()
 
     def test_help_command(self):
         """Test help command output"""
@@ -145,6 +154,352 @@ class TestDiceRollerCLI:
         result = self.runner.invoke(main, ['history'], env=self.env)
         assert '🎲 1d20 →' in result.output
 
+    def test_stats_command(self):
+        """Test the stats subcommand"""
+        result = self.runner.invoke(main, ['stats', '3d6', '--dc', '15'], env=self.env)
+        assert result.exit_code == 0
+        assert '📊 3d6 statistics' in result.output
+        assert 'Mean: 10.50' in result.output
+        assert 'P(total ≥ 15): 9.26%' in result.output
+
+    def test_stats_pmf(self):
+        """Test listing the probability of every total"""
+        result = self.runner.invoke(main, ['stats', '2d6', '--pmf'], env=self.env)
+        assert result.exit_code == 0
+        assert '16.67%' in result.output
+
+    def test_stats_does_not_record_history(self):
+        """Test that probability queries are not added to roll history"""
+        self.runner.invoke(main, ['stats', '1d20'], env=self.env)
+        result = self.runner.invoke(main, ['history'], env=self.env)
+        assert '📜 No roll history found' in result.output
+
+    def test_stats_too_large(self):
+        """Test that a die too big for an exact distribution gets a message, not a crash"""
+        result = self.runner.invoke(main, ['stats', '1d1000000000'], env=self.env)
+        assert result.exit_code == 0
+        assert '❌ 1d1000000000 is too large for an exact distribution' in result.output
+
+    def test_stats_invalid_notation(self):
+        """Test stats with invalid dice notation"""
+        result = self.runner.invoke(main, ['stats', 'invalid'], env=self.env)
+        assert result.exit_code == 0
+        assert '❌ Invalid dice notation' in result.output
+
+    def test_simulate_command(self):
+        """Test the simulate subcommand"""
+        result = self.runner.invoke(main, ['simulate', '2d6', '--trials', '1000', '--workers', '1',
+                                           '--seed', '1', '--dc', '7'], env=self.env)
+        assert result.exit_code == 0
+        assert '🎰 2d6 simulated 1,000 times (seed 1)' in result.output
+        assert 'P(total ≥ 7):' in result.output
+
+    def test_simulate_invalid_trials(self):
+        """Test that simulate rejects a non-positive trial count"""
+        result = self.runner.invoke(main, ['simulate', '2d6', '--trials', '0'], env=self.env)
+        assert result.exit_code != 0
+
+    def test_audit_command(self):
+        """Test auditing fresh rolls of chosen die sizes"""
+        result = self.runner.invoke(main, ['audit', '-s', '6', '-s', '20', '-n', '20000', '--seed', '1',
+                                           '--alpha', '0.0001'], env=self.env)
+        assert result.exit_code == 0
+        assert '✅ d6: 20,000 values' in result.output
+        assert '✅ d20: 20,000 values' in result.output
+        assert 'chi-squared' in result.output
+        assert 'All dice look fair.' in result.output
+
+    def test_audit_history(self):
+        """Test auditing the rolls stored in history"""
+        self.runner.invoke(main, ['50d6'], env=self.env)
+        result = self.runner.invoke(main, ['audit', '--history'], env=self.env)
+        assert result.exit_code == 0
+        assert 'd6: 50 values' in result.output
+
+        result = self.runner.invoke(main, ['audit', '--history', '-s', '20'], env=self.env)
+        assert '📜 No stored rolls to audit.' in result.output
+
+    def test_audit_rejects_seeding_secure_engine(self):
+        """Test that the secure engine cannot be audited with a seed"""
+        result = self.runner.invoke(main, ['audit', '--engine', 'secure', '--seed', '1'], env=self.env)
+        assert result.exit_code != 0
+        assert 'cannot be seeded' in result.output
+
+    def test_engines_command(self):
+        """Test the engine throughput comparison"""
+        result = self.runner.invoke(main, ['engines', '--dice', '1000', '--repeat', '1'], env=self.env)
+        assert result.exit_code == 0
+        assert 'bulk' in result.output
+        assert 'secure' in result.output
+        assert 'M dice/s' in result.output
+
+    def test_output_modes(self):
+        """Test the summary, JSON and quiet output flags before or after the notation"""
+        result = self.runner.invoke(main, ['1000d6', '--summary'], env=self.env)
+        assert result.exit_code == 0
+        assert 'Dice: 1,000 (min' in result.output
+        assert 'Faces: 1×' in result.output
+
+        result = self.runner.invoke(main, ['--json', '3d6+1'], env=self.env)
+        reply = json.loads(result.output)
+        assert reply['command'] == '3d6+1'
+        assert reply['total'] == sum(reply['individual_rolls']) + 1
+
+        result = self.runner.invoke(main, ['-q', '2d6'], env=self.env)
+        assert 2 <= int(result.output) <= 12
+
+        # Every mode still records the roll
+        history = RollHistory(self.temp_file.name).get_history()
+        assert [entry['command'] for entry in history] == ['1000d6', '3d6+1', '2d6']
+
+    def test_large_rolls_are_elided(self):
+        """Test that huge rolls show only some dice unless --all-rolls is given"""
+        result = self.runner.invoke(main, ['500d6'], env=self.env)
+        assert '(480 more)' in result.output
+
+        result = self.runner.invoke(main, ['500d6', '--all-rolls'], env=self.env)
+        assert 'more)' not in result.output
+        assert result.output.split('\n')[1].count(' + ') == 499
+
+        result = self.runner.invoke(main, ['history', '--limit', '1'], env=self.env)
+        assert '(480 more)' in result.output
+
+    def test_huge_rolls_are_kept_as_face_counts(self):
+        """Test that a million-die roll is shown and saved as face counts"""
+        result = self.runner.invoke(main, ['1000000d6+2'], env=self.env)
+        assert result.exit_code == 0
+        assert 'Dice: 1,000,000 (min 1, max 6' in result.output
+        assert 'Faces: 1×' in result.output
+
+        entry = RollHistory(self.temp_file.name).get_history()[-1]
+        assert entry['individual_rolls'] == []
+        assert sum(entry['face_counts']) == 1000000
+        assert entry['total'] == sum(face * hits for face, hits in enumerate(entry['face_counts'], 1)) + 2
+
+        result = self.runner.invoke(main, ['history', '--limit', '1'], env=self.env)
+        assert 'Faces: 1×' in result.output
+
+    def test_history_of_big_dice_face_counts_stays_short(self):
+        """Test that history shows no per-face list for a face-count roll of big dice"""
+        face_counts = [2] * 100000
+        dice_roll = DiceRoll(count=200000, sides=100000)
+        total = sum(face * hits for face, hits in enumerate(face_counts, 1))
+        RollHistory(self.temp_file.name).add_roll(HistogramResult(dice_roll, face_counts, total, '200000d100000'))
+
+        result = self.runner.invoke(main, ['history'], env=self.env)
+        assert result.exit_code == 0
+        assert 'Dice: 200,000 (min 1, max 100000' in result.output
+        assert 'Faces:' not in result.output
+        assert max(len(line) for line in result.output.splitlines()) < 100
+
+    def test_roll_shown_when_history_cannot_store_it(self):
+        """Test that a roll the binary history cannot hold is still printed, with a warning"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            env = {'DICE_ROLLER_HISTORY': str(Path(temp_dir) / 'history.bin')}
+            result = self.runner.invoke(main, ['1d20+3000000000'], env=env)
+
+        assert result.exit_code == 0
+        assert '🎲 1d20+3000000000 →' in result.output
+        assert 'Could not save roll history' in result.output
+
+    @pytest.mark.parametrize('notation', ['1d6+' + '9' * 23, '1d' + '9' * 23])
+    def test_roll_shown_when_sqlite_history_cannot_store_it(self, notation):
+        """Test that a roll beyond SQLite's 64-bit integers is printed, with the warning on stderr"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            env = {'DICE_ROLLER_HISTORY': str(Path(temp_dir) / 'history.db')}
+            result = self.runner.invoke(main, [notation], env=env)
+
+        assert result.exit_code == 0
+        assert result.stdout.startswith(f'🎲 {notation} →')
+        assert 'Could not save roll history' in result.stderr
+
+    def test_batch(self, monkeypatch):
+        """Test rolling a file of notations and saving every roll in one write"""
+        writes = []
+        add_entries = RollHistory.add_entries
+        monkeypatch.setattr(RollHistory, 'add_entries',
+                            lambda history, entries: writes.append(len(entries)) or add_entries(history, entries))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            batch_file = Path(temp_dir) / 'rolls.txt'
+            batch_file.write_text("# encounter\n3d6+2\n4d6 x3\n\n1d20\n")
+            result = self.runner.invoke(main, ['batch', str(batch_file)], env=self.env)
+
+        assert result.exit_code == 0
+        assert result.output.count('🎲 4d6 →') == 3
+        assert '🎲 3d6+2 →' in result.output
+
+        assert writes == [5]
+        history = RollHistory(self.temp_file.name)
+        assert [entry['command'] for entry in history.get_history()] == ['3d6+2', '4d6', '4d6', '4d6', '1d20']
+
+    def test_batch_from_stdin_as_json_lines(self):
+        """Test reading notations from stdin and printing JSON Lines"""
+        for args in (['batch', '-', '--json'], ['--json', 'batch']):
+            result = self.runner.invoke(main, args, input="2d6 x2\n1d4\n", env=self.env)
+            assert result.exit_code == 0
+            replies = [json.loads(line) for line in result.output.splitlines()]
+            assert [reply['command'] for reply in replies] == ['2d6', '2d6', '1d4']
+            assert all(reply['total'] == sum(reply['individual_rolls']) for reply in replies)
+
+    def test_batch_reports_invalid_lines(self):
+        """Test that bad lines are reported and skipped, and the exit code says so"""
+        result = self.runner.invoke(main, ['batch', '-q'], input="1d6\nfireball\n1d20 x0\n2d4\n", env=self.env)
+        assert result.exit_code == 1
+        assert 'Line 2: invalid dice notation: fireball' in result.output
+        assert 'Line 3: repeat count must be at least 1' in result.output
+        assert [entry['command'] for entry in RollHistory(self.temp_file.name).get_history()] == ['1d6', '2d4']
+
+    def test_profile_breakdown(self):
+        """Test that --profile prints time per stage and counters"""
+        for args in (['--profile', '3d6'], ['3d6', '--profile']):
+            metrics.reset()
+            result = self.runner.invoke(main, args, env=self.env)
+            assert result.exit_code == 0
+            assert '🎲 3d6 →' in result.output
+            assert '⏱️  Profile' in result.output
+            for stage in ('parse', 'roll', 'history.write', 'render'):
+                assert stage in result.output
+            assert 'rolls 1, dice 3' in result.output
+
+    def test_shell_metrics_file(self):
+        """Test that the shell keeps a metrics file up to date"""
+        metrics_path = Path(self.temp_file.name + '.prom')
+        try:
+            result = self.runner.invoke(main, ['shell', '--metrics', str(metrics_path)], input="2d6\n1d20\n",
+                                        env=self.env)
+            assert result.exit_code == 0
+            text = metrics_path.read_text()
+            assert 'dice_roller_rolls_total 2' in text
+            assert 'dice_roller_dice_total 3' in text
+        finally:
+            metrics_path.unlink(missing_ok=True)
+
+    def test_seed_environment_variable(self):
+        """Test that DICE_ROLLER_SEED makes rolls reproducible"""
+        env = dict(self.env, DICE_ROLLER_SEED='11')
+        first = self.runner.invoke(main, ['10d20'], env=env)
+        second = self.runner.invoke(main, ['10d20'], env=env)
+        assert first.output == second.output
+
+    @pytest.mark.parametrize('variable,value,message', [
+        ('DICE_ROLLER_ENGINE', 'fast', 'Unknown engine: fast'),
+        ('DICE_ROLLER_SEED', 'lucky', 'DICE_ROLLER_SEED must be an integer'),
+        ('DICE_ROLLER_BACKEND', 'foo', 'Unknown history backend: foo'),
+    ])
+    def test_bad_environment_is_one_line_error(self, variable, value, message):
+        """Test that a bad engine, seed or backend variable is reported without a traceback"""
+        env = dict(self.env, **{variable: value})
+        for args in (['3d6'], ['history'], ['stats', '3d6']):
+            result = self.runner.invoke(main, args, env=env)
+            assert result.exit_code == 1
+            assert result.output.startswith('Error: ')
+            assert message in result.output and len(result.output.splitlines()) == 1
+            assert not isinstance(result.exception, ValueError)
+
+    def test_shell_rolls_and_history(self):
+        """Test rolling and viewing history in the interactive shell"""
+        commands = "1d20\n3d6+2\n\nhistory 1\nbogus\nquit\n4d6\n"
+        result = self.runner.invoke(main, ['shell'], input=commands, env=self.env)
+        assert result.exit_code == 0
+        assert '🎲 1d20 →' in result.output
+        assert '🎲 3d6+2 →' in result.output
+        assert '📜 Roll History:' in result.output
+        assert '❌ Invalid dice notation: bogus' in result.output
+        # Nothing after quit is run
+        assert '4d6' not in result.output
+
+        result = self.runner.invoke(main, ['history', '--all'], env=self.env)
+        roll_lines = [line for line in result.output.split('\n') if '🎲' in line]
+        assert len(roll_lines) == 2
+
+    def test_shell_clear(self):
+        """Test clearing history from the shell with confirmation"""
+        self.runner.invoke(main, ['1d20'], env=self.env)
+        result = self.runner.invoke(main, ['shell'], input="clear\ny\nhistory\n", env=self.env)
+        assert result.exit_code == 0
+        assert '🗑️  Roll history cleared' in result.output
+        assert '📜 No roll history found' in result.output
+
+    def test_shell_ends_at_end_of_input(self):
+        """Test that the shell exits cleanly when input runs out"""
+        result = self.runner.invoke(main, ['shell'], input="1d4\nclear\n", env=self.env)
+        assert result.exit_code == 0
+        assert '🎲 1d4 →' in result.output
+
+    def test_roll_with_unwritable_history(self):
+        """Test that a roll is still shown when history cannot be saved"""
+        env = {'DICE_ROLLER_HISTORY': str(Path(self.temp_file.name).parent / 'missing-dir' / 'history.json')}
+        result = self.runner.invoke(main, ['1d20'], env=env)
+        assert result.exit_code == 0
+        assert '🎲 1d20 →' in result.output
+        assert 'Could not save roll history' in result.output
+
+    def test_convert_history(self):
+        """Test converting history to the binary format and back"""
+        for notation in ['1d20', '3d6+2']:
+            self.runner.invoke(main, [notation], env=self.env)
+        target = self.temp_file.name + '.bin'
+        try:
+            result = self.runner.invoke(main, ['convert', self.temp_file.name, target], env=self.env)
+            assert result.exit_code == 0
+            assert 'Converted 2 rolls' in result.output
+            assert RollHistory(target).get_history() == RollHistory(self.temp_file.name).get_history()
+
+            result = self.runner.invoke(main, ['convert', target, 'out.json', '--to', 'nope'], env=self.env)
+            assert 'Unknown history backend' in result.output
+        finally:
+            for suffix in ('', '.idx', '.cmd', '.lock'):
+                Path(target + suffix).unlink(missing_ok=True)
+
+    def test_history_export(self):
+        """Test exporting history as JSON Lines to stdout and CSV to a file"""
+        for notation in ['1d20', '3d6+2']:
+            self.runner.invoke(main, [notation], env=self.env)
+
+        result = self.runner.invoke(main, ['history', '--export', 'jsonl'], env=self.env)
+        assert result.exit_code == 0
+        assert [line.count('"command"') for line in result.output.splitlines()] == [1, 1]
+
+        output = self.temp_file.name + '.csv'
+        try:
+            result = self.runner.invoke(main, ['history', '-e', 'csv', '-o', output], env=self.env)
+            assert result.exit_code == 0
+            assert 'Exported 2 rolls' in result.output
+            lines = Path(output).read_text().splitlines()
+            assert lines[0].startswith('timestamp,command')
+            assert lines[2].split(',')[1] == '3d6+2'
+        finally:
+            Path(output).unlink(missing_ok=True)
+
+        result = self.runner.invoke(main, ['history', '--export', 'xml'], env=self.env)
+        assert result.exit_code != 0
+
+    def test_history_stats(self):
+        """Test the history stats subcommand and rebuilding its index"""
+        result = self.runner.invoke(main, ['history', 'stats'], env=self.env)
+        assert 'No roll history found' in result.output
+
+        for notation in ['1d20', '1d20', '3d6+2']:
+            self.runner.invoke(main, [notation], env=self.env)
+
+        result = self.runner.invoke(main, ['history', 'stats', '--faces'], env=self.env)
+        assert result.exit_code == 0
+        assert 'Roll Statistics (3 rolls)' in result.output
+        assert '1d20: 2 rolls' in result.output
+        assert 'd6: 3 dice' in result.output
+
+        result = self.runner.invoke(main, ['history', 'stats', '-c', '1d20'], env=self.env)
+        assert '1d20 statistics' in result.output
+        assert 'Totals: 2 rolls' in result.output
+
+        Path(self.temp_file.name + '.stats.json').unlink(missing_ok=True)
+        Path(self.temp_file.name + '.stats.journal').unlink()
+        result = self.runner.invoke(main, ['history', 'stats'], env=self.env)
+        assert '--rebuild' in result.output
+        result = self.runner.invoke(main, ['history', 'stats', '--rebuild'], env=self.env)
+        assert 'Rebuilt the statistics index from 3 rolls' in result.output
+        assert '1d20: 2 rolls' in result.output
+
 
 class TestDiceRollerCLIClass:
     """Test the DiceRollerCLI class directly"""
@@ -161,6 +516,8 @@ class TestDiceRollerCLIClass:
     def teardown_method(self):
         """Clean up temporary file"""
         Path(self.temp_file.name).unlink(missing_ok=True)
+        for suffix in (".lock", ".stats.json", ".stats.journal", ".stats.lock"):
+            Path(self.temp_file.name + suffix).unlink(missing_ok=True)
 
     def test_roll_dice_valid(self):
         """Test roll_dice method with valid input"""
@@ -210,3 +567,4 @@ class TestDiceRollerCLIClass:
         # Clear history
         self.cli.clear_history()
         assert len(self.cli.history.get_history()) == 0
+
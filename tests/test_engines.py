@@ -0,0 +1,268 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/tests/test_engines.py
+import math
+import random
+import pytest
+from collections import Counter
+from dice_roller.engines import HAS_NUMPY, binomial_variate, bulk_randints, loop_randints, multinomial_counts
+from dice_roller.parser import DiceRoll
+from dice_roller.roller import DiceRoller, RollResult, available_engines, benchmark_engines
+
+ENGINES = [
+    'loop',
+    'bulk',
+    'secure',
+    pytest.param('numpy', marks=pytest.mark.skipif(not HAS_NUMPY, reason='NumPy is not installed')),
+]
+
+# Standard normal quantile for a 0.05% false alarm rate per check
+Z_CRITICAL = 3.29
+
+
+def chi2_critical(df):
+    """Wilson-Hilferty approximation of the chi-squared critical value"""
+    return df * (1 - 2 / (9 * df) + Z_CRITICAL * math.sqrt(2 / (9 * df))) ** 3
+
+
+def chi2_uniform(rolls, sides):
+    """Chi-squared statistic of rolls against a fair die"""
+    counts = Counter(rolls)
+    expected = len(rolls) / sides
+    return sum((counts.get(face, 0) - expected) ** 2 / expected for face in range(1, sides + 1))
+
+
+def seeded_roller(engine, seed=1234):
+    """Create a roller with a fixed seed"""
+    roller = DiceRoller(engine=engine)
+    roller.random.seed(seed)
+    return roller
+
+
+class TestEngineEquivalence:
+    """Statistical equivalence tests for every dice engine"""
+
+    @pytest.mark.parametrize('engine', ENGINES)
+    @pytest.mark.parametrize('sides', [1, 2, 6, 7, 20, 100, 255, 256, 257, 300, 65537, 2 ** 40, 2 ** 70])
+    def test_values_in_range(self, engine, sides):
+        """Test that every engine returns `count` dice within 1..sides"""
+        result = seeded_roller(engine).roll(DiceRoll(count=500, sides=sides), f"500d{sides}")
+
+        assert len(result.individual_rolls) == 500
+        assert all(isinstance(roll, int) for roll in result.individual_rolls)
+        assert all(1 <= roll <= sides for roll in result.individual_rolls)
+
+    @pytest.mark.parametrize('engine', ENGINES)
+    @pytest.mark.parametrize('sides', [2, 6, 7, 20, 100, 300])
+    def test_faces_are_uniform(self, engine, sides):
+        """Test each engine against a fair die with a chi-squared test"""
+        count = 3000 * sides if sides < 100 else 200 * sides
+        rolls = seeded_roller(engine).roll(DiceRoll(count=count, sides=sides), "bulk").individual_rolls
+
+        assert chi2_uniform(rolls, sides) < chi2_critical(sides - 1)
+
+    @pytest.mark.parametrize('engine', ENGINES)
+    def test_mean_and_variance(self, engine):
+        """Test that sample mean and variance match a fair d20"""
+        count = 200000
+        rolls = seeded_roller(engine).roll(DiceRoll(count=count, sides=20), "200000d20").individual_rolls
+
+        mean = sum(rolls) / count
+        variance = sum((roll - mean) ** 2 for roll in rolls) / (count - 1)
+        expected_mean = 10.5
+        expected_variance = (20 ** 2 - 1) / 12
+
+        assert abs(mean - expected_mean) < Z_CRITICAL * math.sqrt(expected_variance / count)
+        assert abs(variance / expected_variance - 1) < 0.02
+
+    @pytest.mark.parametrize('sides', [6, 7, 20])
+    def test_bulk_matches_loop_distribution(self, sides):
+        """Test that bulk and loop samples come from the same distribution"""
+        count = 2000 * sides
+        loop_counts = Counter(loop_randints(random.Random(1), count, sides))
+        bulk_counts = Counter(bulk_randints(random.Random(2), count, sides))
+
+        # Two-sample chi-squared test of homogeneity with equal sample sizes
+        statistic = sum(
+            (loop_counts[face] - bulk_counts[face]) ** 2 / (loop_counts[face] + bulk_counts[face])
+            for face in range(1, sides + 1)
+        )
+        assert statistic < chi2_critical(sides - 1)
+
+    @pytest.mark.parametrize('engine', ENGINES)
+    def test_result_shape(self, engine):
+        """Test that every engine returns the same RollResult shape"""
+        dice_roll = DiceRoll(count=100, sides=6, modifier=-2)
+        result = seeded_roller(engine).roll(dice_roll, "100d6-2")
+
+        assert isinstance(result, RollResult)
+        assert result.dice_roll is dice_roll
+        assert isinstance(result.individual_rolls, list)
+        assert isinstance(result.total, int)
+        assert result.total == sum(result.individual_rolls) - 2
+        assert result.command == "100d6-2"
+
+    def test_seeded_rolls_are_reproducible(self):
+        """Test that seeding the roller reproduces bulk rolls"""
+        dice_roll = DiceRoll(count=1000, sides=6)
+        first = seeded_roller('bulk', 99).roll(dice_roll, "1000d6")
+        second = seeded_roller('bulk', 99).roll(dice_roll, "1000d6")
+        assert first.individual_rolls == second.individual_rolls
+
+
+class TestEngineSelection:
+    """Test cases for choosing the dice engine"""
+
+    def test_auto_uses_loop_for_small_rolls(self, monkeypatch):
+        """Test that small rolls keep the one-die-at-a-time engine"""
+        calls = []
+        monkeypatch.setattr('dice_roller.roller.loop_randints',
+                            lambda rng, count, sides: calls.append(count) or [1] * count)
+        DiceRoller().roll(DiceRoll(count=3, sides=6), "3d6")
+        assert calls == [3]
+
+    def test_auto_uses_bulk_without_numpy(self, monkeypatch):
+        """Test that large rolls use the bulk engine when NumPy is missing"""
+        calls = []
+        monkeypatch.setattr('dice_roller.roller.HAS_NUMPY', False)
+        monkeypatch.setattr('dice_roller.roller.bulk_randints',
+                            lambda rng, count, sides: calls.append(count) or [1] * count)
+        DiceRoller().roll(DiceRoll(count=1000, sides=6), "1000d6")
+        assert calls == [1000]
+
+    def test_unknown_engine(self):
+        """Test that unknown engine names are rejected"""
+        with pytest.raises(ValueError):
+            DiceRoller(engine='abacus')
+
+    @pytest.mark.skipif(HAS_NUMPY, reason='NumPy is installed')
+    def test_numpy_engine_requires_numpy(self):
+        """Test that asking for NumPy without it installed is an error"""
+        with pytest.raises(ValueError):
+            DiceRoller(engine='numpy')
+
+    def test_engine_from_environment(self, monkeypatch):
+        """Test choosing the engine with DICE_ROLLER_ENGINE"""
+        monkeypatch.setenv('DICE_ROLLER_ENGINE', 'bulk')
+        assert DiceRoller().engine == 'bulk'
+        assert DiceRoller(engine='loop').engine == 'loop'
+
+        monkeypatch.setenv('DICE_ROLLER_ENGINE', 'abacus')
+        with pytest.raises(ValueError):
+            DiceRoller()
+
+    def test_secure_engine_uses_system_random(self, monkeypatch):
+        """Test that the secure engine draws from the OS and takes all dice in bulk"""
+        calls = []
+        monkeypatch.setattr('dice_roller.roller.secure_randints',
+                            lambda rng, count, sides: calls.append((type(rng), count)) or [1] * count)
+        DiceRoller(engine='secure').roll(DiceRoll(count=1, sides=20), "1d20")
+        assert calls == [(random.SystemRandom, 1)]
+
+    def test_secure_engine_cannot_be_seeded(self, monkeypatch):
+        """Test that a seed is refused for the OS random source"""
+        with pytest.raises(ValueError):
+            DiceRoller(engine='secure', seed=1)
+        monkeypatch.setenv('DICE_ROLLER_SEED', '1')
+        with pytest.raises(ValueError):
+            DiceRoller(engine='secure')
+
+    @pytest.mark.parametrize('engine', ['auto', 'loop', 'bulk'])
+    def test_seed_reproduces_rolls(self, engine):
+        """Test that the same seed gives the same sequence of rolls"""
+        def rolls(seed):
+            roller = DiceRoller(engine=engine, seed=seed)
+            return [roller.roll(DiceRoll(count=count, sides=20), "seeded").individual_rolls for count in (1, 100)]
+
+        assert rolls(7) == rolls(7)
+        assert rolls(7) != rolls(8)
+
+    def test_seed_from_environment(self, monkeypatch):
+        """Test seeding with DICE_ROLLER_SEED"""
+        monkeypatch.setenv('DICE_ROLLER_SEED', '42')
+        assert DiceRoller().seed == 42
+        assert DiceRoller(seed=3).seed == 3
+
+        monkeypatch.setenv('DICE_ROLLER_SEED', 'lucky')
+        with pytest.raises(ValueError):
+            DiceRoller()
+
+    def test_seeded_auto_does_not_use_numpy(self, monkeypatch):
+        """Test that seeded rolls are the same with and without NumPy installed"""
+        monkeypatch.setattr('dice_roller.roller.HAS_NUMPY', True)
+        monkeypatch.setattr('dice_roller.roller.numpy_randints', lambda generator, count, sides: pytest.fail())
+        DiceRoller(seed=1).roll(DiceRoll(count=1000, sides=6), "1000d6")
+
+
+class TestEngineBenchmark:
+    """Test cases for measuring engine throughput"""
+
+    def test_available_engines(self):
+        """Test listing the engines usable here"""
+        engines = available_engines()
+        assert engines[0] == 'auto'
+        assert 'secure' in engines
+        assert ('numpy' in engines) == HAS_NUMPY
+
+    def test_benchmark_engines(self):
+        """Test that every engine gets a positive throughput"""
+        throughput = benchmark_engines(count=1000, sides=6, engines=['loop', 'bulk', 'secure'], repeat=1)
+        assert list(throughput) == ['loop', 'bulk', 'secure']
+        assert all(per_second > 0 for per_second in throughput.values())
+
+
+class TestMultinomialCounts:
+    """Test cases for sampling face counts without rolling every die"""
+
+    @pytest.mark.parametrize('n, p', [(20, 0.1), (1000, 0.5), (10 ** 6, 1 / 6), (10 ** 7, 0.3), (50, 0.9)])
+    def test_binomial_mean_and_variance(self, n, p):
+        """Test binomial draws against the exact mean and variance, on both algorithms"""
+        rng = random.Random(42)
+        samples = [binomial_variate(rng, n, p) for _ in range(20000)]
+        mean = sum(samples) / len(samples)
+        variance = sum((x - mean) ** 2 for x in samples) / (len(samples) - 1)
+        assert all(0 <= x <= n for x in samples)
+        expected_variance = n * p * (1 - p)
+        assert abs(mean - n * p) < Z_CRITICAL * math.sqrt(expected_variance / len(samples))
+        assert variance == pytest.approx(expected_variance, rel=0.05)
+
+    def test_binomial_edge_cases(self):
+        """Test zero trials and certain or impossible outcomes"""
+        rng = random.Random(0)
+        assert binomial_variate(rng, 0, 0.5) == 0
+        assert binomial_variate(rng, 10, 0.0) == 0
+        assert binomial_variate(rng, 10, 1.0) == 10
+
+    @pytest.mark.parametrize('count, sides', [(10 ** 6, 6), (10 ** 9, 20), (3, 6), (0, 4), (5, 1)])
+    def test_counts_cover_every_die(self, count, sides):
+        """Test that there is one count per face and they add up to the dice rolled"""
+        counts = multinomial_counts(random.Random(1), count, sides)
+        assert len(counts) == sides
+        assert sum(counts) == count
+        assert min(counts) >= 0
+
+    @pytest.mark.parametrize('sides', [2, 6, 20])
+    def test_faces_are_uniform(self, sides):
+        """Test that each face gets its fair share of a large roll"""
+        counts = multinomial_counts(random.Random(7), 10 ** 6, sides)
+        expected = 10 ** 6 / sides
+        assert sum((hits - expected) ** 2 / expected for hits in counts) < chi2_critical(sides - 1)
+
+    @pytest.mark.skipif(not HAS_NUMPY, reason='NumPy is not installed')
+    def test_numpy_falls_back_beyond_64_bits(self):
+        """Test that more dice than NumPy's 64-bit integers hold are counted in pure Python"""
+        count = 10 ** 22
+        counts = DiceRoller(engine='numpy').roll_histogram(DiceRoll(count=count, sides=6), 'x').face_counts
+        assert sum(counts) == count
+
+    def test_huge_counts_skip_numpy(self, monkeypatch):
+        """Test that the NumPy engine is not handed a dice count beyond 64 bits"""
+        monkeypatch.setattr('dice_roller.roller.HAS_NUMPY', True)
+        monkeypatch.setattr('dice_roller.roller.numpy_multinomial_counts', lambda *args: pytest.fail())
+        counts = DiceRoller(engine='numpy').roll_histogram(DiceRoll(count=10 ** 22, sides=6), 'x').face_counts
+        assert sum(counts) == 10 ** 22
+
+    def test_seeded_counts_are_reproducible(self):
+        """Test that the same seed gives the same counts"""
+        roller = DiceRoller(engine='bulk', seed=99)
+        again = DiceRoller(engine='bulk', seed=99)
+        dice_roll = DiceRoll(count=10 ** 6, sides=6)
+        assert roller.roll_histogram(dice_roll, 'x').face_counts == again.roll_histogram(dice_roll, 'x').face_counts
@@ -0,0 +1,117 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/tests/test_export.py
+import csv
+import io
+import json
+import tempfile
+import tracemalloc
+import pytest
+from pathlib import Path
+from dice_roller.export import CSV_FIELDS, export_entries
+from dice_roller.history import RollHistory
+
+
+def make_entry(index):
+    """Helper to build a distinct history entry"""
+    return {
+        'timestamp': f"2024-10-02T14:30:{index % 60:02d}",
+        'command': "3d6+2",
+        'count': 3,
+        'sides': 6,
+        'modifier': 2,
+        'individual_rolls': [index % 6 + 1, 2, 3],
+        'total': index % 6 + 8
+    }
+
+
+class TestExportEntries:
+    """Test cases for history export formats"""
+
+    def test_jsonl(self):
+        """Test JSON Lines export"""
+        stream = io.StringIO()
+        entries = [make_entry(i) for i in range(3)]
+
+        assert export_entries(iter(entries), 'jsonl', stream) == 3
+        assert [json.loads(line) for line in stream.getvalue().splitlines()] == entries
+
+    def test_csv(self):
+        """Test CSV export with a header row and space-separated rolls"""
+        stream = io.StringIO()
+        assert export_entries([make_entry(0), make_entry(1)], 'csv', stream) == 2
+
+        rows = list(csv.reader(io.StringIO(stream.getvalue())))
+        assert rows[0] == list(CSV_FIELDS)
+        assert rows[1] == ['2024-10-02T14:30:00', '3d6+2', '3', '6', '2', '1 2 3', '8', '']
+        assert len(rows) == 3
+
+    def test_csv_face_counts(self):
+        """Test that histogram entries export their face counts"""
+        entry = dict(make_entry(0), count=5, individual_rolls=[], face_counts=[1, 0, 2, 0, 0, 2])
+        stream = io.StringIO()
+        export_entries([entry], 'csv', stream)
+
+        row = list(csv.reader(io.StringIO(stream.getvalue())))[1]
+        assert row[CSV_FIELDS.index('individual_rolls')] == ''
+        assert row[CSV_FIELDS.index('face_counts')] == '1 0 2 0 0 2'
+
+    def test_empty_history(self):
+        """Test that CSV export of nothing still writes the header"""
+        stream = io.StringIO()
+        assert export_entries([], 'csv', stream) == 0
+        assert stream.getvalue().strip() == ','.join(CSV_FIELDS)
+
+    def test_unknown_format(self):
+        """Test that unknown formats are rejected"""
+        with pytest.raises(ValueError):
+            export_entries([], 'xml', io.StringIO())
+
+
+class TestStreamingHistory:
+    """Test that history is streamed rather than loaded"""
+
+    def setup_method(self):
+        """Set up a temporary directory"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def teardown_method(self):
+        """Remove the temporary directory"""
+        self.temp_dir.cleanup()
+
+    @pytest.mark.parametrize('name', ['history.json', 'history.db', 'history.bin'])
+    def test_iter_history(self, name):
+        """Test iter_history on each storage format"""
+        history = RollHistory(str(Path(self.temp_dir.name) / name))
+        history.backend.append([make_entry(i) for i in range(50)])
+
+        stream = history.iter_history()
+        assert next(stream) == make_entry(0)
+        assert list(stream) == [make_entry(i) for i in range(1, 50)]
+        assert list(history.iter_history(limit=2)) == [make_entry(48), make_entry(49)]
+
+    def test_iter_history_across_segments(self):
+        """Test iter_history over gzipped segments"""
+        history = RollHistory(str(Path(self.temp_dir.name) / 'history.json'), backend='segmented')
+        history.backend.segment_entries = 7
+        for index in range(30):
+            history.backend.append([make_entry(index)])
+
+        assert list(history.iter_history()) == [make_entry(i) for i in range(30)]
+
+    @pytest.mark.parametrize('name', ['history.json', 'history.bin'])
+    def test_export_uses_constant_memory(self, name):
+        """Test that exporting a large history never holds it in memory"""
+        history = RollHistory(str(Path(self.temp_dir.name) / name))
+        for start in range(0, 20000, 5000):
+            history.backend.append([make_entry(i) for i in range(start, start + 5000)])
+
+        with open(Path(self.temp_dir.name) / 'export.jsonl', 'w') as stream:
+            tracemalloc.start()
+            try:
+                exported = export_entries(history.iter_history(), 'jsonl', stream)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+        assert exported == 20000
+        # Loading 20000 entries as dicts would take over ten megabytes
+        assert peak < 1024 * 1024
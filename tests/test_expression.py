@@ -0,0 +1,156 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/tests/test_expression.py
+import io
+import tempfile
+import pytest
+from pathlib import Path
+from dice_roller.expression import ExpressionError, compile_expression
+from dice_roller.history import RollHistory
+from dice_roller.parser import DiceParser, DiceRoll
+from dice_roller.render import roll_result_lines, write_roll_result
+from dice_roller.roller import DiceRoller, ExpressionResult
+
+
+def fixed_dice(value):
+    """Dice source that rolls every die as `value`"""
+    return lambda count, sides: [value] * count
+
+
+def max_dice(count, sides):
+    """Dice source that rolls every die at its maximum"""
+    return [sides] * count
+
+
+class TestCompileExpression:
+    """Test cases for compiling dice expressions"""
+
+    @pytest.mark.parametrize('expression,canonical', [
+        ('1d20', '1d20'),
+        ('2d6+1d4+3', '2d6+1d4+3'),
+        (' 2d6 + 1d4 + 3 ', '2d6+1d4+3'),
+        ('1d20+1d20-2', '2d20-2'),
+        ('2d6 + 1d4 - 1d4 + 2d6', '4d6+1d4-1d4'),
+        ('(1d8+2)*2', '(1d8+2)*2'),
+        ('2*3+1d4', '1d4+6'),
+        ('1d6*(2*3)', '1d6*6'),
+        ('1*1d6', '1d6'),
+        ('-(1d6+2)', '-1d6-2'),
+        ('1d6 - (1d8 - 1d4)', '1d6-1d8+1d4'),
+        ('3-5', '-2'),
+        ('((1d4))', '1d4'),
+        ('1D20+5', '1d20+5'),
+    ])
+    def test_canonical_form(self, expression, canonical):
+        """Test constant folding and like-term merging"""
+        assert str(compile_expression(expression)) == canonical
+
+    @pytest.mark.parametrize('expression', [
+        '', '   ', 'd20', '1d', 'abc', '1d20+', '(1d6', '1d6)', '0d6', '1d0', '1.5d20', '1d20+3.5', '2 3',
+    ])
+    def test_invalid_expressions(self, expression):
+        """Test that invalid expressions are rejected"""
+        with pytest.raises(ExpressionError):
+            compile_expression(expression)
+        assert DiceParser.compile(expression) is None
+
+    def test_deep_nesting_is_rejected(self):
+        """Test that absurd nesting fails cleanly"""
+        with pytest.raises(ExpressionError):
+            compile_expression('(' * 5000 + '1d6' + ')' * 5000)
+
+    @pytest.mark.parametrize('expression', [
+        '1d6' + '+2' * 1000,
+        '1d6+' + '1d4*2+' * 300 + '3',
+        '1d6+' + '9' * 5000,
+        '9' * 5000 + 'd6',
+        '9' * 4000 + '*' + '9' * 4000,
+        '1d6+' + '9' * 4000 + '*' + '9' * 4000,
+    ])
+    def test_oversized_expressions_are_invalid(self, expression):
+        """Test that very long chains and huge numbers fail as invalid, not with other errors"""
+        with pytest.raises(ExpressionError):
+            compile_expression(expression)
+        assert DiceParser.compile(expression) is None
+
+    def test_dice_groups(self):
+        """Test the dice groups an expression rolls"""
+        compiled = compile_expression('2d6+1d4+1d6+3')
+        assert compiled.dice == (DiceRoll(count=3, sides=6), DiceRoll(count=1, sides=4))
+
+    @pytest.mark.parametrize('expression,expected', [
+        ('2d6+1d4+3', 6 * 2 + 4 + 3),
+        ('1d20+1d20-2', 38),
+        ('(1d8+2)*2', 20),
+        ('1d6*(1d4+1)-3*(2-1d4)', 6 * 5 - 3 * (2 - 4)),
+        ('-(1d6+2)', -8),
+        ('1d6-1d6', 0),
+        ('7', 7),
+    ])
+    def test_evaluate(self, expression, expected):
+        """Test totals with maximum rolls on every die"""
+        total, rolls = compile_expression(expression).evaluate(max_dice)
+        assert total == expected
+
+    def test_as_dice_roll(self):
+        """Test converting single-term expressions back to DiceRoll"""
+        assert compile_expression('1d20+1d20-2').as_dice_roll() == DiceRoll(count=2, sides=20, modifier=-2)
+        assert compile_expression('4d8').as_dice_roll() == DiceRoll(count=4, sides=8)
+        assert compile_expression('2d6+1d4').as_dice_roll() is None
+        assert compile_expression('(1d8+2)*2').as_dice_roll() is None
+
+    def test_compile_is_cached(self):
+        """Test that compiling the same expression reuses the compiled object"""
+        assert DiceParser.compile('2d6+1d4+3') is DiceParser.compile('2d6+1d4+3')
+
+
+class TestEvaluateExpression:
+    """Test cases for rolling compiled expressions with DiceRoller"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.roller = DiceRoller()
+
+    def test_evaluate_result(self):
+        """Test the result of rolling a compiled expression"""
+        compiled = DiceParser.compile('2d6+1d4+3')
+        result = self.roller.evaluate(compiled, '2d6 + 1d4 + 3')
+
+        assert isinstance(result, ExpressionResult)
+        assert result.command == '2d6 + 1d4 + 3'
+        assert len(result.dice_rolls) == 2
+        assert len(result.dice_rolls[0]) == 2 and len(result.dice_rolls[1]) == 1
+        assert all(1 <= roll <= 6 for roll in result.dice_rolls[0])
+        assert 1 <= result.dice_rolls[1][0] <= 4
+        assert result.total == sum(result.individual_rolls) + 3
+
+    def test_default_command_is_canonical_form(self):
+        """Test that the command defaults to the canonical expression"""
+        result = self.roller.evaluate(DiceParser.compile('1d20 + 1d20'))
+        assert result.command == '2d20'
+
+    def test_results_cannot_be_stored_or_shown_as_rolls(self):
+        """Test that expression results are refused by history and render with TypeError"""
+        result = self.roller.evaluate(DiceParser.compile('2d6+1d4'))
+        with tempfile.TemporaryDirectory() as directory:
+            history = RollHistory(Path(directory) / 'history.jsonl')
+            with pytest.raises(TypeError):
+                history.add_roll(result)
+            assert history.get_history() == []
+        with pytest.raises(TypeError):
+            roll_result_lines(result)
+        with pytest.raises(TypeError):
+            write_roll_result(result, io.StringIO(), 'json')
+        stream = io.StringIO()
+        write_roll_result(result, stream, 'quiet')
+        assert stream.getvalue() == f"{result.total}\n"
+
+    def test_repeated_evaluation_does_not_reparse(self, monkeypatch):
+        """Test that a compiled expression is evaluated without the parser"""
+        compiled = DiceParser.compile('1d20+1d4+5')
+
+        def fail(*args, **kwargs):
+            raise AssertionError('expression was re-parsed')
+
+        monkeypatch.setattr('dice_roller.expression._tokenize', fail)
+        totals = {self.roller.evaluate(compiled).total for _ in range(500)}
+        assert min(totals) >= 7 and max(totals) <= 29
+        assert len(totals) > 1
@@ -21,6 +21,8 @@ class TestRollHistory:
     def teardown_method(self):
         """Clean up temporary file"""
         Path(self.temp_file.name).unlink(missing_ok=True)
+        for suffix in (".lock", ".stats.json", ".stats.journal", ".stats.lock"):
+            Path(self.temp_file.name + suffix).unlink(missing_ok=True)
 
     def create_test_result(self, command="1d20", count=1, sides=20, modifier=0, rolls=None, total=None):
         """Helper to create test roll results"""
@@ -184,6 +186,8 @@ class TestRollHistory:
         """Test behavior when history file doesn't exist"""
         nonexistent_file = "/tmp/nonexistent_history.json"
         Path(nonexistent_file).unlink(missing_ok=True)
+        for suffix in (".lock", ".stats.json", ".stats.journal", ".stats.lock"):
+            Path(nonexistent_file + suffix).unlink(missing_ok=True)
 
         history = RollHistory(nonexistent_file)
 
@@ -198,3 +202,140 @@ class TestRollHistory:
 
         # Clean up
         Path(nonexistent_file).unlink(missing_ok=True)
+        for suffix in (".lock", ".stats.json", ".stats.journal", ".stats.lock"):
+            Path(nonexistent_file + suffix).unlink(missing_ok=True)
+
+    def test_history_file_is_json_lines(self):
+        """Test that each roll is stored as one JSON line"""
+        for i in range(3):
+            self.history.add_roll(self.create_test_result(f"{i+1}d6"))
+
+        with open(self.temp_file.name, 'r') as f:
+            lines = f.read().splitlines()
+
+        assert len(lines) == 3
+        assert [json.loads(line)['command'] for line in lines] == ['1d6', '2d6', '3d6']
+
+    def test_add_roll_appends_without_rewriting(self):
+        """Test that adding a roll leaves existing records untouched"""
+        self.history.add_roll(self.create_test_result("1d20"))
+        with open(self.temp_file.name, 'rb') as f:
+            before = f.read()
+
+        self.history.add_roll(self.create_test_result("3d6"))
+        with open(self.temp_file.name, 'rb') as f:
+            after = f.read()
+
+        assert after.startswith(before)
+        assert after[len(before):].count(b'\n') == 1
+
+    def test_legacy_json_array_is_migrated(self):
+        """Test that an old JSON array history file is converted to JSON Lines"""
+        legacy = [
+            {'timestamp': '2024-10-02T14:30:15', 'command': '1d20', 'count': 1, 'sides': 20,
+             'modifier': 0, 'individual_rolls': [15], 'total': 15},
+            {'timestamp': '2024-10-02T14:30:22', 'command': '3d6', 'count': 3, 'sides': 6,
+             'modifier': 0, 'individual_rolls': [4, 3, 5], 'total': 12},
+        ]
+        with open(self.temp_file.name, 'w') as f:
+            json.dump(legacy, f, indent=2)
+
+        # Legacy files are readable before migration
+        assert [entry['command'] for entry in self.history.get_history()] == ['1d20', '3d6']
+
+        self.history.add_roll(self.create_test_result("2d8+3"))
+
+        with open(self.temp_file.name, 'r') as f:
+            lines = f.read().splitlines()
+        assert len(lines) == 3
+        assert json.loads(lines[0]) == legacy[0]
+        assert [entry['command'] for entry in self.history.get_history()] == ['1d20', '3d6', '2d8+3']
+
+    def test_truncated_last_line_is_skipped(self):
+        """Test that a partially written record does not corrupt later rolls"""
+        self.history.add_roll(self.create_test_result("1d20"))
+        with open(self.temp_file.name, 'a') as f:
+            f.write('{"command": "4d6", "tot')
+
+        self.history.add_roll(self.create_test_result("3d6"))
+
+        history = self.history.get_history()
+        assert [entry['command'] for entry in history] == ['1d20', '3d6']
+
+    def test_tail_read_across_blocks(self):
+        """Test that limited reads match a full load when records span read blocks"""
+        self.history.backend.TAIL_BLOCK_SIZE = 16
+        for i in range(30):
+            self.history.add_roll(self.create_test_result(f"{i+1}d6", rolls=[1] * (i + 1)))
+
+        full_history = self.history.get_history(limit=None)
+        for limit in (1, 2, 7, 29, 30, 50):
+            assert self.history.get_history(limit=limit) == full_history[-limit:]
+
+    def test_tail_read_only_touches_end_of_file(self):
+        """Test that limited reads never decode records outside the requested tail"""
+        for i in range(5):
+            self.history.add_roll(self.create_test_result(f"{i+1}d6"))
+
+        decoded = []
+        original_decode = self.history.backend._decode_line
+
+        def counting_decode(line):
+            entry = original_decode(line)
+            if entry is not None:
+                decoded.append(entry['command'])
+            return entry
+
+        self.history.backend._decode_line = counting_decode
+        history = self.history.get_history(limit=2)
+
+        assert [entry['command'] for entry in history] == ['4d6', '5d6']
+        assert decoded == ['5d6', '4d6']
+
+    def test_tail_read_of_legacy_file(self):
+        """Test that limited reads still work on a legacy JSON array file"""
+        legacy = [
+            {'timestamp': '2024-10-02T14:30:15', 'command': f'{i+1}d6', 'count': i + 1, 'sides': 6,
+             'modifier': 0, 'individual_rolls': [1] * (i + 1), 'total': i + 1}
+            for i in range(4)
+        ]
+        with open(self.temp_file.name, 'w') as f:
+            json.dump(legacy, f, indent=2)
+
+        assert self.history.get_history(limit=2) == legacy[-2:]
+
+    def test_in_memory_view(self):
+        """Test that limited reads come from memory once a view is kept"""
+        for i in range(5):
+            self.history.add_roll(self.create_test_result(f"{i+1}d6"))
+        self.history.keep_in_memory(3)
+
+        def no_disk_reads(limit):
+            raise AssertionError('history was read from disk')
+
+        disk_tail = self.history.backend.tail
+        self.history.backend.tail = no_disk_reads
+        self.history.add_roll(self.create_test_result("6d6"))
+
+        assert [entry['command'] for entry in self.history.get_history(limit=2)] == ['5d6', '6d6']
+        assert [entry['command'] for entry in self.history.get_history(limit=3)] == ['4d6', '5d6', '6d6']
+
+        # Larger requests than the view still go to storage
+        self.history.backend.tail = disk_tail
+        assert len(self.history.get_history(limit=10)) == 6
+
+        self.history.clear_history()
+        self.history.backend.tail = no_disk_reads
+        assert self.history.get_history() == []
+
+    def test_add_rolls_writes_one_batch(self):
+        """Test that several results are appended in a single backend write"""
+        appends = []
+        append = self.history.backend.append
+        self.history.backend.append = lambda entries: appends.append(len(entries)) or append(entries)
+
+        self.history.add_rolls([self.create_test_result(f"{i+1}d6") for i in range(4)])
+        self.history.add_rolls([])
+
+        assert appends == [4]
+        assert [entry['command'] for entry in self.history.get_history()] == ['1d6', '2d6', '3d6', '4d6']
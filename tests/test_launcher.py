@@ -0,0 +1,116 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/tests/test_launcher.py
+import os
+import subprocess
+import sys
+import tempfile
+import pytest
+from pathlib import Path
+from dice_roller.history import RollHistory
+from dice_roller.launcher import main
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# Modules the bare-notation fast path must never import
+HEAVY_MODULES = ('click', 'sqlite3', 'decimal', 'fractions', 'concurrent.futures', 'numpy')
+
+# Import time budget for the fast path; override with DICE_ROLLER_STARTUP_BUDGET_MS on slow machines
+STARTUP_BUDGET_MS = float(os.getenv('DICE_ROLLER_STARTUP_BUDGET_MS', '150'))
+
+
+def run_importtime(args, env):
+    """Run the CLI under -X importtime
+
+    Returns its stdout, the set of imported modules and the cumulative
+    import time in microseconds of every top-level import.
+    """
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-m', 'dice_roller'] + args,
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    modules = set()
+    top_level = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name_field = line[len('import time:'):].split('|')
+        name = name_field.strip()
+        modules.add(name)
+        # Nested imports are indented by two extra spaces per level
+        if name_field.startswith(' ' + name):
+            top_level[name] = top_level.get(name, 0) + int(cumulative_us)
+    return completed.stdout, modules, top_level
+
+
+class TestLauncher:
+    """Test cases for the fast start entry point"""
+
+    def setup_method(self):
+        """Set up a temporary history file"""
+        self.temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.json')
+        self.temp_file.close()
+        self.env = dict(os.environ, DICE_ROLLER_HISTORY=self.temp_file.name)
+
+    def teardown_method(self):
+        """Clean up temporary file"""
+        Path(self.temp_file.name).unlink(missing_ok=True)
+        for suffix in (".lock", ".stats.json", ".stats.journal", ".stats.lock"):
+            Path(self.temp_file.name + suffix).unlink(missing_ok=True)
+
+    def test_fast_path_output_matches_cli(self, capsys, monkeypatch):
+        """Test that a bare notation is rolled, printed and recorded"""
+        monkeypatch.setenv('DICE_ROLLER_HISTORY', self.temp_file.name)
+        main(['4d8+3'])
+
+        output = capsys.readouterr().out
+        assert output.startswith('🎲 4d8+3 →')
+        assert 'Rolls: [' in output
+        assert RollHistory(self.temp_file.name).get_history()[-1]['command'] == '4d8+3'
+
+    def test_other_arguments_use_click(self, capsys, monkeypatch):
+        """Test that subcommands and invalid notation go through the full CLI"""
+        monkeypatch.setenv('DICE_ROLLER_HISTORY', self.temp_file.name)
+        with pytest.raises(SystemExit) as exit_info:
+            main(['history'])
+        assert exit_info.value.code == 0
+        assert '📜 No roll history found' in capsys.readouterr().out
+
+        with pytest.raises(SystemExit):
+            main(['invalid'])
+        assert '❌ Invalid dice notation: invalid' in capsys.readouterr().out
+
+    def test_fast_path_reports_bad_engine(self, capsys, monkeypatch):
+        """Test that a bad DICE_ROLLER_ENGINE gives a one-line error, not a traceback"""
+        monkeypatch.setenv('DICE_ROLLER_HISTORY', self.temp_file.name)
+        monkeypatch.setenv('DICE_ROLLER_ENGINE', 'fast')
+        with pytest.raises(SystemExit) as exit_info:
+            main(['3d6'])
+        assert str(exit_info.value.code).startswith('Error: Unknown engine: fast')
+        assert RollHistory(self.temp_file.name).get_history() == []
+
+    def test_fast_path_reports_bad_backend(self, capsys, monkeypatch):
+        """Test that a bad DICE_ROLLER_BACKEND gives a one-line error, not a traceback"""
+        monkeypatch.setenv('DICE_ROLLER_HISTORY', self.temp_file.name)
+        monkeypatch.setenv('DICE_ROLLER_BACKEND', 'foo')
+        with pytest.raises(SystemExit) as exit_info:
+            main(['3d6'])
+        assert str(exit_info.value.code).startswith('Error: Unknown history backend: foo')
+        assert capsys.readouterr().out == ''
+
+    def test_fast_path_skips_heavy_imports(self):
+        """Test that rolling a bare notation never imports click or other heavy modules"""
+        stdout, modules, _ = run_importtime(['1d20'], self.env)
+
+        assert stdout.startswith('🎲 1d20 →')
+        for module in HEAVY_MODULES:
+            assert module not in modules, f"{module} was imported on the fast path"
+
+    def test_full_cli_still_imports_click(self):
+        """Test that the importtime check would notice click being imported"""
+        _, modules, _ = run_importtime(['history'], self.env)
+        assert 'click' in modules
+
+    def test_fast_path_startup_budget(self):
+        """Test that the package's own imports on the fast path stay within budget"""
+        _, _, top_level = run_importtime(['1d20'], self.env)
+        package_us = sum(us for name, us in top_level.items() if name.split('.')[0] == 'dice_roller')
+        assert package_us / 1000 < STARTUP_BUDGET_MS
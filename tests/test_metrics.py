@@ -0,0 +1,122 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/tests/test_metrics.py
+import json
+import tempfile
+import pytest
+from pathlib import Path
+from dice_roller.history import RollHistory
+from dice_roller.metrics import Metrics, metrics
+from dice_roller.parser import DiceParser, DiceRoll
+from dice_roller.roller import DiceRoller
+
+
+class TestMetrics:
+    """Test cases for timing spans and counters"""
+
+    def setup_method(self):
+        """Start every test with fresh, enabled process metrics"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        DiceParser.clear_cache()
+        metrics.reset()
+        metrics.enable()
+
+    def teardown_method(self):
+        """Switch process metrics off again"""
+        metrics.disable()
+        metrics.reset()
+        self.temp_dir.cleanup()
+
+    def test_disabled_records_nothing(self):
+        """Test that spans and counters are free no-ops until enabled"""
+        fresh = Metrics()
+        with fresh.span('parse'):
+            pass
+        assert fresh.span('roll') is fresh.span('render')
+        assert fresh.snapshot()['spans'] == {}
+
+        metrics.disable()
+        DiceRoller().roll(DiceRoll(count=5, sides=6), "5d6")
+        assert metrics.snapshot()['counters']['dice'] == 0
+
+    def test_spans_add_up_calls_and_time(self):
+        """Test that each run of a stage is counted and timed"""
+        fresh = Metrics()
+        fresh.enable()
+        for _ in range(3):
+            with fresh.span('roll'):
+                pass
+        fresh.add_time('render', 0.5)
+
+        spans = fresh.snapshot()['spans']
+        assert spans['roll']['calls'] == 3
+        assert spans['roll']['seconds'] >= 0
+        assert spans['render'] == {'calls': 1, 'seconds': 0.5}
+
+    def test_roll_counters(self):
+        """Test counting rolls and dice for rolls and expressions"""
+        roller = DiceRoller()
+        roller.roll(DiceRoll(count=3, sides=6), "3d6")
+        roller.roll(DiceRoll(count=100, sides=20), "100d20")
+        roller.evaluate(DiceParser.compile("2d6+1d4"))
+
+        counters = metrics.snapshot()['counters']
+        assert counters['rolls'] == 3
+        assert counters['dice'] == 106
+
+    def test_parse_cache_counters(self):
+        """Test that parse cache hits and misses are reported"""
+        DiceParser.parse('1d20')
+        DiceParser.parse('1d20')
+        counters = metrics.snapshot()['counters']
+        assert counters['parse_cache_hits'] == 1
+        assert counters['parse_cache_misses'] == 1
+
+    @pytest.mark.parametrize('suffix', ['.json', '.db', '.bin'])
+    def test_history_bytes_and_spans(self, suffix):
+        """Test that history writes are timed and file backends count bytes"""
+        path = Path(self.temp_dir.name) / f'history{suffix}'
+        history = RollHistory(str(path))
+        history.add_roll(DiceRoller().roll(DiceRoll(count=2, sides=6), "2d6"))
+        history.get_history()
+
+        snapshot = metrics.snapshot()
+        assert snapshot['spans']['history.write']['calls'] == 1
+        assert snapshot['spans']['history.read']['calls'] == 1
+        if suffix != '.db':
+            assert snapshot['counters']['history_bytes_written'] == path.stat().st_size + (
+                path.with_name(path.name + '.idx').stat().st_size if suffix == '.bin' else 0)
+
+    def test_prometheus_text(self):
+        """Test the Prometheus exposition format"""
+        metrics.count('rolls', 2)
+        metrics.add_time('parse', 0.25)
+        text = metrics.to_prometheus()
+
+        assert '# TYPE dice_roller_rolls_total counter\n' in text
+        assert 'dice_roller_rolls_total 2\n' in text
+        assert 'dice_roller_parse_cache_hits_total 0\n' in text
+        assert 'dice_roller_stage_seconds_total{stage="parse"} 0.25\n' in text
+        assert 'dice_roller_stage_calls_total{stage="parse"} 1\n' in text
+
+    def test_write_picks_format_by_suffix(self):
+        """Test writing JSON or Prometheus metrics files"""
+        metrics.count('dice', 7)
+        json_path = Path(self.temp_dir.name) / 'metrics.json'
+        prom_path = Path(self.temp_dir.name) / 'metrics.prom'
+        metrics.write(json_path)
+        metrics.write(prom_path)
+
+        assert json.loads(json_path.read_text())['counters']['dice'] == 7
+        assert 'dice_roller_dice_total 7' in prom_path.read_text()
+        assert sorted(p.name for p in Path(self.temp_dir.name).iterdir()) == ['metrics.json', 'metrics.prom']
+
+    def test_profile_lines(self):
+        """Test the --profile breakdown, slowest stage first"""
+        metrics.add_time('parse', 0.001)
+        metrics.add_time('roll', 0.002)
+        metrics.add_time('roll', 0.002)
+        lines = metrics.profile_lines()
+
+        assert lines[0] == '⏱️  Profile'
+        assert lines[1].split() == ['roll', '4.000', 'ms', '(2', 'calls)']
+        assert lines[2].split() == ['parse', '1.000', 'ms', '(1', 'call)']
+        assert 'rolls 0' in lines[-1]
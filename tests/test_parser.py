@@ -1,4 +1,5 @@
 # /Users/marcozingoni/Playgound/Python/diceRoller/tests/test_parser.py
+import dataclasses
 import pytest
 from dice_roller.parser import DiceParser, DiceRoll
 
@@ -76,7 +77,9 @@ class TestDiceParser:
             "1d-20",
             "1.5d20",
             "1d20.5",
-            "1d20+3.5"
+            "1d20+3.5",
+            "9" * 5000 + "d6",
+            "1d6+" + "9" * 5000
         ]
 
         for invalid_input in invalid_inputs:
@@ -95,3 +98,89 @@ class TestDiceParser:
         result = DiceParser.parse("1d20+0")
         assert result is not None
         assert result.modifier == 0
+
+
+class TestDiceParserCache:
+    """Test cases for the parse cache"""
+
+    def setup_method(self):
+        """Start every test with an empty cache of the default size"""
+        self.original_size = DiceParser.CACHE_SIZE
+        DiceParser.clear_cache()
+
+    def teardown_method(self):
+        """Restore the default cache size"""
+        DiceParser.set_cache_size(self.original_size)
+        DiceParser.clear_cache()
+
+    def test_dice_roll_is_immutable_and_hashable(self):
+        """Test that parsed rolls can be shared safely"""
+        result = DiceParser.parse("2d6+3")
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            result.count = 5
+        assert hash(result) == hash(DiceRoll(count=2, sides=6, modifier=3))
+        assert {result: 'fireball'}[DiceRoll(2, 6, 3)] == 'fireball'
+
+    def test_repeated_parse_returns_cached_instance(self):
+        """Test that repeated notations are served from the cache"""
+        first = DiceParser.parse("1d20")
+        second = DiceParser.parse("1d20")
+
+        assert second is first
+        info = DiceParser.cache_info()
+        assert info.hits == 1
+        assert info.misses == 1
+
+    def test_raw_and_normalized_keys(self):
+        """Test that spacing variants share one parse"""
+        first = DiceParser.parse("3d6+2")
+        second = DiceParser.parse(" 3d6 + 2 ")
+        third = DiceParser.parse(" 3d6 + 2 ")
+
+        assert second is first and third is first
+        info = DiceParser.cache_info()
+        assert info.misses == 1
+        assert info.hits == 2
+        assert info.currsize == 2
+
+    def test_invalid_notation_is_cached(self):
+        """Test that parse failures are cached too"""
+        assert DiceParser.parse("abc") is None
+        assert DiceParser.parse("abc") is None
+        assert DiceParser.cache_info().hits == 1
+
+    def test_lru_eviction(self):
+        """Test that the least recently used notation is evicted first"""
+        DiceParser.set_cache_size(2)
+        first = DiceParser.parse("1d4")
+        DiceParser.parse("1d6")
+        DiceParser.parse("1d4")  # 1d4 is now the most recently used
+        DiceParser.parse("1d8")  # evicts 1d6
+
+        info = DiceParser.cache_info()
+        assert info.currsize == 2
+        assert info.maxsize == 2
+
+        assert DiceParser.parse("1d4") is first
+        misses = DiceParser.cache_info().misses
+        DiceParser.parse("1d6")
+        assert DiceParser.cache_info().misses == misses + 1
+
+    def test_shrinking_cache_evicts(self):
+        """Test that lowering the size trims the cache immediately"""
+        for sides in range(1, 11):
+            DiceParser.parse(f"1d{sides}")
+        DiceParser.set_cache_size(3)
+        assert DiceParser.cache_info().currsize == 3
+
+    def test_disabled_cache(self):
+        """Test that a cache size of zero disables caching"""
+        DiceParser.set_cache_size(0)
+        first = DiceParser.parse("1d20")
+        second = DiceParser.parse("1d20")
+
+        assert first == second
+        assert first is not second
+        assert DiceParser.cache_info().currsize == 0
+        with pytest.raises(ValueError):
+            DiceParser.set_cache_size(-1)
@@ -0,0 +1,103 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/tests/test_probability.py
+import itertools
+import pytest
+from collections import Counter
+from fractions import Fraction
+from dice_roller.parser import DiceParser, DiceRoll
+from dice_roller.probability import DiceDistribution, dice_counts, distribution
+
+
+def brute_force_counts(count, sides):
+    """Count totals by enumerating every outcome"""
+    totals = Counter(sum(faces) for faces in itertools.product(range(1, sides + 1), repeat=count))
+    return tuple(totals[total] for total in range(count, count * sides + 1))
+
+
+class TestDiceDistribution:
+    """Test cases for exact dice distributions"""
+
+    @pytest.mark.parametrize('count,sides', [(1, 20), (2, 6), (3, 6), (4, 4), (3, 10), (5, 2), (3, 1)])
+    def test_counts_match_enumeration(self, count, sides):
+        """Test convolution results against brute-force enumeration"""
+        assert dice_counts(count, sides) == brute_force_counts(count, sides)
+
+    def test_pmf_of_3d6(self):
+        """Test the well-known 3d6 distribution"""
+        dist = distribution(DiceRoll(count=3, sides=6))
+        pmf = dist.pmf()
+
+        assert min(pmf) == 3 and max(pmf) == 18
+        assert pmf[3] == Fraction(1, 216)
+        assert pmf[10] == Fraction(27, 216)
+        assert sum(pmf.values()) == 1
+
+    def test_modifier_shifts_distribution(self):
+        """Test that the modifier moves totals without changing shape"""
+        base = distribution(DiceRoll(count=2, sides=8))
+        shifted = distribution(DiceRoll(count=2, sides=8, modifier=3))
+
+        assert shifted.minimum == base.minimum + 3
+        assert shifted.maximum == base.maximum + 3
+        assert shifted.counts == base.counts
+        assert shifted.mean == base.mean + 3
+        assert shifted.variance == base.variance
+
+    def test_mean_and_variance(self):
+        """Test exact moments against closed forms"""
+        for count, sides in [(1, 20), (12, 6), (100, 100), (1000, 6)]:
+            dist = distribution(DiceRoll(count=count, sides=sides))
+            assert dist.mean == Fraction(count * (sides + 1), 2)
+            assert dist.variance == Fraction(count * (sides * sides - 1), 12)
+            assert sum(dist.counts) == dist.outcomes
+
+    def test_prob_at_least(self):
+        """Test P(total >= DC) at and beyond the edges"""
+        dist = distribution(DiceRoll(count=1, sides=20, modifier=5))
+
+        assert dist.prob_at_least(15) == Fraction(11, 20)
+        assert dist.prob_at_least(6) == 1
+        assert dist.prob_at_least(-10) == 1
+        assert dist.prob_at_least(26) == 0
+
+    def test_cdf_and_percentiles(self):
+        """Test cumulative probabilities and percentiles"""
+        dist = distribution(DiceRoll(count=2, sides=6))
+
+        assert dist.cdf(7) == Fraction(21, 36)
+        assert dist.cdf(1) == 0
+        assert dist.cdf(12) == 1
+        assert dist.percentile(0.5) == 7
+        assert dist.percentile(1) == 12
+        assert dist.percentile(0.01) == 2
+        with pytest.raises(ValueError):
+            dist.percentile(0)
+
+    def test_intermediate_results_are_memoized(self):
+        """Test that rolls sharing dice reuse the cached convolution"""
+        dice_counts.cache_clear()
+        distribution(DiceParser.parse("12d6"))
+        distribution(DiceParser.parse("12d6+4"))
+        distribution(DiceParser.parse("12d6-1"))
+
+        info = dice_counts.cache_info()
+        assert info.misses == 1
+        assert info.hits == 2
+
+    def test_too_large_for_exact(self):
+        """Test that impossible exact computations are refused"""
+        with pytest.raises(ValueError):
+            distribution(DiceRoll(count=1000000, sides=6))
+
+    @pytest.mark.parametrize('count', [1, 2])
+    def test_huge_dice_refused_before_allocating(self, count, monkeypatch):
+        """Test that one or two enormous dice are refused without building a face tuple"""
+        monkeypatch.setattr('dice_roller.probability.die_counts', lambda sides: pytest.fail())
+        with pytest.raises(ValueError, match='too large for an exact distribution'):
+            distribution(DiceRoll(count=count, sides=10 ** 9))
+
+    def test_from_roll(self):
+        """Test building a distribution from a parsed roll"""
+        dist = DiceDistribution.from_roll(DiceParser.parse("4d8+3"))
+        assert dist.minimum == 7
+        assert dist.maximum == 35
+        assert dist.outcomes == 8 ** 4
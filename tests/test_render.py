@@ -0,0 +1,116 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/tests/test_render.py
+import io
+import json
+import pytest
+from dice_roller.parser import DiceRoll
+from dice_roller.render import (CHUNK_DICE, roll_result_lines, rolls_text, summary_lines, write_roll_result)
+from dice_roller.roller import HistogramResult, RollResult
+
+
+def make_result(rolls, sides=6, modifier=0, command=None):
+    """Build a roll result with known dice"""
+    dice_roll = DiceRoll(count=len(rolls), sides=sides, modifier=modifier)
+    if command is None:
+        command = f"{len(rolls)}d{sides}{modifier:+d}" if modifier else f"{len(rolls)}d{sides}"
+    return RollResult(dice_roll=dice_roll, individual_rolls=list(rolls), total=sum(rolls) + modifier,
+                      command=command)
+
+
+class CountingStream(io.StringIO):
+    """StringIO that remembers the size of every write"""
+
+    def __init__(self):
+        super().__init__()
+        self.writes = []
+
+    def write(self, text):
+        self.writes.append(len(text))
+        return super().write(text)
+
+
+class TestRender:
+    """Test cases for printing roll results"""
+
+    def test_small_roll_lists_every_die(self):
+        """Test the default output of a few dice"""
+        lines = roll_result_lines(make_result([3, 5, 1], modifier=2))
+        assert lines == ["🎲 3d6+2 → 11", "   Rolls: [3 + 5 + 1] = 9 +2 = 11"]
+
+    def test_large_roll_is_elided(self):
+        """Test that only the first and last dice of a large roll are shown"""
+        rolls = [1] * 10 + [6] * 980 + [2] * 10
+        text = rolls_text(rolls)
+        assert text == " + ".join(["1"] * 10) + " + … (980 more) … + " + " + ".join(["2"] * 10)
+        assert rolls_text(rolls, max_rolls=None).count('+') == 999
+        assert rolls_text([4] * 100) == " + ".join(["4"] * 100)
+
+    def test_summary(self):
+        """Test the total, dice count, min/max and face counts"""
+        lines = summary_lines(make_result([1, 1, 2, 6, 6, 6]))
+        assert lines == ["🎲 6d6 → 22", "   Dice: 6 (min 1, max 6, mean 3.67)",
+                         "   Faces: 1×2  2×1  3×0  4×0  5×0  6×3"]
+        # Faces of big dice are left out
+        assert len(summary_lines(make_result([50, 99], sides=100))) == 2
+
+    def test_quiet(self):
+        """Test printing the total alone"""
+        stream = io.StringIO()
+        write_roll_result(make_result([2, 3], modifier=-1), stream, 'quiet')
+        assert stream.getvalue() == "4\n"
+
+    def test_json_streams_in_chunks(self):
+        """Test that JSON output is valid and written a chunk of dice at a time"""
+        rolls = [(i % 6) + 1 for i in range(CHUNK_DICE * 3 + 5)]
+        stream = CountingStream()
+        write_roll_result(make_result(rolls, modifier=4, command="30005d6+4"), stream, 'json')
+
+        reply = json.loads(stream.getvalue())
+        assert reply['command'] == "30005d6+4"
+        assert reply['individual_rolls'] == rolls
+        assert reply['total'] == sum(rolls) + 4
+        assert len(stream.writes) == 6
+        assert max(stream.writes) < CHUNK_DICE * 4
+
+    def test_all_rolls_streams_in_chunks(self):
+        """Test listing every die of a huge roll without one giant string"""
+        rolls = [3] * (CHUNK_DICE * 2 + 1)
+        stream = CountingStream()
+        write_roll_result(make_result(rolls, modifier=-2), stream, 'all')
+
+        lines = stream.getvalue().splitlines()
+        assert lines[0] == f"🎲 {len(rolls)}d6-2 → {sum(rolls) - 2}"
+        assert lines[1].count(' + ') == len(rolls) - 1
+        assert lines[1].endswith(f"] = {sum(rolls)} -2 = {sum(rolls) - 2}")
+        assert len(stream.writes) == 6
+        assert max(stream.writes) <= CHUNK_DICE * len(' + 3')
+
+    def test_full_mode_matches_lines(self):
+        """Test that the default mode writes roll_result_lines"""
+        result = make_result([1] * 500)
+        stream = io.StringIO()
+        write_roll_result(result, stream)
+        assert stream.getvalue() == '\n'.join(roll_result_lines(result)) + '\n'
+
+    def test_histogram_result(self):
+        """Test that rolls kept as face counts print their summary, or face counts as JSON"""
+        result = HistogramResult(DiceRoll(count=6, sides=6, modifier=1), [2, 1, 0, 0, 0, 3], 23, "6d6+1")
+        summary = ["🎲 6d6+1 → 23", "   Dice: 6 (min 1, max 6, mean 3.67)",
+                   "   Faces: 1×2  2×1  3×0  4×0  5×0  6×3"]
+        assert summary_lines(result) == summary
+        assert roll_result_lines(result) == summary
+        for mode in ('full', 'all', 'summary'):
+            stream = io.StringIO()
+            write_roll_result(result, stream, mode)
+            assert stream.getvalue() == '\n'.join(summary) + '\n'
+
+        stream = io.StringIO()
+        write_roll_result(result, stream, 'json')
+        reply = json.loads(stream.getvalue())
+        assert reply['face_counts'] == [2, 1, 0, 0, 0, 3]
+        assert reply['total'] == 23
+        assert 'individual_rolls' not in reply
+
+    def test_unknown_mode(self):
+        """Test that unknown output modes are rejected"""
+        with pytest.raises(ValueError):
+            write_roll_result(make_result([1]), io.StringIO(), 'loud')
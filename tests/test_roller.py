@@ -1,7 +1,8 @@
 # /Users/marcozingoni/Playgound/Python/diceRoller/tests/test_roller.py
+import time
 import pytest
 from dice_roller.parser import DiceRoll
-from dice_roller.roller import DiceRoller, RollResult
+from dice_roller.roller import DiceRoller, HistogramResult, RollResult
 
 
 class TestDiceRoller:
@@ -95,3 +96,71 @@ class TestDiceRoller:
         assert isinstance(result.total, int)
         assert isinstance(result.command, str)
         assert result.dice_roll is dice_roll
+
+
+class TestHistogramRolls:
+    """Test cases for rolls kept as face counts"""
+
+    def setup_method(self):
+        """Set up a seeded roller"""
+        self.roller = DiceRoller(seed=5)
+
+    def test_histogram_roll(self):
+        """Test that face counts, total and modifier fit together"""
+        dice_roll = DiceRoll(count=10 ** 6, sides=6, modifier=-3)
+        result = self.roller.roll(dice_roll, "1000000d6-3", histogram=True)
+
+        assert isinstance(result, HistogramResult)
+        assert result.dice_roll == dice_roll
+        assert result.command == "1000000d6-3"
+        assert len(result.face_counts) == 6
+        assert sum(result.face_counts) == 10 ** 6
+        assert result.total == sum(face * hits for face, hits in enumerate(result.face_counts, 1)) - 3
+
+    def test_individual_rolls_grouped_by_face(self):
+        """Test expanding face counts back into dice"""
+        result = HistogramResult(DiceRoll(count=4, sides=3), [2, 0, 2], 8, "4d3")
+        assert result.individual_rolls == [1, 1, 3, 3]
+
+    def test_automatic_histogram_for_huge_rolls(self):
+        """Test that histogram=None only aggregates rolls of many dice with few sides"""
+        threshold = DiceRoller.HISTOGRAM_THRESHOLD
+        assert isinstance(self.roller.roll(DiceRoll(threshold, 6), "big", histogram=None), HistogramResult)
+        assert isinstance(self.roller.roll(DiceRoll(threshold - 1, 6), "small", histogram=None), RollResult)
+        assert isinstance(self.roller.roll(DiceRoll(threshold, threshold + 1), "wide", histogram=None),
+                          RollResult)
+        # The default still lists every die
+        assert isinstance(self.roller.roll(DiceRoll(threshold, 6), "big"), RollResult)
+
+    def test_huge_roll_is_fast(self):
+        """Test that the cost does not grow with the number of dice"""
+        start = time.perf_counter()
+        self.roller.roll_histogram(DiceRoll(count=10 ** 12, sides=6), "1000000000000d6")
+        assert time.perf_counter() - start < 0.1
+
+
+class TestTotalsOnly:
+    """Test cases for rolling totals without individual dice"""
+
+    def test_totals_only_roll(self):
+        """Test that totals come back in range with no dice listed"""
+        roller = DiceRoller(seed=3, totals_only=True)
+        dice_roll = DiceRoll(count=4, sides=6, modifier=2)
+        totals = [roller.roll(dice_roll, "4d6+2") for _ in range(2000)]
+
+        assert all(isinstance(result, RollResult) and result.individual_rolls == [] for result in totals)
+        assert all(6 <= result.total <= 26 for result in totals)
+        assert sum(result.total for result in totals) / len(totals) == pytest.approx(16, abs=0.3)
+
+    def test_seeded_totals_are_reproducible(self):
+        """Test that the same seed gives the same totals"""
+        dice_roll = DiceRoll(count=20, sides=20)
+        first = DiceRoller(seed=8, totals_only=True)
+        second = DiceRoller(seed=8, totals_only=True)
+        assert [first.roll_total(dice_roll) for _ in range(50)] == [second.roll_total(dice_roll) for _ in range(50)]
+
+    def test_rolls_too_large_for_a_table(self):
+        """Test the fallbacks for rolls whose exact distribution is too large"""
+        roller = DiceRoller(seed=3, totals_only=True)
+        assert 10 ** 6 <= roller.roll_total(DiceRoll(count=10 ** 6, sides=6)) <= 6 * 10 ** 6
+        assert 2 <= roller.roll_total(DiceRoll(count=2, sides=10 ** 9, modifier=0)) <= 2 * 10 ** 9
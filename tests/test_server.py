@@ -0,0 +1,190 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/tests/test_server.py
+import asyncio
+import json
+import socket
+import tempfile
+import pytest
+from pathlib import Path
+from dice_roller.history import RollHistory
+from dice_roller.metrics import metrics
+from dice_roller.roller import DiceRoller
+from dice_roller.server import RollClient, RollServer, roll_remote
+
+
+async def send_lines(port, lines):
+    """Send request lines over one loopback connection and read one reply per line"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(''.join(line + '\n' for line in lines).encode('utf-8'))
+    await writer.drain()
+    replies = [json.loads(await reader.readline()) for _ in lines]
+    writer.close()
+    return replies
+
+
+class TestRollServer:
+    """Test cases for the local roll server"""
+
+    def setup_method(self):
+        """Set up a temporary history file"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.history = RollHistory(str(Path(self.temp_dir.name) / 'history.json'))
+
+    def teardown_method(self):
+        """Remove the temporary history"""
+        self.temp_dir.cleanup()
+
+    def run_with_server(self, scenario, **options):
+        """Start a server on a free loopback port, run scenario(server, port) and close it"""
+        async def main():
+            server = RollServer(history=self.history, **options)
+            await server.start(port=0)
+            try:
+                return await scenario(server, server.address[1])
+            finally:
+                await server.close()
+
+        return asyncio.run(main())
+
+    def test_json_and_bare_requests(self):
+        """Test both request forms and the reply format"""
+        async def scenario(server, port):
+            return await send_lines(port, ['{"id": 7, "notation": "2d6+3"}', '1d20'])
+
+        json_reply, bare_reply = self.run_with_server(scenario)
+
+        assert json_reply['id'] == 7
+        assert json_reply['command'] == '2d6+3'
+        assert len(json_reply['individual_rolls']) == 2
+        assert json_reply['total'] == sum(json_reply['individual_rolls']) + 3
+        assert bare_reply['id'] is None
+        assert 1 <= bare_reply['total'] <= 20
+
+    def test_totals_only(self):
+        """Test a server whose roller draws totals without individual dice"""
+        async def scenario(server, port):
+            return await send_lines(port, ['3d6+1', '3d6+1'])
+
+        replies = self.run_with_server(scenario, roller=DiceRoller(totals_only=True))
+        assert all(reply['individual_rolls'] == [] and 4 <= reply['total'] <= 19 for reply in replies)
+
+    def test_huge_rolls_reply_with_face_counts(self):
+        """Test that a ten-million-die request is answered with face counts, not every die"""
+        async def scenario(server, port):
+            return await send_lines(port, ['{"id": 1, "notation": "10000000d6"}'])
+
+        reply, = self.run_with_server(scenario)
+        assert reply['individual_rolls'] == []
+        assert sum(reply['face_counts']) == 10000000
+        assert reply['total'] == sum(face * hits for face, hits in enumerate(reply['face_counts'], 1))
+
+    def test_invalid_requests(self):
+        """Test error replies for bad notation and malformed JSON"""
+        async def scenario(server, port):
+            return await send_lines(port, ['bogus', '{"id": 2, "notation": "0d6"}', '{"id": 3}', '{not json'])
+
+        replies = self.run_with_server(scenario)
+
+        assert replies[0]['error'] == 'Invalid dice notation: bogus'
+        assert replies[1]['id'] == 2 and 'error' in replies[1]
+        assert all('error' in reply for reply in replies[2:])
+        assert self.history.get_history() == []
+
+    def test_many_concurrent_clients(self):
+        """Test thousands of rolls from concurrent connections, all persisted"""
+        async def scenario(server, port):
+            batches = await asyncio.gather(*[
+                send_lines(port, [json.dumps({'id': i * 100 + j, 'notation': '1d20'}) for j in range(100)])
+                for i in range(30)
+            ])
+            return [reply for batch in batches for reply in batch]
+
+        replies = self.run_with_server(scenario)
+
+        assert len(replies) == 3000
+        assert len({reply['id'] for reply in replies}) == 3000
+        assert len(self.history.get_history(limit=None)) == 3000
+
+    def test_history_writes_are_batched(self):
+        """Test that many rolls are persisted in a few bulk writes"""
+        writes = []
+        add_entries = self.history.add_entries
+        self.history.add_entries = lambda entries: writes.append(len(entries)) or add_entries(entries)
+
+        async def scenario(server, port):
+            await send_lines(port, ['1d6'] * 250)
+
+        self.run_with_server(scenario, flush_interval=60, max_batch=100)
+
+        assert sum(writes) == 250
+        assert len(writes) <= 3
+
+    def test_periodic_flush(self):
+        """Test that queued rolls are written without waiting for shutdown"""
+        async def scenario(server, port):
+            await send_lines(port, ['1d6', '1d8'])
+            await asyncio.sleep(0.2)
+            return len(self.history.get_history())
+
+        assert self.run_with_server(scenario, flush_interval=0.05) == 2
+
+    def test_metrics_file(self):
+        """Test that the server rewrites its metrics file as it flushes"""
+        metrics_path = Path(self.temp_dir.name) / 'metrics.json'
+        metrics.reset()
+        metrics.enable()
+        try:
+            async def scenario(server, port):
+                await send_lines(port, ['2d6', '1d20', 'nope'])
+                await asyncio.sleep(0.2)
+                return json.loads(metrics_path.read_text())
+
+            during = self.run_with_server(scenario, flush_interval=0.05, metrics_path=str(metrics_path))
+        finally:
+            metrics.disable()
+            metrics.reset()
+
+        assert during['counters']['rolls'] == 2
+        assert during['counters']['dice'] == 3
+        assert during['spans']['parse']['calls'] == 3
+        assert during['spans']['history.write']['calls'] == 1
+
+    def test_blocking_client(self):
+        """Test the blocking client helper against a running server"""
+        async def scenario(server, port):
+            loop = asyncio.get_running_loop()
+
+            def use_client():
+                with RollClient(port=port) as client:
+                    replies = client.roll_many(['1d4', '2d8', 'nope'])
+                return replies, roll_remote('3d6', port=port)
+
+            return await loop.run_in_executor(None, use_client)
+
+        replies, single = self.run_with_server(scenario)
+
+        assert [reply['id'] for reply in replies] == [1, 2, 3]
+        assert replies[1]['command'] == '2d8'
+        assert 'error' in replies[2]
+        assert single['command'] == '3d6'
+
+    @pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='Unix sockets are not available')
+    def test_unix_socket(self):
+        """Test serving on a Unix socket"""
+        path = str(Path(self.temp_dir.name) / 'roll.sock')
+
+        async def main():
+            server = RollServer(history=self.history)
+            await server.start(path=path)
+            try:
+                reader, writer = await asyncio.open_unix_connection(path)
+                writer.write(b'1d20\n')
+                reply = json.loads(await reader.readline())
+                writer.close()
+                return server.address, reply
+            finally:
+                await server.close()
+
+        address, reply = asyncio.run(main())
+        assert address == path
+        assert reply['command'] == '1d20'
+        assert len(self.history.get_history()) == 1
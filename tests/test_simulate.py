@@ -0,0 +1,69 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/tests/test_simulate.py
+import pytest
+from dice_roller.parser import DiceRoll
+from dice_roller.probability import distribution
+from dice_roller.simulate import plan_shards, shard_seed, simulate, simulate_shard
+
+
+class TestSimulate:
+    """Test cases for Monte Carlo simulation"""
+
+    def test_plan_shards(self):
+        """Test splitting trials into shards"""
+        assert plan_shards(250, 100) == [100, 100, 50]
+        assert plan_shards(200, 100) == [100, 100]
+        assert plan_shards(5, 100) == [5]
+
+    def test_shard_seeds_are_distinct(self):
+        """Test that every shard gets its own random stream"""
+        seeds = {shard_seed(42, shard) for shard in range(1000)}
+        assert len(seeds) == 1000
+        assert shard_seed(42, 0) != shard_seed(43, 0)
+
+    def test_histogram_counts_every_trial(self):
+        """Test that merged histograms add up to the number of trials"""
+        result = simulate(DiceRoll(count=2, sides=6, modifier=1), 250001, workers=1, seed=3)
+
+        assert result.trials == 250001
+        assert sum(result.histogram.values()) == 250001
+        assert min(result.histogram) >= 3
+        assert max(result.histogram) <= 13
+
+    def test_same_seed_is_reproducible(self):
+        """Test that a master seed reproduces the same histogram"""
+        dice_roll = DiceRoll(count=3, sides=6)
+        first = simulate(dice_roll, 120000, workers=1, seed=11)
+        second = simulate(dice_roll, 120000, workers=1, seed=11)
+        third = simulate(dice_roll, 120000, workers=1, seed=12)
+
+        assert first.histogram == second.histogram
+        assert first.histogram != third.histogram
+
+    def test_worker_pool_matches_single_process(self):
+        """Test that results do not depend on the number of workers"""
+        dice_roll = DiceRoll(count=2, sides=20)
+        inline = simulate(dice_roll, 230000, workers=1, seed=5)
+        pooled = simulate(dice_roll, 230000, workers=2, seed=5)
+
+        assert pooled.histogram == inline.histogram
+
+    def test_matches_exact_distribution(self):
+        """Test simulated frequencies against the exact distribution"""
+        dice_roll = DiceRoll(count=3, sides=6)
+        result = simulate(dice_roll, 300000, workers=1, seed=8)
+        exact = distribution(dice_roll)
+
+        assert abs(result.mean - float(exact.mean)) < 0.03
+        assert abs(result.stdev - exact.stdev) < 0.03
+        assert abs(result.prob_at_least(15) - float(exact.prob_at_least(15))) < 0.005
+
+    def test_shard_blocks_do_not_split_trials(self):
+        """Test shards larger than one block of dice"""
+        histogram = simulate_shard((1000, 6, 0, 200, 1))
+        assert sum(histogram.values()) == 200
+        assert all(1000 <= total <= 6000 for total in histogram)
+
+    def test_invalid_trials(self):
+        """Test that a simulation needs at least one trial"""
+        with pytest.raises(ValueError):
+            simulate(DiceRoll(count=1, sides=20), 0)
@@ -0,0 +1,601 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/tests/test_storage.py
+import gzip
+import json
+import multiprocessing
+import pytest
+import sqlite3
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from dice_roller.history import RollHistory
+from dice_roller.parser import DiceRoll
+from dice_roller.roller import DiceRoller, RollResult
+from dice_roller.storage import (
+    convert_history, create_backend, BinaryBackend, JsonLinesBackend, SegmentedBackend, SQLiteBackend
+)
+
+
+def make_entry(command="1d20", timestamp="2024-10-02T14:30:15", rolls=None, modifier=0):
+    """Helper to build a history entry"""
+    rolls = rolls or [15]
+    return {
+        'timestamp': timestamp,
+        'command': command,
+        'count': len(rolls),
+        'sides': 20,
+        'modifier': modifier,
+        'individual_rolls': rolls,
+        'total': sum(rolls) + modifier
+    }
+
+
+def write_rolls(task):
+    """Worker process: add rolls one at a time, each through a fresh RollHistory"""
+    history_file, worker, rolls = task
+    for index in range(rolls):
+        result = RollResult(DiceRoll(1, 20), [index % 20 + 1], index % 20 + 1, f"w{worker}-{index}")
+        RollHistory(history_file).add_roll(result)
+    return rolls
+
+
+class TestBackendSelection:
+    """Test cases for choosing a storage backend"""
+
+    def test_default_backend_is_json_lines(self):
+        """Test that plain history files use JSON Lines"""
+        assert isinstance(create_backend(Path('history.json')), JsonLinesBackend)
+
+    def test_sqlite_selected_by_suffix(self):
+        """Test that database suffixes select SQLite"""
+        for name in ('history.db', 'history.sqlite', 'history.SQLITE3'):
+            assert isinstance(create_backend(Path(name)), SQLiteBackend)
+
+    def test_backend_selected_by_name(self):
+        """Test that an explicit backend name wins over the suffix"""
+        assert isinstance(create_backend(Path('history.json'), 'sqlite'), SQLiteBackend)
+        assert isinstance(create_backend(Path('history.db'), 'jsonl'), JsonLinesBackend)
+
+    def test_backend_selected_by_environment(self, monkeypatch):
+        """Test selecting the backend with DICE_ROLLER_BACKEND"""
+        monkeypatch.setenv('DICE_ROLLER_BACKEND', 'sqlite')
+        history = RollHistory('history.json')
+        assert isinstance(history.backend, SQLiteBackend)
+
+    def test_unknown_backend(self):
+        """Test that an unknown backend name is rejected"""
+        with pytest.raises(ValueError):
+            create_backend(Path('history.json'), 'parquet')
+
+
+class TestSQLiteBackend:
+    """Test cases for the SQLite history backend"""
+
+    def setup_method(self):
+        """Set up a temporary database"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / 'history.db'
+        self.backend = SQLiteBackend(self.path)
+
+    def teardown_method(self):
+        """Remove the temporary database"""
+        self.temp_dir.cleanup()
+
+    def test_empty_database(self):
+        """Test reads before anything has been written"""
+        assert self.backend.load_all() == []
+        assert self.backend.tail(5) == []
+        assert not self.path.exists()
+
+    def test_append_and_read(self):
+        """Test that entries round-trip in chronological order"""
+        entries = [make_entry(f"{i+1}d6", rolls=[i + 1, 2]) for i in range(5)]
+        self.backend.append(entries[:2])
+        self.backend.append(entries[2:])
+
+        assert self.backend.load_all() == entries
+        assert self.backend.tail(2) == entries[-2:]
+        assert self.backend.tail(10) == entries
+
+    def test_replace(self):
+        """Test replacing and clearing stored entries"""
+        self.backend.append([make_entry("1d20"), make_entry("3d6")])
+        self.backend.replace([make_entry("2d8+3", modifier=3)])
+        assert [entry['command'] for entry in self.backend.load_all()] == ['2d8+3']
+
+        self.backend.replace([])
+        assert self.backend.load_all() == []
+
+    def test_values_beyond_64_bits_are_write_errors(self):
+        """Test that rolls SQLite INTEGER columns cannot hold raise OSError and write nothing"""
+        self.backend.append([make_entry("1d20")])
+        huge = make_entry("1d20+" + "9" * 23, modifier=int("9" * 23))
+        with pytest.raises(OSError):
+            self.backend.append([make_entry("2d20", rolls=[1, 2]), huge])
+        with pytest.raises(OSError):
+            self.backend.replace([huge])
+
+        assert [entry['command'] for entry in self.backend.load_all()] == ['1d20']
+
+    def test_wal_mode_and_indexes(self):
+        """Test that the database uses WAL mode and indexes timestamp and command"""
+        self.backend.append([make_entry()])
+
+        with sqlite3.connect(str(self.path)) as conn:
+            assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+            indexed = {row[2] for row in conn.execute(
+                "SELECT name, tbl_name, sql FROM sqlite_master WHERE type = 'index'") if row[2]}
+            plan = ' '.join(str(row) for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM rolls WHERE command = '1d20'"))
+
+        assert any('(timestamp)' in sql for sql in indexed)
+        assert any('(command)' in sql for sql in indexed)
+        assert 'idx_rolls_command' in plan
+
+    def test_query_by_command_and_time(self):
+        """Test indexed lookups by command and timestamp range"""
+        self.backend.append([
+            make_entry("1d20", "2024-10-01T10:00:00"),
+            make_entry("3d6", "2024-10-02T10:00:00"),
+            make_entry("1d20", "2024-10-03T10:00:00"),
+            make_entry("1d20", "2024-10-04T10:00:00"),
+        ])
+
+        assert len(self.backend.query(command="1d20")) == 3
+        assert [entry['timestamp'] for entry in self.backend.query(command="1d20", limit=1)] == ["2024-10-04T10:00:00"]
+        window = self.backend.query(since="2024-10-02", until="2024-10-04")
+        assert [entry['command'] for entry in window] == ['3d6', '1d20']
+
+    def test_reader_during_open_write_transaction(self):
+        """Test that readers are not blocked while a writer holds the database"""
+        self.backend.append([make_entry("1d20")])
+
+        writer = sqlite3.connect(str(self.path))
+        try:
+            writer.execute('BEGIN IMMEDIATE')
+            writer.execute(
+                "INSERT INTO rolls (timestamp, command, count, sides, modifier, individual_rolls, total) "
+                "VALUES ('2024-10-02T14:30:15', '3d6', 3, 6, 0, '[1, 2, 3]', 6)"
+            )
+            reader = SQLiteBackend(self.path)
+            reader.BUSY_TIMEOUT = 0.1
+            assert [entry['command'] for entry in reader.load_all()] == ['1d20']
+            writer.commit()
+        finally:
+            writer.close()
+
+        assert [entry['command'] for entry in SQLiteBackend(self.path).load_all()] == ['1d20', '3d6']
+
+
+class TestRollHistoryQueries:
+    """Test RollHistory lookups on both backends"""
+
+    @pytest.mark.parametrize('suffix', ['.json', '.db'])
+    def test_find_rolls(self, suffix):
+        """Test finding rolls by command through RollHistory"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            history = RollHistory(str(Path(temp_dir) / f'history{suffix}'))
+            history.backend.append([make_entry("1d20"), make_entry("3d6"), make_entry("1d20")])
+
+            assert len(history.find_rolls(command="1d20")) == 2
+            assert len(history.get_history()) == 3
+
+            history.clear_history()
+            assert history.get_history() == []
+
+
+class TestHistogramEntries:
+    """Test that every backend keeps the face counts of histogram rolls"""
+
+    @pytest.mark.parametrize('backend', ['jsonl', 'sqlite', 'segmented', 'binary'])
+    def test_round_trip(self, backend):
+        """Test histogram entries read back exactly, next to ordinary ones"""
+        histogram = dict(make_entry("1000000d6+1", rolls=[1], modifier=1), count=10 ** 6, sides=6,
+                         individual_rolls=[], face_counts=[166000, 167000, 166500, 166700, 166800, 167000],
+                         total=3500001)
+        entries = [make_entry("1d20"), histogram, make_entry("2d20", rolls=[3, 4])]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            history = RollHistory(str(Path(temp_dir) / 'history'), backend=backend)
+            history.backend.append(entries)
+
+            assert history.backend.load_all() == entries
+            assert history.get_history(limit=2) == entries[1:]
+            assert list(history.iter_history()) == entries
+
+    def test_binary_record_is_small(self):
+        """Test that a million-die roll takes a few dozen bytes in the binary format"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'history.bin'
+            history = RollHistory(str(path))
+            history.add_roll(DiceRoller(seed=1).roll_histogram(DiceRoll(10 ** 6, 6), "1000000d6"))
+            assert path.stat().st_size < 100
+
+
+class TestConcurrentWriters:
+    """Test that many writer processes never lose each other's rolls"""
+
+    WORKERS = 8
+    ROLLS = 50
+
+    def setup_method(self):
+        """Set up a temporary directory"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def teardown_method(self):
+        """Remove the temporary directory"""
+        self.temp_dir.cleanup()
+
+    def run_writers(self, history_file):
+        """Run WORKERS processes that each add ROLLS rolls"""
+        tasks = [(history_file, worker, self.ROLLS) for worker in range(self.WORKERS)]
+        with multiprocessing.get_context('spawn').Pool(self.WORKERS) as pool:
+            assert sum(pool.map(write_rolls, tasks)) == self.WORKERS * self.ROLLS
+
+    def assert_all_rolls_stored(self, history, expected_extra=0):
+        """Check every worker's rolls are stored exactly once and in per-worker order"""
+        commands = [entry['command'] for entry in history.get_history(limit=None)]
+        assert len(commands) == self.WORKERS * self.ROLLS + expected_extra
+        for worker in range(self.WORKERS):
+            mine = [command for command in commands if command.startswith(f"w{worker}-")]
+            assert mine == [f"w{worker}-{index}" for index in range(self.ROLLS)]
+
+    @pytest.mark.parametrize('suffix', ['.json', '.db', '.bin'])
+    def test_concurrent_appends(self, suffix):
+        """Test that concurrent writers all persist their rolls"""
+        history_file = str(Path(self.temp_dir.name) / f'history{suffix}')
+        self.run_writers(history_file)
+        self.assert_all_rolls_stored(RollHistory(history_file))
+
+    def test_concurrent_appends_across_segment_rollovers(self, monkeypatch):
+        """Test that concurrent writers lose nothing while segments are sealed"""
+        monkeypatch.setenv('DICE_ROLLER_BACKEND', 'segmented')
+        monkeypatch.setenv('DICE_ROLLER_SEGMENT_ENTRIES', '37')
+        history_file = str(Path(self.temp_dir.name) / 'history.json')
+        self.run_writers(history_file)
+
+        history = RollHistory(history_file)
+        assert isinstance(history.backend, SegmentedBackend)
+        assert len(history.backend.segment_files()) > 5
+        self.assert_all_rolls_stored(history)
+
+    def test_concurrent_appends_during_legacy_migration(self):
+        """Test that migrating a legacy file while others append loses nothing"""
+        history_file = Path(self.temp_dir.name) / 'history.json'
+        legacy = [make_entry(f"legacy-{index}") for index in range(100)]
+        history_file.write_text(json.dumps(legacy, indent=2))
+
+        self.run_writers(str(history_file))
+
+        history = RollHistory(str(history_file))
+        self.assert_all_rolls_stored(history, expected_extra=100)
+        assert [entry['command'] for entry in history.get_history(limit=None)[:100]] == \
+            [f"legacy-{index}" for index in range(100)]
+        lines = history_file.read_text().splitlines()
+        assert all(json.loads(line) for line in lines)
+
+    def test_replace_is_atomic(self):
+        """Test that replace renames a complete file into place"""
+        history_file = Path(self.temp_dir.name) / 'history.json'
+        backend = JsonLinesBackend(history_file)
+        backend.append([make_entry("1d20")])
+        original_inode = history_file.stat().st_ino
+
+        backend.replace([make_entry("3d6"), make_entry("2d8")])
+
+        assert history_file.stat().st_ino != original_inode
+        assert [entry['command'] for entry in backend.load_all()] == ['3d6', '2d8']
+        assert sorted(path.name for path in history_file.parent.iterdir()) == ['history.json', 'history.json.lock']
+
+    @pytest.mark.parametrize('backend_class', [JsonLinesBackend, SQLiteBackend])
+    def test_write_errors_are_raised(self, backend_class):
+        """Test that a history that cannot be written raises instead of dropping rolls"""
+        backend = backend_class(Path(self.temp_dir.name) / 'missing' / 'history.json')
+        with pytest.raises(OSError):
+            backend.append([make_entry()])
+        with pytest.raises(OSError):
+            backend.replace([])
+
+
+class TestSegmentedBackend:
+    """Test cases for segmented, compressed history storage"""
+
+    def setup_method(self):
+        """Set up a temporary directory"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / 'history.json'
+
+    def teardown_method(self):
+        """Remove the temporary directory"""
+        self.temp_dir.cleanup()
+
+    def make_backend(self, **options):
+        """Segmented backend with small segments"""
+        options.setdefault('segment_entries', 10)
+        return SegmentedBackend(self.path, **options)
+
+    def add(self, backend, first, last, timestamp="2024-10-02T14:30:15"):
+        """Append rolls numbered first..last-1 one at a time"""
+        for index in range(first, last):
+            backend.append([make_entry(f"roll-{index}", timestamp=timestamp)])
+
+    def test_selected_by_name(self):
+        """Test that the backend can be chosen by name or passed as an instance"""
+        assert isinstance(create_backend(self.path, 'segmented'), SegmentedBackend)
+        backend = self.make_backend()
+        assert RollHistory(str(self.path), backend=backend).backend is backend
+
+    def test_rollover_and_compression(self):
+        """Test that full segments are sealed as gzip files"""
+        backend = self.make_backend()
+        self.add(backend, 0, 35)
+
+        files = [path.name for path in backend.segment_files()]
+        assert files == ['segment-000001.jsonl.gz', 'segment-000002.jsonl.gz',
+                         'segment-000003.jsonl.gz', 'segment-000004.jsonl']
+        with gzip.open(backend.segment_files()[0], 'rt') as f:
+            assert [json.loads(line)['command'] for line in f] == [f"roll-{i}" for i in range(10)]
+        assert [entry['command'] for entry in backend.load_all()] == [f"roll-{i}" for i in range(35)]
+
+    def test_rollover_by_size(self):
+        """Test that a segment is sealed once it reaches the byte threshold"""
+        backend = self.make_backend(segment_entries=1000, segment_bytes=500)
+        self.add(backend, 0, 20)
+
+        assert len(backend.segment_files()) > 2
+        assert len(backend.load_all()) == 20
+
+    def test_tail_reads_only_needed_segments(self):
+        """Test that tail decompresses only the newest segments it needs"""
+        backend = self.make_backend()
+        self.add(backend, 0, 45)
+        opened = []
+        read_sealed = backend._read_sealed
+        backend._read_sealed = lambda segment: opened.append(segment['file']) or read_sealed(segment)
+
+        assert [entry['command'] for entry in backend.tail(3)] == ['roll-42', 'roll-43', 'roll-44']
+        assert opened == []
+
+        tail = backend.tail(12)
+        assert [entry['command'] for entry in tail] == [f"roll-{i}" for i in range(33, 45)]
+        assert opened == ['segment-000004.jsonl.gz']
+
+        assert len(backend.tail(1000)) == 45
+
+    def test_query_skips_segments_outside_time_range(self):
+        """Test that time range queries only open overlapping segments"""
+        backend = self.make_backend()
+        self.add(backend, 0, 10, timestamp="2024-01-01T10:00:00")
+        self.add(backend, 10, 20, timestamp="2024-02-01T10:00:00")
+        self.add(backend, 20, 25, timestamp="2024-03-01T10:00:00")
+        opened = []
+        read_sealed = backend._read_sealed
+        backend._read_sealed = lambda segment: opened.append(segment['file']) or read_sealed(segment)
+
+        matches = backend.query(since="2024-02-01", until="2024-03-01")
+        assert [entry['command'] for entry in matches] == [f"roll-{i}" for i in range(10, 20)]
+        assert opened == ['segment-000002.jsonl.gz']
+        assert len(backend.query(command="roll-3")) == 1
+
+    def test_retention_by_entries(self):
+        """Test that old segments beyond max_entries are deleted"""
+        backend = self.make_backend(max_entries=25)
+        self.add(backend, 0, 61)
+
+        commands = [entry['command'] for entry in backend.load_all()]
+        assert len(commands) >= 25
+        assert commands[-1] == 'roll-60'
+        assert commands[0] == 'roll-30'
+        assert not (backend.directory / 'segment-000001.jsonl.gz').exists()
+
+    def test_retention_by_age(self):
+        """Test that sealed segments older than max_age are deleted"""
+        backend = self.make_backend(max_age=86400)
+        self.add(backend, 0, 10, timestamp="2000-01-01T00:00:00")
+        self.add(backend, 10, 21, timestamp=datetime.now().isoformat())
+
+        commands = [entry['command'] for entry in backend.load_all()]
+        assert commands == [f"roll-{i}" for i in range(10, 21)]
+
+    def test_replace(self):
+        """Test that replace rewrites all segments"""
+        backend = self.make_backend()
+        self.add(backend, 0, 25)
+
+        backend.replace([make_entry(f"new-{i}") for i in range(15)])
+        assert [entry['command'] for entry in backend.load_all()] == [f"new-{i}" for i in range(15)]
+        assert len(backend.segment_files()) == 2
+
+        backend.replace([])
+        assert backend.load_all() == []
+        assert backend.segment_files() == []
+        backend.append([make_entry("after")])
+        assert [entry['command'] for entry in backend.tail(5)] == ['after']
+
+    def test_settings_from_environment(self, monkeypatch):
+        """Test that thresholds and retention can be set with environment variables"""
+        monkeypatch.setenv('DICE_ROLLER_SEGMENT_ENTRIES', '50')
+        monkeypatch.setenv('DICE_ROLLER_MAX_AGE_DAYS', '30')
+        backend = SegmentedBackend(self.path)
+        assert backend.segment_entries == 50
+        assert backend.max_age == 30 * 86400
+        assert backend.max_entries is None
+
+        monkeypatch.setenv('DICE_ROLLER_MAX_ENTRIES', '-1')
+        with pytest.raises(ValueError):
+            SegmentedBackend(self.path)
+
+    def test_roll_history_across_segments(self):
+        """Test that RollHistory reads across segments transparently"""
+        history = RollHistory(str(self.path), backend=self.make_backend())
+        history.backend.append([make_entry(f"roll-{i}") for i in range(5)])
+        for index in range(5, 30):
+            history.backend.append([make_entry(f"roll-{index}")])
+
+        assert [entry['command'] for entry in history.get_history(limit=15)] == [f"roll-{i}" for i in range(15, 30)]
+        assert len(history.get_history(limit=None)) == 30
+
+
+class TestBinaryBackend:
+    """Test cases for the compact binary history format"""
+
+    def setup_method(self):
+        """Set up a temporary directory"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / 'history.bin'
+        self.backend = BinaryBackend(self.path)
+
+    def teardown_method(self):
+        """Remove the temporary directory"""
+        self.temp_dir.cleanup()
+
+    def test_selected_by_suffix(self):
+        """Test that .bin history files use the binary format"""
+        assert isinstance(create_backend(self.path), BinaryBackend)
+        assert isinstance(create_backend(Path('history.json'), 'binary'), BinaryBackend)
+
+    def test_round_trip(self):
+        """Test that entries read back exactly as written"""
+        entries = [
+            make_entry("1d20", timestamp="2024-10-02T14:30:15.123456", rolls=[20]),
+            make_entry("4d8-1", timestamp="2024-10-02T14:30:16", rolls=[1, 8, 3, 5], modifier=-1),
+            dict(make_entry("2d1000", rolls=[999, 1000]), sides=1000),
+            dict(make_entry("1d256", rolls=[256]), sides=256),
+            make_entry("1d20", timestamp="2024-10-02T14:30:17.000001", rolls=[1]),
+        ]
+        self.backend.append(entries[:2])
+        self.backend.append(entries[2:])
+
+        assert self.backend.load_all() == entries
+        assert BinaryBackend(self.path).load_all() == entries
+        assert len(self.backend) == 5
+
+    def test_values_beyond_the_header_are_write_errors(self):
+        """Test that rolls the record header cannot hold raise OSError and write nothing"""
+        self.backend.append([make_entry("1d20")])
+        for entry in (make_entry("1d20+3000000000", modifier=3000000000),
+                      dict(make_entry("1d5000000000", rolls=[4999999999]), sides=5000000000)):
+            with pytest.raises(OSError):
+                self.backend.append([make_entry("2d20", rolls=[1, 2]), entry])
+
+        self.backend.append([make_entry("3d20", rolls=[1, 2, 3])])
+        assert [entry['command'] for entry in BinaryBackend(self.path).load_all()] == ['1d20', '3d20']
+
+    def test_commands_are_dictionary_encoded(self):
+        """Test that each distinct command is stored once"""
+        self.backend.append([make_entry("1d20") for _ in range(100)] + [make_entry("3d6")])
+
+        assert self.path.with_name('history.bin.cmd').read_text().splitlines() == ['"1d20"', '"3d6"']
+        assert b'1d20' not in self.path.read_bytes()
+
+    def test_values_are_packed_by_die_size(self):
+        """Test that d6 values take one byte and d1000 values two"""
+        self.backend.append([make_entry(rolls=[6] * 100)])
+        small = self.path.stat().st_size
+        self.backend.replace([dict(make_entry(rolls=[1000] * 100), sides=1000)])
+        large = self.path.stat().st_size
+
+        assert small == BinaryBackend.RECORD.size + 100
+        assert large == BinaryBackend.RECORD.size + 200
+
+    def test_smaller_than_json_lines(self):
+        """Test that binary history is much smaller than JSON Lines"""
+        entries = [make_entry("3d6+2", rolls=[4, 2, 6], modifier=2) for _ in range(1000)]
+        json_backend = JsonLinesBackend(Path(self.temp_dir.name) / 'history.json')
+        json_backend.append(entries)
+        self.backend.append(entries)
+
+        binary_size = sum(path.stat().st_size for path in Path(self.temp_dir.name).glob('history.bin*'))
+        assert binary_size * 2 < json_backend.path.stat().st_size
+
+    def test_tail_decodes_only_returned_records(self):
+        """Test that tail reads records through the index without decoding the rest"""
+        self.backend.append([make_entry(f"roll-{i}", rolls=[i % 20 + 1]) for i in range(500)])
+        decoded = []
+        decode = self.backend._decode_record
+        self.backend._decode_record = lambda data, offset: decoded.append(offset) or decode(data, offset)
+
+        tail = self.backend.tail(3)
+
+        assert [entry['command'] for entry in tail] == ['roll-497', 'roll-498', 'roll-499']
+        assert len(decoded) == 3
+        assert self.backend.records(10, 12)[0]['command'] == 'roll-10'
+
+    def test_query_filters_on_headers(self):
+        """Test command and time range queries"""
+        self.backend.append([
+            make_entry("1d20", timestamp="2024-01-01T10:00:00"),
+            make_entry("3d6", timestamp="2024-02-01T10:00:00"),
+            make_entry("1d20", timestamp="2024-03-01T10:00:00"),
+            make_entry("1d20", timestamp="2024-04-01T10:00:00"),
+        ])
+
+        assert len(self.backend.query(command="1d20")) == 3
+        assert self.backend.query(command="2d4") == []
+        in_range = self.backend.query(since="2024-02-01", until="2024-04-01")
+        assert [entry['timestamp'][:7] for entry in in_range] == ['2024-02', '2024-03']
+        latest = self.backend.query(command="1d20", limit=2)
+        assert [entry['timestamp'][:7] for entry in latest] == ['2024-03', '2024-04']
+
+    def test_interrupted_write_is_ignored(self):
+        """Test that unindexed bytes after the last record are skipped and overwritten"""
+        self.backend.append([make_entry("1d20")])
+        with open(self.path, 'ab') as f:
+            f.write(b'\x00' * 7)
+
+        assert len(self.backend.load_all()) == 1
+        self.backend.append([make_entry("3d6")])
+        assert [entry['command'] for entry in BinaryBackend(self.path).load_all()] == ['1d20', '3d6']
+
+    def test_replace_and_empty(self):
+        """Test that replace clears the records and the command dictionary"""
+        assert self.backend.load_all() == []
+        assert self.backend.tail(5) == []
+        self.backend.append([make_entry("1d20")])
+        self.backend.replace([make_entry("3d6")])
+
+        reader = BinaryBackend(self.path)
+        assert [entry['command'] for entry in reader.load_all()] == ['3d6']
+        self.backend.replace([])
+        assert reader.load_all() == []
+        self.backend.append([make_entry("2d4")])
+        assert [entry['command'] for entry in reader.load_all()] == ['2d4']
+
+    def test_convert_json_to_binary_and_back(self):
+        """Test converting between JSON Lines and binary histories"""
+        entries = [make_entry(f"{i % 5 + 1}d20", rolls=[i % 20 + 1] * (i % 5 + 1)) for i in range(250)]
+        json_backend = JsonLinesBackend(Path(self.temp_dir.name) / 'history.json')
+        json_backend.append(entries)
+
+        assert convert_history(json_backend, self.backend, batch_size=100) == 250
+        back = JsonLinesBackend(Path(self.temp_dir.name) / 'back.json')
+        assert convert_history(self.backend, back) == 250
+        assert back.load_all() == entries
+
+    def test_convert_streams_the_source(self, monkeypatch):
+        """Test that converting reads the source as a stream, in batches, never all at once"""
+        json_backend = JsonLinesBackend(Path(self.temp_dir.name) / 'history.json')
+        json_backend.append([make_entry(rolls=[i % 20 + 1]) for i in range(250)])
+        monkeypatch.setattr(json_backend, 'load_all', lambda: pytest.fail('the whole history was loaded'))
+        batches = []
+        append = self.backend.append
+        monkeypatch.setattr(self.backend, 'append', lambda entries: batches.append(len(entries)) or append(entries))
+
+        assert convert_history(json_backend, self.backend, batch_size=100) == 250
+        assert batches == [100, 100, 50]
+        assert len(self.backend) == 250
+
+    def test_convert_into_itself_is_refused(self):
+        """Test that converting a file into itself fails without emptying it"""
+        self.backend.append([make_entry()])
+        with pytest.raises(ValueError):
+            convert_history(self.backend, BinaryBackend(self.path))
+        assert len(self.backend) == 1
+
+    def test_roll_history_on_binary_file(self):
+        """Test RollHistory with a .bin history file"""
+        history = RollHistory(str(self.path))
+        history.backend.append([make_entry(f"roll-{i}") for i in range(30)])
+
+        assert [entry['command'] for entry in history.get_history(limit=2)] == ['roll-28', 'roll-29']
+        assert len(history.find_rolls(command='roll-3')) == 1
+        history.clear_history()
+        assert history.get_history() == []
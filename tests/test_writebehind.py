@@ -0,0 +1,223 @@
+# /Users/marcozingoni/Playgound/Python/diceRoller/tests/test_writebehind.py
+import signal
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+import pytest
+from pathlib import Path
+from dice_roller.history import RollHistory
+from dice_roller.parser import DiceRoll
+from dice_roller.roller import RollResult
+from dice_roller.writebehind import WriteBehindWriter
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+
+def make_result(index):
+    """A distinct 1d20 result per index"""
+    return RollResult(dice_roll=DiceRoll(count=1, sides=20), individual_rolls=[index % 20 + 1],
+                      total=index % 20 + 1, command=f"roll-{index}")
+
+
+def run_writer_script(history_file, body, **options):
+    """Start a Python process that queues rolls in write-behind mode"""
+    script = textwrap.dedent(f"""
+        import sys, time
+        from dice_roller.history import RollHistory
+        from dice_roller.parser import DiceRoll
+        from dice_roller.roller import RollResult
+        history = RollHistory({str(history_file)!r})
+        history.write_behind(batch_size=10 ** 6, flush_interval=3600)
+        history.add_rolls([
+            RollResult(DiceRoll(1, 6), [i % 6 + 1], i % 6 + 1, 'roll-%d' % i) for i in range(5000)
+        ])
+    """) + textwrap.dedent(body)
+    return subprocess.Popen([sys.executable, '-c', script], cwd=PROJECT_ROOT,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, **options)
+
+
+class TestWriteBehindWriter:
+    """Test cases for the background batch writer"""
+
+    def test_batches_are_written_in_order(self):
+        """Test that full batches are written by the background thread in order"""
+        written = []
+        done = threading.Event()
+
+        def write(batch):
+            written.append(list(batch))
+            if sum(map(len, written)) == 30:
+                done.set()
+
+        writer = WriteBehindWriter(write, batch_size=10, flush_interval=3600)
+        for index in range(30):
+            writer.add([index])
+
+        assert done.wait(5)
+        assert [entry for batch in written for entry in batch] == list(range(30))
+        writer.close()
+
+    def test_interval_flush(self):
+        """Test that a partial batch is written after the flush interval"""
+        written = []
+        writer = WriteBehindWriter(written.extend, batch_size=1000, flush_interval=0.05)
+        writer.add([1, 2, 3])
+
+        deadline = time.monotonic() + 5
+        while len(written) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert written == [1, 2, 3]
+        writer.close()
+
+    def test_close_writes_everything(self):
+        """Test that close writes queued entries and rejects new ones"""
+        written = []
+        writer = WriteBehindWriter(written.extend, batch_size=1000, flush_interval=3600)
+        writer.add(list(range(500)))
+        writer.close()
+
+        assert written == list(range(500))
+        assert writer.pending == 0
+        with pytest.raises(ValueError):
+            writer.add([1])
+        writer.close()
+
+    def test_failed_write_is_retried(self):
+        """Test that entries survive a failing write"""
+        written = []
+        failures = [OSError('disk full')]
+
+        def write(batch):
+            if failures:
+                raise failures.pop()
+            written.extend(batch)
+
+        writer = WriteBehindWriter(write, batch_size=1000, flush_interval=3600)
+        writer.add([1, 2])
+        with pytest.raises(OSError):
+            writer.flush()
+        writer.add([3])
+        writer.close()
+
+        assert written == [1, 2, 3]
+
+    def test_backlog_is_bounded(self):
+        """Test that the caller writes itself once too many entries are queued"""
+        written = []
+        writer = WriteBehindWriter(written.extend, batch_size=10, flush_interval=3600, max_pending=50)
+        writer.add(list(range(60)))
+
+        assert writer.pending == 0
+        assert written == list(range(60))
+        writer.close()
+
+    def test_invalid_settings(self):
+        """Test that batch size and interval must be positive"""
+        with pytest.raises(ValueError):
+            WriteBehindWriter(list.extend, batch_size=0)
+        with pytest.raises(ValueError):
+            WriteBehindWriter(list.extend, flush_interval=0)
+
+
+class TestWriteBehindHistory:
+    """Test cases for RollHistory in write-behind mode"""
+
+    def setup_method(self):
+        """Set up a temporary history file"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.history_file = Path(self.temp_dir.name) / 'history.json'
+        self.history = RollHistory(str(self.history_file))
+
+    def teardown_method(self):
+        """Close the writer and remove the temporary history"""
+        self.history.close()
+        self.temp_dir.cleanup()
+
+    def stored_commands(self):
+        """Commands on disk, read by a separate RollHistory"""
+        return [entry['command'] for entry in RollHistory(str(self.history_file)).get_history(limit=None)]
+
+    def test_add_roll_does_not_wait_for_disk(self):
+        """Test that roll latency no longer depends on disk latency"""
+        append = self.history.backend.append
+
+        def slow_append(entries):
+            time.sleep(0.2)
+            append(entries)
+
+        self.history.backend.append = slow_append
+        self.history.write_behind(batch_size=1000, flush_interval=3600)
+
+        started = time.perf_counter()
+        for index in range(100):
+            self.history.add_roll(make_result(index))
+        elapsed = time.perf_counter() - started
+
+        assert elapsed < 0.2
+        assert self.stored_commands() == []
+        self.history.close()
+        assert len(self.stored_commands()) == 100
+
+    def test_reads_include_queued_rolls(self):
+        """Test that reads through the same history see queued rolls"""
+        self.history.write_behind(batch_size=1000, flush_interval=3600)
+        for index in range(5):
+            self.history.add_roll(make_result(index))
+
+        assert [entry['command'] for entry in self.history.get_history(limit=2)] == ['roll-3', 'roll-4']
+        assert len(self.history.get_history(limit=None)) == 5
+        assert len(self.history.find_rolls(command='roll-1')) == 1
+
+    def test_clear_history_discards_nothing_later(self):
+        """Test that clearing writes queued rolls first, then empties the history"""
+        self.history.write_behind(batch_size=1000, flush_interval=3600)
+        self.history.add_roll(make_result(1))
+        self.history.clear_history()
+        self.history.add_roll(make_result(2))
+        self.history.close()
+
+        assert self.stored_commands() == ['roll-2']
+
+    def test_close_returns_to_synchronous_writes(self):
+        """Test that rolls after close are written immediately"""
+        self.history.write_behind(batch_size=1000, flush_interval=3600)
+        self.history.add_roll(make_result(1))
+        self.history.close()
+        self.history.add_roll(make_result(2))
+
+        assert self.stored_commands() == ['roll-1', 'roll-2']
+
+    def test_no_rolls_lost_on_normal_exit(self):
+        """Test that queued rolls are written when the interpreter exits"""
+        process = run_writer_script(self.history_file, "")
+        process.communicate(timeout=30)
+
+        assert process.returncode == 0
+        assert self.stored_commands() == [f'roll-{i}' for i in range(5000)]
+
+    def test_no_rolls_lost_on_sys_exit(self):
+        """Test that queued rolls are written on sys.exit from the main thread"""
+        process = run_writer_script(self.history_file, "sys.exit(3)")
+        process.communicate(timeout=30)
+
+        assert process.returncode == 3
+        assert len(self.stored_commands()) == 5000
+
+    @pytest.mark.skipif(not hasattr(signal, 'SIGTERM') or sys.platform == 'win32', reason='POSIX signals only')
+    @pytest.mark.parametrize('signum', [signal.SIGTERM, getattr(signal, 'SIGHUP', signal.SIGTERM), signal.SIGINT])
+    def test_no_rolls_lost_on_signal(self, signum):
+        """Test that queued rolls are written when the process is signalled"""
+        process = run_writer_script(self.history_file, """
+            print('ready', flush=True)
+            time.sleep(60)
+        """)
+        assert process.stdout.readline().strip() == 'ready'
+        process.send_signal(signum)
+        process.communicate(timeout=30)
+
+        assert process.returncode != 0
+        assert self.stored_commands() == [f'roll-{i}' for i in range(5000)]